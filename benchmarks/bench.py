@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+"""
+Tuya 各方法在本地 mock 云上的吞吐量和尾延迟
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --methods get_device_by_id,post_commands --concurrency 1,10,50 --max-clients 10,50
+    python benchmarks/bench.py --backends simple,aiohttp,httpx
+    python benchmarks/bench.py --backends simple,aiohttp,httpx --no-keep-alive
+    python benchmarks/bench.py --save baseline.json
+    python benchmarks/bench.py --compare baseline.json --tolerance 0.2
+
+mock 云运行在独立进程中，避免与被测客户端争抢同一个事件循环；
+simple 不支持复用连接，其他 backend 默认复用，ka 列为实际是否复用，同等条件对比时使用 --no-keep-alive；
+--compare 时吞吐下降或 p99 上升超过 tolerance 的组合会被列出，并以状态码 1 退出
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tuya_api import HTTPPool, Tuya  # noqa: E402
+from tuya_api.metrics import Histogram  # noqa: E402
+
+DEVICES = 1000
+DEVICE_IDS = ['md{n:06d}'.format(n=n) for n in range(DEVICES)]
+
+METHODS = {
+    'get_device_by_id': lambda ty, i: ty.get_device_by_id(DEVICE_IDS[i % DEVICES]),
+    'get_device_status_by_id': lambda ty, i: ty.get_device_status_by_id(DEVICE_IDS[i % DEVICES]),
+    'get_devices_by_ids': lambda ty, i: ty.get_devices_by_ids(DEVICE_IDS[i % 900:i % 900 + 20]),
+    'get_devices_status_by_ids': lambda ty, i: ty.get_devices_status_by_ids(DEVICE_IDS[i % 900:i % 900 + 100]),
+    'get_functions_by_category': lambda ty, i: ty.get_functions_by_category('dj'),
+    'get_functions_by_id': lambda ty, i: ty.get_functions_by_id(DEVICE_IDS[i % DEVICES]),
+    'get_users': lambda ty, i: ty.get_users(page_no=i % 10 + 1, page_size=10),
+    'get_user_devices_by_uid': lambda ty, i: ty.get_user_devices_by_uid('mu{n}'.format(n=i % 100)),
+    'post_commands': lambda ty, i: ty.post_commands(DEVICE_IDS[i % DEVICES],
+                                                    [{'code': 'switch_led', 'value': i % 2 == 0}]),
+}
+
+
+def unused_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def start_mock(args):
+    port = unused_port()
+    cmd = [sys.executable, '-m', 'tuya_api.mock', '--port', str(port), '--devices', str(DEVICES),
+           '--users', '100', '--latency', str(args.latency), '--error-rate', str(args.error_rate)]
+    if args.throttle_qps:
+        cmd += ['--throttle-qps', str(args.throttle_qps)]
+    env = dict(os.environ, PYTHONPATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    process = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, 'http://127.0.0.1:{port}'.format(port=port)
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError('mock tuya cloud did not start')
+
+
+async def run_case(base_url: str, method: str, concurrency: int, max_clients: int, requests: int,
+                   backend: str='simple', keep_alive: bool=None):
+    ty = Tuya('client_id', 'secret', 'schema', base_url=base_url,
+              pool=HTTPPool(max_clients=max_clients, backend=backend, keep_alive=keep_alive))
+    await ty.get_access_token()
+
+    call = METHODS[method]
+    histogram = Histogram()
+    state = {'next': 0, 'errors': 0}
+
+    async def worker():
+        while state['next'] < requests:
+            i = state['next']
+            state['next'] += 1
+            start = time.monotonic()
+            body = await call(ty, i)
+            histogram.record(time.monotonic() - start)
+            if body is None or body.get('success') is not True:
+                state['errors'] += 1
+
+    start = time.monotonic()
+    await gen.multi([worker() for _ in range(concurrency)])
+    elapsed = time.monotonic() - start
+    pool_stats = ty.pool.stats()
+    ty.close()
+    await ty.pool.aclose()
+
+    return {
+        'method': method,
+        'backend': backend,
+        'keep_alive': pool_stats['keep_alive'],
+        'concurrency': concurrency,
+        'max_clients': max_clients,
+        'requests': requests,
+        'errors': state['errors'],
+        'throughput': requests / elapsed,
+        'p50_ms': histogram.percentile(50) * 1000,
+        'p95_ms': histogram.percentile(95) * 1000,
+        'p99_ms': histogram.percentile(99) * 1000,
+        'wait_avg_ms': pool_stats['wait_avg_ms']
+    }
+
+
+def case_key(result: dict):
+    return '{method}|{backend}|{concurrency}|{max_clients}'.format(**dict({'backend': 'simple'}, **result))
+
+
+def compare(results: list, baseline: list, tolerance: float):
+    base = {case_key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = base.get(case_key(result))
+        if old is None:
+            continue
+        if result['throughput'] < old['throughput'] * (1 - tolerance):
+            regressions.append('{key}: throughput {old:.0f} -> {new:.0f} req/s'.format(
+                key=case_key(result), old=old['throughput'], new=result['throughput']))
+        if result['p99_ms'] > old['p99_ms'] * (1 + tolerance):
+            regressions.append('{key}: p99 {old:.2f} -> {new:.2f} ms'.format(
+                key=case_key(result), old=old['p99_ms'], new=result['p99_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark tuya_api against a local mock cloud')
+    parser.add_argument('--methods', default=','.join(METHODS))
+    parser.add_argument('--backends', default='simple', help='HTTPPool backends, e.g. simple,curl,aiohttp,httpx')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                        help='close connections after every request on all backends, as simple always does')
+    parser.add_argument('--concurrency', default='1,10,50')
+    parser.add_argument('--max-clients', default='10,50')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.005, help='mock latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle-qps', type=int, default=None)
+    parser.add_argument('--save', help='save results as json')
+    parser.add_argument('--compare', help='baseline json saved by --save')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    process, base_url = start_mock(args)
+    results = []
+    try:
+        io_loop = IOLoop.current()
+        keep_alive = False if args.no_keep_alive else None
+        print('{:<28}{:>9}{:>4}{:>6}{:>6}{:>10}{:>9}{:>9}{:>9}{:>10}{:>8}'.format(
+            'method', 'backend', 'ka', 'conc', 'pool', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'wait ms', 'errors'))
+        for method in args.methods.split(','):
+            for backend in args.backends.split(','):
+                for max_clients in map(int, args.max_clients.split(',')):
+                    for concurrency in map(int, args.concurrency.split(',')):
+                        result = io_loop.run_sync(lambda: run_case(base_url, method, concurrency, max_clients,
+                                                                   args.requests, backend, keep_alive))
+                        results.append(result)
+                        print('{method:<28}{backend:>9}{ka:>4}{concurrency:>6}{max_clients:>6}{throughput:>10.0f}'
+                              '{p50_ms:>9.2f}{p95_ms:>9.2f}{p99_ms:>9.2f}{wait_avg_ms:>10.2f}{errors:>8}'.format(
+                                  ka='on' if result['keep_alive'] else 'off', **result))
+    finally:
+        process.kill()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print('REGRESSION ' + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+签名和请求头生成的耗时对比
+
+    python benchmarks/sign_bench.py
+    python benchmarks/sign_bench.py --number 200000 --repeat 10
+
+naive 为每次拼接字符串后计算 MD5；signer 使用预先计算的前缀状态，
+signer (new t) 每次都重新计算，signer (same ms) 为同一毫秒内复用签名的情况
+"""
+import argparse
+import os
+import sys
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tuya_api import signer as signer_module  # noqa: E402
+from tuya_api.signer import Signer  # noqa: E402
+from tuya_api.utils import current_milli_time, gen_md5  # noqa: E402
+
+CLIENT_ID = uuid.uuid4().hex[:20]
+SECRET = uuid.uuid4().hex
+ACCESS_TOKEN = uuid.uuid4().hex
+COUNTER = [0]
+
+
+def new_time():
+    # 每次返回不同的时间戳，且与 current_milli_time 开销无关
+    COUNTER[0] += 1
+    return COUNTER[0]
+
+
+def naive():
+    t = str(new_time())
+    sign = gen_md5(CLIENT_ID + ACCESS_TOKEN + SECRET + t).upper()
+    headers = {
+        'client_id': CLIENT_ID,
+        'sign': sign,
+        't': t
+    }
+    headers['access_token'] = ACCESS_TOKEN
+    return headers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark request signing')
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    signer = Signer(CLIENT_ID, SECRET)
+
+    def run_signer():
+        return signer.headers(ACCESS_TOKEN)
+
+    signer_module.current_milli_time = lambda: 1234
+    if run_signer()['sign'] != gen_md5(CLIENT_ID + ACCESS_TOKEN + SECRET + '1234').upper():
+        raise AssertionError('signer and naive signatures differ')
+
+    cases = [('naive', naive, new_time), ('signer (new t)', run_signer, new_time),
+             ('signer (same ms)', run_signer, lambda: 0)]
+    # 各个 case 轮流执行，机器负载的波动对每个 case 的影响相同
+    results = {name: float('inf') for name, _, _ in cases}
+    for _ in range(args.repeat):
+        for name, func, clock in cases:
+            signer_module.current_milli_time = clock
+            results[name] = min(results[name], timeit.timeit(func, number=args.number) / args.number * 1e9)
+    print('{:<20}{:>12}'.format('case', 'ns/op'))
+    for name, _, _ in cases:
+        print('{:<20}{:>12.0f}'.format(name, results[name]))
+    signer_module.current_milli_time = current_milli_time
+    print('speedup (new t): {:.2f}x'.format(results['naive'] / results['signer (new t)']))
+    print('speedup (same ms): {:.2f}x'.format(results['naive'] / results['signer (same ms)']))
+
+
+if __name__ == '__main__':
+    main()
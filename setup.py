@@ -17,7 +17,7 @@ DESCRIPTION = 'Make easier to use Tuya’s API.'
 URL = 'https://github.com/AD-feiben/tuya_api'
 EMAIL = 'feiben.dev@gmail.com'
 AUTHOR = 'Feiben'
-REQUIRES_PYTHON = '>=3.5.0'
+REQUIRES_PYTHON = '>=3.6.0'
 VERSION = None
 
 # What packages are required for this module to be executed?
@@ -28,6 +28,10 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     # 'fancy feature': ['django'],
+    'orjson': ['orjson'],
+    'ujson': ['ujson'],
+    'aiohttp': ['aiohttp'],
+    'httpx': ['httpx'],
 }
 
 # The rest you shouldn't have to touch too much :)
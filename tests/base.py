@@ -0,0 +1,41 @@
+from tornado.testing import AsyncTestCase
+
+from tuya_api import Tuya
+from tuya_api.mock import MockTuyaCloud
+
+
+class MockTestCase(AsyncTestCase):
+    """
+    每个测试启动一个 MockTuyaCloud，用 self.tuya(**options) 创建连接到它的 Tuya
+    """
+
+    # MockTuyaCloud 的参数
+    cloud_options = {'devices': 10, 'users': 2, 'latency': 0.01}
+
+    def setUp(self):
+        super().setUp()
+        self.cloud = MockTuyaCloud(**self.cloud_options)
+        self.cloud.listen()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.cloud.stop()
+        super().tearDown()
+
+    def tuya(self, **options):
+        client = Tuya('client_id', 'secret', 'schema', base_url=self.cloud.url, **options)
+        self.clients.append(client)
+        return client
+
+    @property
+    def device_ids(self):
+        return list(self.cloud.devices)
+
+    def requests(self, handler: str):
+        """
+        :param handler: mock 的 handler 类名，如 DeviceHandler
+        :return: 该 handler 收到的请求数
+        """
+        return self.cloud.requests[handler]
@@ -0,0 +1,86 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import FunctionIndex
+
+from .base import MockTestCase
+
+
+class CommandBatcherTest(MockTestCase):
+    @gen_test
+    def test_commands_to_one_device_are_merged(self):
+        ty = self.tuya(command_linger=0.01)
+        device_id = self.device_ids[0]
+        bodies = yield gen.multi([ty.post_commands(device_id, [{'code': 'bright_value', 'value': 25 + i}])
+                                  for i in range(10)])
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.requests('CommandsHandler'), 1)
+        self.assertEqual(ty.command_batcher.stats()['merged'], 9)
+        # 同一 code 保留最后一次的值
+        status = {point['code']: point['value'] for point in self.cloud.devices[device_id]['status']}
+        self.assertEqual(status['bright_value'], 34)
+
+    @gen_test
+    def test_invalid_command_only_fails_its_caller(self):
+        index = FunctionIndex()
+        ty = self.tuya(command_linger=0.01, function_index=index)
+        device_id = self.device_ids[0]
+        yield index.get_device(device_id)
+        valid, invalid = yield gen.multi([
+            ty.post_commands(device_id, [{'code': 'switch_led', 'value': True}]),
+            ty.post_commands(device_id, [{'code': 'bright_value', 'value': 1000}])
+        ])
+        self.assertTrue(valid['success'])
+        self.assertEqual(invalid['code'], index.INVALID_CODE)
+        self.assertEqual(self.requests('CommandsHandler'), 1)
+        index.close()
+
+
+class ReadBatcherTest(MockTestCase):
+    @gen_test
+    def test_single_reads_are_batched(self):
+        ty = self.tuya(read_linger=0.01, batch_size=4)
+        plain = self.tuya()
+        device_ids = self.device_ids
+        bodies = yield gen.multi([ty.get_device_status_by_id(device_id) for device_id in device_ids])
+        self.assertEqual(self.requests('DevicesStatusHandler'), 3)
+        self.assertEqual(self.requests('DeviceStatusHandler'), 0)
+        expected = yield plain.get_device_status_by_id(device_ids[0])
+        self.assertEqual(bodies[0]['result'], expected['result'])
+
+    @gen_test
+    def test_missing_device_gets_single_error(self):
+        ty = self.tuya(read_linger=0.01)
+        good, bad = yield gen.multi([ty.get_device_by_id(self.device_ids[0]), ty.get_device_by_id('missing')])
+        self.assertTrue(good['success'])
+        self.assertEqual(bad['code'], 1106)
+        self.assertEqual(self.requests('DevicesHandler'), 1)
+        self.assertEqual(self.requests('DeviceHandler'), 1)
+
+    @gen_test
+    def test_failed_batch_falls_back_to_single_reads(self):
+        ty = self.tuya(read_linger=0.01)
+
+        async def fail_batch(request, call_next):
+            if request.endpoint.name == 'get_devices_by_ids':
+                return {'success': False, 'code': 1106, 'msg': 'permission deny'}
+            return await call_next(request)
+
+        ty.pipeline.add(fail_batch, index=0)
+        bodies = yield gen.multi([ty.get_device_by_id(device_id) for device_id in self.device_ids[:3]])
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.requests('DeviceHandler'), 3)
+
+    @gen_test
+    def test_batch_request_error_falls_back_to_single_reads(self):
+        ty = self.tuya(read_linger=0.01)
+
+        async def break_batch(request, call_next):
+            if request.endpoint.name == 'get_devices_by_ids':
+                raise OSError('connection reset')
+            return await call_next(request)
+
+        ty.pipeline.add(break_batch, index=0)
+        bodies = yield gen.multi([ty.get_device_by_id(device_id) for device_id in self.device_ids[:3]])
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.requests('DeviceHandler'), 3)
@@ -0,0 +1,51 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import ResponseCache
+
+from .base import MockTestCase
+
+
+class ResponseCacheTest(MockTestCase):
+    @gen_test
+    def test_hits_and_concurrent_misses(self):
+        cache = ResponseCache()
+        ty = self.tuya(cache=cache)
+        device_id = self.device_ids[0]
+        yield gen.multi([ty.get_device_by_id(device_id) for _ in range(5)])
+        yield ty.get_device_by_id(device_id)
+        self.assertEqual(self.requests('DeviceHandler'), 1)
+        self.assertEqual(cache.stats()['get_device_by_id']['hits'], 1)
+
+    @gen_test
+    def test_failures_are_not_cached(self):
+        ty = self.tuya(cache=ResponseCache())
+        for _ in range(2):
+            body = yield ty.get_device_by_id('missing')
+            self.assertFalse(body['success'])
+        self.assertEqual(self.requests('DeviceHandler'), 2)
+
+    @gen_test
+    def test_ttl_and_lru(self):
+        cache = ResponseCache({'get_device_by_id': (0.05, 2)})
+        ty = self.tuya(cache=cache)
+        a, b, c = self.device_ids[:3]
+        for device_id in (a, b, c, a):
+            yield ty.get_device_by_id(device_id)
+        # c 淘汰了最久未使用的 a
+        self.assertEqual(self.requests('DeviceHandler'), 4)
+        self.assertEqual(cache.stats()['get_device_by_id']['evictions'], 2)
+        yield gen.sleep(0.06)
+        yield ty.get_device_by_id(a)
+        self.assertEqual(self.requests('DeviceHandler'), 5)
+
+    @gen_test
+    def test_commands_invalidate_device(self):
+        ty = self.tuya(cache=ResponseCache())
+        device_id = self.device_ids[0]
+        yield ty.get_device_by_id(device_id)
+        yield ty.post_commands(device_id, [{'code': 'bright_value', 'value': 100}])
+        body = yield ty.get_device_by_id(device_id)
+        status = {point['code']: point['value'] for point in body['result']['status']}
+        self.assertEqual(status['bright_value'], 100)
+        self.assertEqual(self.requests('DeviceHandler'), 2)
@@ -0,0 +1,51 @@
+from tornado.testing import gen_test
+
+from .base import MockTestCase
+
+
+class CommandFanOutTest(MockTestCase):
+    @gen_test
+    def test_streams_every_device(self):
+        ty = self.tuya()
+        job = ty.broadcast_commands(self.device_ids + ['missing'], [{'code': 'switch_led', 'value': True}],
+                                    concurrency=3)
+        results = {}
+        while True:
+            try:
+                result = yield job.__anext__()
+            except StopAsyncIteration:
+                break
+            results[result.device_id] = result.status
+        self.assertEqual(len(results), len(self.device_ids) + 1)
+        self.assertEqual(results['missing'], 'failed')
+        stats = job.stats()
+        self.assertEqual((stats['succeeded'], stats['failed'], stats['running']), (len(self.device_ids), 1, 0))
+
+    @gen_test
+    def test_retries_retry_codes(self):
+        ty = self.tuya()
+        attempts = []
+
+        async def offline_once(request, call_next):
+            if request.endpoint.name == 'post_commands' and request.key not in attempts:
+                attempts.append(request.key)
+                return {'success': False, 'code': 2001, 'msg': 'device is offline'}
+            return await call_next(request)
+
+        ty.pipeline.add(offline_once, index=0)
+        job = ty.broadcast_commands(self.device_ids[:3], [{'code': 'switch_led', 'value': True}],
+                                    retry_codes=(2001,))
+        job.backoff = 0.01
+        failed = yield job.wait()
+        self.assertEqual(failed, [])
+        self.assertEqual(job.stats()['retried'], 3)
+
+    @gen_test
+    def test_network_errors_are_not_retried(self):
+        ty = self.tuya()
+        yield ty.get_access_token()
+        self.cloud.error_rate = 1
+        job = ty.broadcast_commands(self.device_ids[:3], [{'code': 'switch_led', 'value': True}])
+        failed = yield job.wait()
+        self.assertEqual([result.attempts for result in failed], [1, 1, 1])
+        self.assertEqual(self.requests('CommandsHandler'), 3)
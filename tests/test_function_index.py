@@ -0,0 +1,79 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import FunctionIndex
+
+from .base import MockTestCase
+
+
+class FunctionIndexTest(MockTestCase):
+    cloud_options = {'devices': 20, 'latency': 0.01}
+
+    def setUp(self):
+        super().setUp()
+        self.index = FunctionIndex(fill_concurrency=2)
+
+    def tearDown(self):
+        self.index.close()
+        super().tearDown()
+
+    @gen.coroutine
+    def wait_fills(self):
+        while self.index.stats()['queued'] or self.requests('DeviceFunctionsHandler') < self.index.fetches:
+            yield gen.sleep(0.01)
+        yield gen.sleep(0.05)
+
+    @gen_test
+    def test_validates_indexed_devices(self):
+        ty = self.tuya(function_index=self.index)
+        device_id = self.device_ids[0]
+        functions = yield self.index.get_device(device_id)
+        self.assertIn('bright_value', functions)
+        self.assertEqual(self.index.validate(device_id, [{'code': 'bright_value', 'value': 1000}]),
+                         [('bright_value', 'out of range [25, 255]')])
+        body = yield ty.post_commands(device_id, [{'code': 'nope', 'value': 1}])
+        self.assertEqual(body['code'], FunctionIndex.INVALID_CODE)
+        self.assertEqual(self.requests('CommandsHandler'), 0)
+
+    @gen_test
+    def test_unindexed_devices_are_filled_with_bounded_concurrency(self):
+        ty = self.tuya(function_index=self.index)
+        running = [0, 0]
+
+        async def track(request, call_next):
+            if request.endpoint.name != 'get_functions_by_id':
+                return await call_next(request)
+            running[0] += 1
+            running[1] = max(running)
+            try:
+                return await call_next(request)
+            finally:
+                running[0] -= 1
+
+        ty.pipeline.add(track, index=0)
+        job = ty.broadcast_commands(self.device_ids, [{'code': 'switch_led', 'value': True}])
+        failed = yield job.wait()
+        self.assertEqual(failed, [])
+        yield self.wait_fills()
+        self.assertEqual(len(self.index), len(self.device_ids))
+        self.assertEqual(self.index.fetches, len(self.device_ids))
+        self.assertLessEqual(running[1], 2)
+
+    @gen_test
+    def test_failed_fetch_is_not_repeated(self):
+        ty = self.tuya(function_index=self.index)
+        for _ in range(5):
+            yield ty.post_commands('missing', [{'code': 'switch_led', 'value': True}])
+            yield self.wait_fills()
+        self.assertEqual(self.requests('DeviceFunctionsHandler'), 1)
+        self.assertEqual(self.index.stats()['failures'], 1)
+
+    @gen_test
+    def test_delete_removes_entry(self):
+        ty = self.tuya(function_index=self.index)
+        device_id = self.device_ids[0]
+        yield self.index.get_device(device_id)
+        body = yield ty.delete_device_by_id(device_id)
+        self.assertTrue(body['success'])
+        self.assertNotIn(device_id, self.index)
+        self.assertIsNone(self.index.functions(device_id))
@@ -0,0 +1,71 @@
+import io
+import os
+import shutil
+import tempfile
+
+from tornado.testing import gen_test
+
+from tuya_api import FileCheckpoint, iter_csv, iter_jsonl
+
+from .base import MockTestCase
+
+CSV = 'country_code,username,password,nick_name\n' + ''.join(
+    '86,import{i},secret{i},nick{i}\n'.format(i=i) for i in range(10))
+
+
+class UserImportTest(MockTestCase):
+    cloud_options = {'devices': 0, 'users': 0, 'latency': 0.005}
+
+    def setUp(self):
+        super().setUp()
+        self.path = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.path, 'users.done')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super().tearDown()
+
+    @staticmethod
+    async def collect(job):
+        return [result async for result in job]
+
+    @gen_test
+    def test_resumes_from_checkpoint(self):
+        ty = self.tuya()
+        checkpoint = FileCheckpoint(self.checkpoint_path)
+        rows = list(iter_csv(io.StringIO(CSV)))
+        # 第一次只导入了前 4 行，其中一行缺少密码
+        first = rows[:4] + [{'country_code': '86', 'username': 'broken'}]
+        results = yield self.collect(ty.import_users(first, concurrency=3, checkpoint=checkpoint))
+        self.assertEqual(sorted(result.status for result in results), ['created'] * 4 + ['failed'])
+        checkpoint.close()
+
+        checkpoint = FileCheckpoint(self.checkpoint_path)
+        self.assertEqual(len(checkpoint), 4)
+        job = ty.import_users(rows, concurrency=3, checkpoint=checkpoint)
+        results = yield self.collect(job)
+        checkpoint.close()
+        self.assertEqual(sorted(result.index for result in results), list(range(10)))
+        self.assertEqual(job.stats(), {'created': 6, 'skipped': 4, 'failed': 0, 'running': 0})
+        self.assertEqual(self.requests('UserHandler'), 10)
+        self.assertEqual(len(self.cloud.user_list), 10)
+
+    @gen_test
+    def test_reads_rows_lazily(self):
+        ty = self.tuya()
+        read = []
+
+        def rows():
+            for i, row in enumerate(iter_jsonl(io.StringIO(''.join(
+                    '{{"country_code": "86", "username": "lazy{i}", "password": "p"}}\n'.format(i=i)
+                    for i in range(20))))):
+                read.append(i)
+                yield row
+
+        job = ty.import_users(rows(), concurrency=4)
+        first = yield job.__anext__()
+        self.assertEqual(first.status, 'created')
+        self.assertLessEqual(len(read), 5)
+        self.assertLessEqual(job.stats()['running'], 4)
+        rest = yield self.collect(job)
+        self.assertEqual(len(rest) + 1, 20)
@@ -0,0 +1,33 @@
+import time
+
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import RateLimiter
+
+from .base import MockTestCase
+
+
+class RateLimiterTest(MockTestCase):
+    @gen_test
+    def test_holds_requests_to_budget(self):
+        limiter = RateLimiter({'read': (50, 5)})
+        ty = self.tuya(rate_limiter=limiter)
+        yield ty.get_access_token()
+        start = time.monotonic()
+        bodies = yield gen.multi([ty.get_device_by_id(self.device_ids[i % 10]) for i in range(20)])
+        self.assertTrue(all(body['success'] for body in bodies))
+        # 桶内 5 个立即发出，其余 15 个按每秒 50 个
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+    @gen_test
+    def test_backs_off_and_retries_when_throttled(self):
+        limiter = RateLimiter({'read': (100, 100)}, max_retries=10, backoff=0.2, max_backoff=0.5)
+        ty = self.tuya(rate_limiter=limiter)
+        yield ty.get_access_token()
+        self.cloud.throttle_qps = 10
+        bodies = yield gen.multi([ty.get_device_by_id(self.device_ids[i % 10]) for i in range(20)])
+        self.assertTrue(all(body['success'] for body in bodies))
+        stats = limiter.stats()['read']
+        self.assertGreater(stats['throttled'], 0)
+        self.assertLess(stats['rate'], stats['max_rate'])
@@ -0,0 +1,31 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import CallbackSink, Metrics, PrometheusSink
+
+from .base import MockTestCase
+
+
+class MetricsTest(MockTestCase):
+    cloud_options = {'devices': 5, 'latency': 0.01}
+
+    @gen_test
+    def test_records_phases_errors_and_in_flight(self):
+        events = []
+        prometheus = PrometheusSink()
+        metrics = Metrics([CallbackSink(lambda *event: events.append(event)), prometheus])
+        ty = self.tuya(metrics=metrics)
+        yield gen.multi([ty.get_device_by_id(device_id) for device_id in self.device_ids] +
+                        [ty.get_device_by_id('missing')])
+
+        snapshot = metrics.snapshot()['get_device_by_id']
+        self.assertEqual(set(snapshot['phases']), {'total', 'token', 'sign', 'queue', 'network', 'decode'})
+        self.assertEqual(snapshot['phases']['total']['count'], 6)
+        self.assertGreaterEqual(snapshot['phases']['network']['p50'], 0.01)
+        self.assertEqual(snapshot['errors'], {'1106': 1})
+        self.assertEqual(snapshot['in_flight'], 0)
+
+        self.assertIn(('error', 'get_device_by_id', '1106', 1), events)
+        text = prometheus.render()
+        self.assertIn('tuya_api_errors_total{endpoint="get_device_by_id",error="1106"} 1', text)
+        self.assertIn('tuya_api_request_seconds_count{endpoint="get_device_by_id",phase="total"} 6', text)
@@ -0,0 +1,76 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import DeviceMirror
+
+from .base import MockTestCase
+
+
+class DeviceMirrorTest(MockTestCase):
+    cloud_options = {'devices': 6}
+
+    def setUp(self):
+        super().setUp()
+        self.events = []
+
+    def mirror(self, ty, **options):
+        mirror = DeviceMirror(ty, self.device_ids, **options)
+        mirror.subscribe(lambda device_id, changes: self.events.append((device_id, changes)))
+        return mirror
+
+    def set_value(self, device_id, code, value):
+        for point in self.cloud.devices[device_id]['status']:
+            if point['code'] == code:
+                point['value'] = value
+
+    @gen_test
+    def test_reports_only_changed_points(self):
+        ty = self.tuya(batch_size=4)
+        mirror = self.mirror(ty, interval=10, min_interval=1)
+        yield mirror.poll()
+        self.assertEqual(self.requests('DevicesStatusHandler'), 2)
+        self.assertEqual(self.events, [])
+        device_id = self.device_ids[0]
+        old = mirror.get_value(device_id, 'bright_value')
+
+        self.set_value(device_id, 'bright_value', old + 1)
+        changed = yield mirror.poll(self.device_ids)
+        self.assertEqual(changed, 1)
+        self.assertEqual(self.events, [(device_id, {'bright_value': (old, old + 1)})])
+        self.assertEqual(mirror.get_value(device_id, 'bright_value'), old + 1)
+
+        yield mirror.poll(self.device_ids)
+        self.assertEqual(len(self.events), 1)
+
+    @gen_test
+    def test_adapts_interval_to_change_rate(self):
+        ty = self.tuya()
+        mirror = self.mirror(ty, interval=10, min_interval=2, max_interval=40, backoff=2)
+        busy, idle = self.device_ids[:2]
+        yield mirror.poll()
+        for i in range(4):
+            self.set_value(busy, 'bright_value', 30 + i)
+            yield mirror.poll(self.device_ids)
+        stats = mirror.stats()
+        # 有变化的设备缩短到 min_interval，其余设备延长到 max_interval
+        self.assertEqual(stats['interval_min'], 2)
+        self.assertEqual(stats['interval_avg'], (2 + 40 * 5) / 6)
+        # 只有到期的设备会被拉取
+        self.assertEqual((yield mirror.poll()), 0)
+        self.assertIsNotNone(mirror.updated_at(idle))
+
+    @gen_test
+    def test_background_polling_delivers_changes(self):
+        ty = self.tuya()
+        mirror = self.mirror(ty, interval=0.02, min_interval=0.01, tick=0.01)
+        mirror.start()
+        while mirror.get(self.device_ids[-1]) is None:
+            yield gen.sleep(0.01)
+        yield ty.post_commands(self.device_ids[1], [{'code': 'switch_led', 'value': 'x'}])
+        for _ in range(100):
+            if self.events:
+                break
+            yield gen.sleep(0.01)
+        mirror.stop()
+        self.assertEqual(self.events[0][0], self.device_ids[1])
+        self.assertEqual(self.events[0][1]['switch_led'][1], 'x')
@@ -0,0 +1,27 @@
+from tornado.testing import gen_test
+
+from .base import MockTestCase
+
+
+class UserIteratorTest(MockTestCase):
+    cloud_options = {'devices': 14, 'users': 7}
+
+    @staticmethod
+    async def collect(iterator):
+        return [item async for item in iterator]
+
+    @gen_test
+    def test_iterates_all_users_in_order(self):
+        ty = self.tuya()
+        users = yield self.collect(ty.iter_users(page_size=3, prefetch=2))
+        self.assertEqual([user['uid'] for user in users], [user['uid'] for user in self.cloud.user_list])
+        # 3 页，最后一页已知后不再请求第 4 页之后
+        self.assertLessEqual(self.requests('UsersHandler'), 4)
+
+    @gen_test
+    def test_devices_of_each_user(self):
+        ty = self.tuya()
+        pairs = yield self.collect(ty.iter_users(page_size=3).devices(concurrency=2))
+        self.assertEqual(len(pairs), 7)
+        self.assertTrue(all(len(body['result']) == 2 for _, body in pairs))
+        self.assertTrue(all(device['uid'] == user['uid'] for user, body in pairs for device in body['result']))
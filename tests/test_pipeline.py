@@ -0,0 +1,60 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from .base import MockTestCase
+
+
+class CoalesceMiddlewareTest(MockTestCase):
+    @gen_test
+    def test_identical_reads_share_one_request(self):
+        ty = self.tuya(coalesce=True)
+        yield ty.get_access_token()
+        device_id = self.device_ids[0]
+        bodies = yield gen.multi([ty.get_device_by_id(device_id) for _ in range(20)] +
+                                 [ty.get_device_status_by_id(device_id) for _ in range(20)])
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.requests('DeviceHandler'), 1)
+        self.assertEqual(self.requests('DeviceStatusHandler'), 1)
+        self.assertEqual(ty.coalescer.stats()['coalesced'], 38)
+
+    @gen_test
+    def test_only_configured_methods_are_coalesced(self):
+        ty = self.tuya(coalesce=['get_device_status_by_id'])
+        yield ty.get_access_token()
+        device_id = self.device_ids[0]
+        yield gen.multi([ty.get_device_by_id(device_id) for _ in range(5)] +
+                        [ty.get_device_status_by_id(device_id) for _ in range(5)])
+        self.assertEqual(self.requests('DeviceHandler'), 5)
+        self.assertEqual(self.requests('DeviceStatusHandler'), 1)
+
+    @gen_test
+    def test_read_after_command_does_not_join_earlier_read(self):
+        ty = self.tuya(coalesce=True)
+        yield ty.get_access_token()
+        device_id = self.device_ids[0]
+        before = gen.convert_yielded(ty.get_device_status_by_id(device_id))
+        yield gen.moment
+        command = gen.convert_yielded(ty.post_commands(device_id, [{'code': 'switch_led', 'value': True}]))
+        after = gen.convert_yielded(ty.get_device_status_by_id(device_id))
+        yield command
+        after = yield after
+        before = yield before
+        self.assertIsNot(before, after)
+        self.assertEqual(self.requests('DeviceStatusHandler'), 2)
+
+
+class BatchResponseTest(MockTestCase):
+    @gen_test
+    def test_single_chunk_has_merged_shape(self):
+        ty = self.tuya(batch_size=20)
+        body = yield ty.get_devices_by_ids(self.device_ids[:3])
+        self.assertTrue(body['success'])
+        self.assertEqual(len(body['result']), 3)
+        self.assertEqual(body['failed'], [])
+
+    @gen_test
+    def test_chunks_are_merged(self):
+        ty = self.tuya(batch_size=3)
+        body = yield ty.get_devices_by_ids(self.device_ids)
+        self.assertEqual(len(body['result']), len(self.device_ids))
+        self.assertEqual(self.requests('DevicesHandler'), 4)
@@ -0,0 +1,64 @@
+import warnings
+
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import HTTPPool
+
+from .base import MockTestCase
+
+
+class KeepAliveTest(MockTestCase):
+    def test_simple_never_keeps_alive(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            pool = HTTPPool()
+        self.assertFalse(pool.keep_alive)
+        self.assertFalse(pool.stats()['keep_alive'])
+        pool.close()
+
+    def test_simple_warns_on_keep_alive(self):
+        with self.assertWarns(RuntimeWarning):
+            pool = HTTPPool(keep_alive=True)
+        self.assertFalse(pool.keep_alive)
+        pool.close()
+
+    @gen_test
+    def test_asyncio_backends_keep_alive_by_default(self):
+        for backend in ('aiohttp', 'httpx'):
+            pool = HTTPPool(backend=backend)
+            self.assertTrue(pool.keep_alive)
+            ty = self.tuya(pool=pool)
+            body = yield ty.get_device_by_id(self.device_ids[0])
+            self.assertTrue(body['success'])
+            yield pool.aclose()
+            self.assertFalse(HTTPPool(backend=backend, keep_alive=False).keep_alive)
+
+
+class PoolStatsTest(MockTestCase):
+    cloud_options = {'devices': 10, 'latency': 0.02}
+
+    @gen_test
+    def test_queues_beyond_max_clients(self):
+        pool = HTTPPool(max_clients=2)
+        ty = self.tuya(pool=pool)
+        yield ty.get_access_token()
+        pool.reset_stats()
+        bodies = yield gen.multi([ty.get_device_by_id(device_id) for device_id in self.device_ids])
+        self.assertTrue(all(body['success'] for body in bodies))
+        stats = pool.stats()
+        self.assertEqual(stats['requests'], 10)
+        self.assertEqual(stats['max_in_flight'], 2)
+        self.assertEqual(stats['max_queued'], 8)
+        self.assertGreater(stats['wait_max_ms'], 20)
+        self.assertEqual((stats['in_flight'], stats['queued']), (0, 0))
+        pool.close()
+
+    @gen_test
+    def test_per_host_limit(self):
+        pool = HTTPPool(max_clients=10, max_per_host=3)
+        ty = self.tuya(pool=pool)
+        yield ty.get_access_token()
+        yield gen.multi([ty.get_device_by_id(device_id) for device_id in self.device_ids])
+        self.assertEqual(pool.stats()['max_in_flight'], 3)
+        pool.close()
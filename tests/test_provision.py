@@ -0,0 +1,55 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import Provisioner
+
+from .base import MockTestCase
+
+
+class ProvisionerTest(MockTestCase):
+    cloud_options = {'devices': 0, 'users': 2, 'pairing_devices': 3}
+
+    @gen_test
+    def test_sessions_collect_enriched_devices(self):
+        ty = self.tuya()
+        found = []
+        provisioner = Provisioner(ty, lambda session, device: found.append((session.token, device)),
+                                  poll_interval=0.01, enrich_linger=0.02, timeout=5)
+        sessions = yield gen.multi([provisioner.start('mu0', 'Asia/Shanghai', expected=3),
+                                    provisioner.start('mu1', 'Asia/Shanghai', expected=3)])
+        results = yield gen.multi([session.wait() for session in sessions])
+        self.assertEqual([len(devices) for devices in results], [3, 3])
+        self.assertEqual(len(found), 6)
+        # 补全后带有 get_devices_by_ids 返回的字段
+        self.assertTrue(all(device['uid'] in ('mu0', 'mu1') and 'status' in device for _, device in found))
+        self.assertEqual(len(provisioner), 0)
+        self.assertLess(provisioner.stats()['enrich_requests'], 6)
+
+    @gen_test
+    def test_backs_off_without_new_devices_and_times_out(self):
+        self.cloud.pairing_devices = 0
+        ty = self.tuya()
+        provisioner = Provisioner(ty, poll_interval=0.01, max_poll_interval=0.04, backoff=2, timeout=0.3)
+        session = yield provisioner.start('mu0', 'Asia/Shanghai')
+        devices = yield session.wait()
+        self.assertEqual(devices, [])
+        self.assertEqual(session.interval, 0.04)
+        # 不退避时 0.3s 内约 30 次
+        self.assertLess(session.polls, 15)
+
+    @gen_test
+    def test_concurrent_polls_share_one_request(self):
+        ty = self.tuya()
+        yield ty.get_access_token()
+        provisioner = Provisioner(ty, poll_interval=10, enrich=False)
+        body = yield ty.generate_device_token('mu0', 'Asia/Shanghai')
+        token = body['result']['token']
+        session = provisioner.watch(token)
+        self.assertIs(provisioner.watch(token), session)
+        # 与 watch 安排的第一次轮询合并
+        counts = yield gen.multi([provisioner.poll(token) for _ in range(5)])
+        self.assertEqual(counts, [1] * 5)
+        self.assertEqual(self.requests('DevicesByTokenHandler'), 1)
+        provisioner.stop(token)
+        devices = yield session.wait()
+        self.assertEqual(len(devices), len(session.devices))
@@ -0,0 +1,82 @@
+import json
+
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+
+from tuya_api import Device, Status, User, iter_result, record_decoder
+
+from .base import MockTestCase
+
+
+class DecodeTest(AsyncTestCase):
+    def test_iter_result_streams_elements(self):
+        raw = json.dumps({'success': True, 'result': [{'id': 'a', 'x': 1}, {'id': 'b'}], 't': 5})
+        meta = {}
+        devices = list(iter_result(raw.encode('utf-8'), Device.from_dict, meta=meta))
+        self.assertEqual([device.id for device in devices], ['a', 'b'])
+        self.assertEqual(devices[0].extra, {'x': 1})
+        self.assertEqual((meta['success'], meta['t']), (True, 5))
+
+    def test_decoder_keeps_response_shape(self):
+        users = [{'uid': 'u1', 'username': 'a', 'country_code': '86'}]
+        raw = json.dumps({'success': True, 'result': {'list': users, 'total': 1, 'has_more': False}, 't': 1})
+        body = record_decoder(User.from_dict, ('result', 'list'))(raw)
+        self.assertEqual(body['result']['total'], 1)
+        self.assertIsInstance(body['result']['list'][0], User)
+        self.assertEqual(body['result']['list'][0].to_dict(), users[0])
+
+    def test_decoder_handles_single_object_and_errors(self):
+        decode = record_decoder(Device.from_dict)
+        body = decode(json.dumps({'success': True, 'result': {'id': 'a', 'status': [{'code': 'c', 'value': 1}]}}))
+        self.assertEqual(body['result'].status_dict(), {'c': 1})
+        body = decode(json.dumps({'success': False, 'code': 1106, 'msg': 'permission deny'}))
+        self.assertEqual(body, {'success': False, 'code': 1106, 'msg': 'permission deny'})
+
+    def test_record_behaves_like_dict(self):
+        status = Status.from_dict({'code': 'switch_led', 'value': True})
+        self.assertEqual(status['code'], 'switch_led')
+        self.assertEqual(status.get('missing', 1), 1)
+        self.assertIn('value', status)
+        self.assertRaises(KeyError, lambda: status['missing'])
+
+
+class RecordsClientTest(MockTestCase):
+    @gen.coroutine
+    def expected(self, method, *args):
+        body = yield getattr(self.tuya(), method)(*args)
+        return body['result']
+
+    @gen_test
+    def test_single_reads(self):
+        ty = self.tuya(records=True)
+        device_id = self.device_ids[0]
+        device = yield ty.get_device_by_id(device_id)
+        self.assertIsInstance(device['result'], Device)
+        self.assertEqual(device['result'].to_dict(), (yield self.expected('get_device_by_id', device_id)))
+        status = yield ty.get_device_status_by_id(device_id)
+        self.assertTrue(all(isinstance(point, Status) for point in status['result']))
+        self.assertEqual([point.to_dict() for point in status['result']],
+                         (yield self.expected('get_device_status_by_id', device_id)))
+        users = yield ty.get_users(page_size=5)
+        self.assertTrue(all(isinstance(user, User) for user in users['result']['list']))
+
+    @gen_test
+    def test_batched_reads(self):
+        ty = self.tuya(records=True, batch_size=3)
+        body = yield ty.get_devices_by_ids(self.device_ids)
+        self.assertEqual([device.id for device in body['result']], self.device_ids)
+        self.assertEqual(body['failed'], [])
+        body = yield ty.get_devices_status_by_ids(self.device_ids)
+        self.assertEqual(len(body['result']), len(self.device_ids))
+
+    @gen_test
+    def test_read_linger(self):
+        ty = self.tuya(records=True, read_linger=0.01)
+        device_ids = self.device_ids[:5]
+        devices = yield gen.multi([ty.get_device_by_id(device_id) for device_id in device_ids])
+        statuses = yield gen.multi([ty.get_device_status_by_id(device_id) for device_id in device_ids])
+        self.assertEqual(self.requests('DevicesHandler'), 1)
+        self.assertEqual(self.requests('DevicesStatusHandler'), 1)
+        self.assertEqual([body['result'].id for body in devices], device_ids)
+        expected = yield self.expected('get_device_status_by_id', device_ids[0])
+        self.assertEqual([point.to_dict() for point in statuses[0]['result']], expected)
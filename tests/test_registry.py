@@ -0,0 +1,49 @@
+import time
+
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import HTTPPool, TuyaRegistry
+
+from .base import MockTestCase
+
+
+class TuyaRegistryTest(MockTestCase):
+    cloud_options = {'devices': 10, 'latency': 0.02}
+
+    def registry(self, **options):
+        registry = TuyaRegistry(pool=HTTPPool(max_clients=2), base_url=self.cloud.url, **options)
+        for tenant in ('a', 'b', 'c'):
+            registry.register(tenant, 'client_id', 'secret', 'schema')
+        self.addCleanup(registry.pool.close)
+        self.addCleanup(registry.close)
+        return registry
+
+    @gen_test
+    def test_busy_tenant_does_not_starve_others(self):
+        registry = self.registry()
+        yield registry.get('a').get_access_token()
+        done = {}
+
+        async def run(tenant, n):
+            ty = registry.get(tenant)
+            await gen.multi([ty.get_device_by_id(self.device_ids[i % 10]) for i in range(n)])
+            done[tenant] = time.monotonic()
+
+        start = time.monotonic()
+        busy = gen.convert_yielded(run('a', 20))
+        yield gen.moment
+        yield run('b', 2)
+        yield busy
+        self.assertLess(done['b'] - start, (done['a'] - start) / 2)
+        self.assertEqual(registry.stats()['scheduler']['active'], 0)
+
+    @gen_test
+    def test_evicted_tenants_reuse_stored_token(self):
+        registry = self.registry(max_active=1)
+        for tenant in ('a', 'b', 'c', 'a'):
+            body = yield registry.get(tenant).get_device_by_id(self.device_ids[0])
+            self.assertTrue(body['success'])
+        self.assertEqual(registry.stats()['active'], 1)
+        self.assertEqual(self.requests('TokenHandler'), 1)
+        self.assertRaises(KeyError, registry.get, 'missing')
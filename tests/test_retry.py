@@ -0,0 +1,48 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from tuya_api import Retrier, RetryPolicy
+
+from .base import MockTestCase
+
+
+class RetrierTest(MockTestCase):
+    cloud_options = {'devices': 10, 'latency': (0.001, 0.02)}
+
+    def retrier(self, **policies):
+        policies.setdefault('read', RetryPolicy(3, backoff=0.001))
+        policies.setdefault('command', RetryPolicy(3, guarded=True, backoff=0.001))
+        return Retrier(policies)
+
+    @gen_test
+    def test_reads_are_retried_on_server_errors(self):
+        retrier = self.retrier()
+        ty = self.tuya(retrier=retrier)
+        yield ty.get_access_token()
+        self.cloud.error_rate = 1
+        body = yield ty.get_device_by_id(self.device_ids[0])
+        self.assertIsNone(body)
+        self.assertEqual(self.requests('DeviceHandler'), 3)
+        self.assertEqual(retrier.stats()['retries'], 2)
+
+    @gen_test
+    def test_sent_commands_are_not_retried(self):
+        retrier = self.retrier()
+        ty = self.tuya(retrier=retrier)
+        yield ty.get_access_token()
+        self.cloud.error_rate = 1
+        body = yield ty.post_commands(self.device_ids[0], [{'code': 'switch_led', 'value': True}])
+        self.assertIsNone(body)
+        self.assertEqual(self.requests('CommandsHandler'), 1)
+        self.assertEqual(retrier.stats()['retries'], 0)
+
+    @gen_test
+    def test_hedge_budget_holds_under_concurrency(self):
+        retrier = self.retrier(get_device_by_id=RetryPolicy(hedge=True, hedge_delay=0.002))
+        ty = self.tuya(retrier=retrier)
+        yield ty.get_access_token()
+        bodies = yield gen.multi([ty.get_device_by_id(self.device_ids[i % 10]) for i in range(50)])
+        self.assertTrue(all(body['success'] for body in bodies))
+        stats = retrier.stats()
+        self.assertGreater(stats['hedges'], 0)
+        self.assertLessEqual(stats['hedges'], stats['requests'] * retrier.max_hedge_ratio + 1)
@@ -0,0 +1,84 @@
+import socket
+
+from tornado.testing import gen_test
+
+from tuya_api import Router
+from tuya_api.mock import MockTuyaCloud
+
+from .base import MockTestCase
+
+
+def dead_url():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return 'http://127.0.0.1:{port}'.format(port=port)
+
+
+class RouterTest(MockTestCase):
+    cloud_options = {'devices': 2}
+
+    def setUp(self):
+        super().setUp()
+        # 与 self.cloud 共享 token 和设备的第二个地址
+        self.backup = MockTuyaCloud(devices=0, users=0)
+        self.backup.tokens = self.cloud.tokens
+        self.backup.refresh_tokens = self.cloud.refresh_tokens
+        self.backup.devices = self.cloud.devices
+        self.backup.listen()
+
+    def tearDown(self):
+        self.backup.stop()
+        super().tearDown()
+
+    @gen_test
+    def test_fails_over_from_dead_url(self):
+        dead = dead_url()
+        router = Router([dead, self.cloud.url], explore=0, max_failures=2)
+        ty = self.tuya(router=router)
+        bodies = []
+        for _ in range(10):
+            bodies.append((yield ty.get_device_by_id(self.device_ids[0])))
+        self.assertTrue(all(body is not None and body['success'] for body in bodies[1:]))
+        stats = router.stats()
+        self.assertEqual(stats[dead]['errors'], 1)
+        self.assertEqual(stats[self.cloud.url]['errors'], 0)
+
+    @gen_test
+    def test_prefers_faster_url(self):
+        self.cloud.latency = 0.03
+        router = Router([self.cloud.url, self.backup.url], explore=0)
+        ty = self.tuya(router=router)
+        for _ in range(10):
+            body = yield ty.get_device_by_id(self.device_ids[0])
+            self.assertTrue(body['success'])
+        self.assertGreater(self.backup.requests['DeviceHandler'], 7)
+
+    @gen_test
+    def test_token_errors_take_url_out(self):
+        # 不共享 token 的地址返回签名错误，计为失败
+        other = MockTuyaCloud(devices=0, users=0)
+        other.devices = self.cloud.devices
+        other.listen()
+        try:
+            router = Router([self.cloud.url, other.url], explore=0, max_failures=1)
+            ty = self.tuya(router=router)
+            yield ty.get_access_token()
+            for _ in range(5):
+                yield ty.get_device_by_id(self.device_ids[0])
+            stats = router.stats()
+            self.assertTrue(stats[other.url]['down'])
+            self.assertEqual(other.requests['DeviceHandler'], 1)
+        finally:
+            other.stop()
+
+    @gen_test
+    def test_business_errors_do_not_count(self):
+        router = Router([self.cloud.url, self.backup.url], explore=0, max_failures=1)
+        ty = self.tuya(router=router)
+        for _ in range(4):
+            body = yield ty.get_device_by_id('missing')
+            self.assertEqual(body['code'], 1106)
+        self.assertFalse(any(stats['down'] for stats in router.stats().values()))
+        self.assertEqual(sum(stats['errors'] for stats in router.stats().values()), 0)
@@ -0,0 +1,41 @@
+import unittest
+
+from tuya_api import signer as signer_module
+from tuya_api.signer import Signer
+from tuya_api.utils import gen_md5
+
+
+class SignerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1600000000000
+        self.addCleanup(setattr, signer_module, 'current_milli_time', signer_module.current_milli_time)
+        signer_module.current_milli_time = lambda: self.now
+        self.signer = Signer('client_id', 'secret')
+
+    def test_matches_plain_signature(self):
+        headers = self.signer.headers('token', content_type=True)
+        self.assertEqual(headers, {
+            'client_id': 'client_id',
+            'access_token': 'token',
+            'sign': gen_md5('client_id' + 'token' + 'secret' + str(self.now)).upper(),
+            't': str(self.now),
+            'Content-Type': 'application/json'
+        })
+        headers = self.signer.headers()
+        self.assertNotIn('access_token', headers)
+        self.assertEqual(headers['sign'], gen_md5('client_id' + 'secret' + str(self.now)).upper())
+
+    def test_reuses_signature_within_one_millisecond(self):
+        first = self.signer.headers('token')
+        first['sign'] = 'changed by http client'
+        second = self.signer.headers('token')
+        self.assertEqual(second['sign'], gen_md5('client_id' + 'token' + 'secret' + str(self.now)).upper())
+        self.now += 1
+        self.assertEqual(self.signer.headers('token')['t'], str(self.now))
+
+    def test_keeps_recent_tokens_only(self):
+        for i in range(Signer.MAX_PREFIXES + 2):
+            headers = self.signer.headers('token{i}'.format(i=i))
+            self.assertEqual(headers['sign'],
+                             gen_md5('client_id' + 'token{i}'.format(i=i) + 'secret' + str(self.now)).upper())
+        self.assertEqual(self.signer.headers('token0')['access_token'], 'token0')
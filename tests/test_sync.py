@@ -0,0 +1,67 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from tuya_api import LoopExecutor, SyncTuya
+from tuya_api.mock import MockTuyaCloud
+
+
+class LoopExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = LoopExecutor()
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_runs_functions_and_coroutines_on_loop_thread(self):
+        async def coroutine(x):
+            return x, threading.current_thread().name
+
+        self.assertEqual(self.executor.call(coroutine, 1), (1, 'tuya_api-loop'))
+        self.assertEqual(self.executor.call(lambda: threading.current_thread().name), 'tuya_api-loop')
+        self.assertEqual(list(self.executor.map(lambda x: x * 2, range(5))), [0, 2, 4, 6, 8])
+
+    def test_propagates_errors(self):
+        async def fail():
+            raise ValueError('boom')
+
+        self.assertRaises(ValueError, self.executor.call, fail)
+
+    def test_rejects_calls_after_shutdown(self):
+        self.executor.shutdown()
+        self.assertRaises(RuntimeError, self.executor.submit, lambda: None)
+
+
+class SyncTuyaTest(unittest.TestCase):
+    def setUp(self):
+        # mock 云运行在另一个后台事件循环中
+        self.cloud = MockTuyaCloud(devices=10, users=3, latency=0.005)
+        self.cloud_executor = LoopExecutor('mock-loop')
+        self.cloud_executor.call(self.cloud.listen)
+        self.ty = SyncTuya('client_id', 'secret', 'schema', base_url=self.cloud.url, timeout=5)
+        self.device_ids = list(self.cloud.devices)
+
+    def tearDown(self):
+        self.ty.close()
+        self.cloud_executor.call(self.cloud.stop)
+        self.cloud_executor.shutdown()
+
+    def test_calls_from_many_threads_share_one_token(self):
+        with ThreadPoolExecutor(8) as pool:
+            bodies = list(pool.map(self.ty.get_device_by_id, self.device_ids * 3))
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.cloud.requests['TokenHandler'], 1)
+
+    def test_submit_and_map(self):
+        fs = [self.ty.submit('get_device_by_id', device_id) for device_id in self.device_ids]
+        self.assertEqual([f.result(5)['result']['id'] for f in fs], self.device_ids)
+        bodies = list(self.ty.map('get_device_status_by_id', self.device_ids, timeout=5))
+        self.assertTrue(all(body['success'] for body in bodies))
+
+    def test_iter_users(self):
+        users = list(self.ty.iter_users(page_size=2))
+        self.assertEqual(len(users), 3)
+
+    def test_plain_attributes_pass_through(self):
+        self.assertEqual(self.ty.batch_size, 20)
+        self.assertEqual(self.ty.pool.stats()['in_flight'], 0)
@@ -0,0 +1,21 @@
+from tornado import gen
+from tornado.testing import gen_test
+
+from .base import MockTestCase
+
+
+class TokenManagerTest(MockTestCase):
+    @gen_test
+    def test_concurrent_calls_share_one_token_request(self):
+        ty = self.tuya()
+        device_id = self.device_ids[0]
+        bodies = yield gen.multi([ty.get_device_by_id(device_id) for _ in range(50)])
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.requests('TokenHandler'), 1)
+
+    @gen_test
+    def test_concurrent_get_access_token_sends_one_request(self):
+        ty = self.tuya()
+        bodies = yield gen.multi([ty.get_access_token() for _ in range(20)])
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.requests('TokenHandler'), 1)
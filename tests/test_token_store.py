@@ -0,0 +1,142 @@
+import shutil
+import tempfile
+import time
+
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+
+from tuya_api import FileTokenStore, MemoryTokenStore, RedisTokenStore
+
+from .base import MockTestCase
+
+
+class FakeRedis(object):
+    """
+    本地的 Redis 替代，只实现 RedisTokenStore 用到的命令
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+
+    def __expire(self, key):
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+
+    def get(self, key):
+        self.__expire(key)
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        self.__expire(key)
+        if nx and key in self.values:
+            return None
+        self.values[key] = value.encode('utf-8')
+        self.expires.pop(key, None)
+        if px is not None:
+            self.expires[key] = time.monotonic() + px / 1000
+        return True
+
+    def eval(self, script, numkeys, key, owner, *args):
+        # 与 Lua 脚本相同：owner 一致时才续期或删除
+        if self.get(key) != owner.encode('utf-8'):
+            return 0
+        if script == RedisTokenStore.RENEW_SCRIPT:
+            self.expires[key] = time.monotonic() + int(args[0]) / 1000
+        elif script == RedisTokenStore.RELEASE_SCRIPT:
+            del self.values[key]
+            self.expires.pop(key, None)
+        else:
+            raise ValueError(script)
+        return 1
+
+
+class SharedTokenTest(MockTestCase):
+    cloud_options = {'devices': 2, 'latency': 0.02}
+
+    def setUp(self):
+        super().setUp()
+        self.path = tempfile.mkdtemp()
+        self.redis = FakeRedis()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super().tearDown()
+
+    @gen.coroutine
+    def assert_shared(self, *stores):
+        clients = [self.tuya(token_store=store) for store in stores]
+        bodies = yield gen.multi([ty.get_device_by_id(self.device_ids[0]) for ty in clients for _ in range(5)])
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.requests('TokenHandler'), 1)
+        self.assertEqual(len({ty.token_manager.access_token for ty in clients}), 1)
+
+    @gen_test
+    def test_memory_store(self):
+        store = MemoryTokenStore()
+        yield self.assert_shared(store, store, store)
+
+    @gen_test
+    def test_file_store(self):
+        yield self.assert_shared(FileTokenStore(self.path), FileTokenStore(self.path))
+
+    @gen_test
+    def test_redis_store(self):
+        yield self.assert_shared(RedisTokenStore(self.redis), RedisTokenStore(self.redis))
+
+    @gen_test
+    def test_cold_instance_reuses_stored_token(self):
+        store = RedisTokenStore(self.redis)
+        yield self.tuya(token_store=store).get_access_token()
+        body = yield self.tuya(token_store=RedisTokenStore(self.redis)).get_device_by_id(self.device_ids[0])
+        self.assertTrue(body['success'])
+        self.assertEqual(self.requests('TokenHandler'), 1)
+
+    @gen_test
+    def test_background_refresh_happens_once(self):
+        clients = [self.tuya(token_store=RedisTokenStore(self.redis), threshold=60) for _ in range(3)]
+        yield clients[0].get_access_token()
+        yield gen.multi([ty.get_device_by_id(self.device_ids[0]) for ty in clients[1:]])
+        self.assertEqual(self.requests('TokenHandler'), 1)
+
+        # 让 token 进入刷新窗口，但仍然有效，各实例的后台刷新立即触发
+        record = yield clients[0].token_manager.store.load('client_id')
+        old = record['access_token']
+        record['issue_time'] -= (record['expire_time'] - 30) * 1000
+        yield clients[0].token_manager.store.save('client_id', record)
+        for ty in clients:
+            ty.token_manager.update(record)
+        for _ in range(50):
+            yield gen.sleep(0.02)
+            tokens = {ty.token_manager.access_token for ty in clients}
+            if old not in tokens and len(tokens) == 1:
+                break
+        self.assertEqual(len(tokens), 1)
+        self.assertNotIn(old, tokens)
+        self.assertEqual(self.requests('TokenHandler'), 2)
+
+    @gen_test
+    def test_lock_is_renewed_during_slow_fetch(self):
+        self.cloud.latency = 0.3
+        clients = [self.tuya(token_store=RedisTokenStore(self.redis)) for _ in range(3)]
+        for ty in clients:
+            ty.token_manager.lock_ttl = 0.06
+        bodies = yield gen.multi([ty.get_access_token() for ty in clients])
+        self.assertTrue(all(body['success'] for body in bodies))
+        self.assertEqual(self.requests('TokenHandler'), 1)
+
+
+class RedisTokenStoreTest(AsyncTestCase):
+    @gen_test
+    def test_release_keeps_lock_of_new_owner(self):
+        redis = FakeRedis()
+        a, b = RedisTokenStore(redis), RedisTokenStore(redis)
+        self.assertTrue((yield a.acquire('key', 0.01)))
+        yield gen.sleep(0.02)
+        self.assertTrue((yield b.acquire('key', 10)))
+        self.assertFalse((yield a.renew('key', 10)))
+        yield a.release('key')
+        self.assertFalse((yield a.acquire('key', 10)))
+        yield b.release('key')
+        self.assertTrue((yield a.acquire('key', 10)))
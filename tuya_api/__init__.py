@@ -1 +1,23 @@
-from .core import *
\ No newline at end of file
+from .batcher import *
+from .cache import *
+from .core import *
+from .fanout import *
+from .function_index import *
+from .importer import *
+from .limiter import *
+from .metrics import *
+from .mirror import *
+from .pagination import *
+from .pipeline import *
+from .pool import *
+from .provision import *
+from .records import *
+from .registry import *
+from .retry import *
+from .router import *
+from .scheduler import *
+from .signer import *
+from .sync import *
+from .token_manager import *
+from .token_store import *
+from .transport import *
@@ -0,0 +1,228 @@
+import logging
+from collections import OrderedDict
+
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+
+__all__ = ['CommandBatcher', 'ReadBatcher', 'ReadBatchMiddleware']
+
+
+class _DeviceQueue(object):
+    __slots__ = ('commands', 'waiters', 'timer', 'in_flight')
+
+    def __init__(self):
+        self.commands = OrderedDict()
+        self.waiters = []
+        self.timer = None
+        self.in_flight = False
+
+
+class CommandBatcher(object):
+    """
+    按设备合并指令
+
+    同一设备在 linger 时间内的指令合并为一次请求，同一 code 只保留最后一次的值；
+    每个设备同一时间只有一个在途请求，保证下发顺序，每个调用者得到其指令所在请求的响应
+    """
+
+    def __init__(self, send, linger: float=0.005):
+        """
+        :param send: 下发指令的协程函数 send(device_id, commands)
+        :param linger: 合并窗口(s)
+        """
+        self.send = send
+        self.linger = linger
+        self.__queues = {}
+
+        # 统计
+        self.calls = 0
+        self.requests = 0
+        self.merged = 0
+
+    async def post_commands(self, device_id: str, commands: list):
+        """
+        :param device_id: 设备 id
+        :param commands: 命令集
+        :return: 合并后请求的响应
+        """
+        queue = self.__queues.get(device_id)
+        if queue is None:
+            queue = self.__queues[device_id] = _DeviceQueue()
+
+        for command in commands:
+            code = command.get('code', id(command))
+            if code in queue.commands:
+                del queue.commands[code]
+                self.merged += 1
+            queue.commands[code] = command
+
+        future = Future()
+        queue.waiters.append(future)
+        self.calls += 1
+
+        if queue.timer is None and not queue.in_flight:
+            queue.timer = IOLoop.current().call_later(self.linger, self.__flush, device_id)
+        return await future
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'requests': self.requests,
+            'merged': self.merged,
+            'devices': len(self.__queues)
+        }
+
+    def __flush(self, device_id: str):
+        queue = self.__queues[device_id]
+        queue.timer = None
+        commands = list(queue.commands.values())
+        waiters = queue.waiters
+        queue.commands = OrderedDict()
+        queue.waiters = []
+        queue.in_flight = True
+        self.requests += 1
+        IOLoop.current().spawn_callback(self.__send, device_id, commands, waiters)
+
+    async def __send(self, device_id: str, commands: list, waiters: list):
+        try:
+            body = await self.send(device_id, commands)
+        except Exception as e:
+            logging.exception('batch post commands error')
+            for waiter in waiters:
+                waiter.set_exception(e)
+        else:
+            for waiter in waiters:
+                waiter.set_result(body)
+
+        queue = self.__queues[device_id]
+        queue.in_flight = False
+        if queue.waiters:
+            # 请求期间到达的指令已等待过，立即下发
+            self.__flush(device_id)
+        else:
+            del self.__queues[device_id]
+
+
+class ReadBatcher(object):
+    """
+    合并单个设备的读请求
+
+    linger 时间内的设备 id 合并为一次批量请求，达到 max_batch 时立即发出；
+    同一窗口内重复的设备 id 只请求一次，响应按设备 id 拆分给每个调用者
+    """
+
+    def __init__(self, fetch, linger: float=0.005, max_batch: int=20):
+        """
+        :param fetch: 批量查询的协程函数 fetch(device_ids)，返回批量接口的响应
+        :param linger: 合并窗口(s)
+        :param max_batch: 每次批量请求的最大设备数
+        """
+        self.fetch = fetch
+        self.linger = linger
+        self.max_batch = max_batch
+        self.__pending = OrderedDict()
+        self.__timer = None
+
+        # 统计
+        self.calls = 0
+        self.requests = 0
+        self.devices = 0
+
+    async def get(self, device_id: str):
+        """
+        :param device_id: 设备 id
+        :return: (批量接口的响应, 该设备在 result 中的元素)，请求异常时响应为 None，响应中没有该设备时元素为 None
+        """
+        waiters = self.__pending.get(device_id)
+        if waiters is None:
+            waiters = self.__pending[device_id] = []
+        future = Future()
+        waiters.append(future)
+        self.calls += 1
+
+        if len(self.__pending) >= self.max_batch:
+            self.__flush()
+        elif self.__timer is None:
+            self.__timer = IOLoop.current().call_later(self.linger, self.__flush)
+        return await future
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'requests': self.requests,
+            'devices': self.devices,
+            'pending': len(self.__pending)
+        }
+
+    def __flush(self):
+        if self.__timer is not None:
+            IOLoop.current().remove_timeout(self.__timer)
+            self.__timer = None
+        pending, self.__pending = self.__pending, OrderedDict()
+        self.requests += 1
+        self.devices += len(pending)
+        IOLoop.current().spawn_callback(self.__send, pending)
+
+    async def __send(self, pending: OrderedDict):
+        try:
+            body = await self.fetch(list(pending))
+        except Exception:
+            logging.exception('batch read error')
+            body = None
+
+        items = {}
+        if body is not None and body.get('success') is True:
+            items = {item.get('id'): item for item in body.get('result') or []}
+        for device_id, waiters in pending.items():
+            for waiter in waiters:
+                waiter.set_result((body, items.get(device_id)))
+
+
+class ReadBatchMiddleware(object):
+    """
+    把 get_device_by_id/get_device_status_by_id 合并为 get_devices_by_ids/get_devices_status_by_ids，
+    调用者得到的响应与单个查询相同；批量请求失败或批量响应中没有的设备照常单独请求，
+    一个无效的设备 id 不会影响同一批次的其他调用者
+    """
+
+    # {单个接口名: (批量接口名, 从批量结果的元素生成单个接口的 result)}
+    ENDPOINTS = {
+        'get_device_by_id': ('get_devices_by_ids', lambda item: item),
+        'get_device_status_by_id': ('get_devices_status_by_ids', lambda item: list(item.get('status') or [])),
+    }
+
+    def __init__(self, call, linger: float=0.005, max_batch: int=20):
+        """
+        :param call: 调用接口的协程函数 call(name, device_ids=...)
+        :param linger: 合并窗口(s)
+        :param max_batch: 每次批量请求的最大设备数
+        """
+        self.batchers = {
+            name: ReadBatcher(self.__fetcher(call, batch_name), linger, max_batch)
+            for name, (batch_name, _) in self.ENDPOINTS.items()
+        }
+
+    async def __call__(self, request, call_next):
+        batcher = self.batchers.get(request.endpoint.name)
+        if batcher is None or request.key is None:
+            return await call_next(request)
+
+        body, item = await batcher.get(request.key)
+        if body is None or item is None:
+            # 批量请求异常、失败或响应中没有该设备，单独请求，调用者得到单个接口自己的响应
+            return await call_next(request)
+        return {
+            'success': True,
+            'result': self.ENDPOINTS[request.endpoint.name][1](item),
+            't': body.get('t')
+        }
+
+    def stats(self):
+        return {name: batcher.stats() for name, batcher in self.batchers.items()}
+
+    @staticmethod
+    def __fetcher(call, batch_name: str):
+        async def fetch(device_ids: list):
+            return await call(batch_name, device_ids=','.join(device_ids))
+
+        return fetch
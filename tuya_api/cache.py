@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+
+from .utils import SingleFlight
+
+__all__ = ['TTLCache', 'ResponseCache']
+
+_MISSING = object()
+
+
+def is_cacheable(body):
+    return body is not None and body.get('success') is True
+
+
+class TTLCache(object):
+    """
+    带过期时间的 LRU 缓存，同一 key 的并发未命中只会发出一次请求
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        """
+        :param ttl: 过期时间(s)
+        :param max_size: 最大条目数，超过时淘汰最久未使用的条目
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__data = OrderedDict()
+        self.__flight = SingleFlight()
+        self.__fills = {}
+
+    def __len__(self):
+        return len(self.__data)
+
+    def get(self, key, default=None):
+        value = self.__get(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        self.__data[key] = (time.monotonic() + self.ttl, value)
+        self.__data.move_to_end(key)
+        while len(self.__data) > self.max_size:
+            self.__data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        删除条目，正在进行的请求结果也不会再写入
+        """
+        self.__data.pop(key, None)
+        self.__fills.pop(key, None)
+        self.__flight.forget(key)
+
+    def clear(self):
+        self.__data.clear()
+        self.__fills.clear()
+
+    async def get_or_fetch(self, key, func, *args):
+        """
+        命中时直接返回，未命中时调用 func(*args)，只缓存 success 为 True 的响应
+        :param key: 缓存 key
+        :param func: 协程函数
+        :return: 响应
+        """
+        value = self.__get(key)
+        if value is not _MISSING:
+            return value
+        return await self.__flight.do(key, self.__fill, key, func, args)
+
+    def stats(self):
+        return {
+            'size': len(self.__data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    def __get(self, key):
+        item = self.__data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self.__data[key]
+            self.misses += 1
+            return _MISSING
+        self.__data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    async def __fill(self, key, func, args):
+        token = self.__fills[key] = object()
+        try:
+            body = await func(*args)
+        finally:
+            # 请求期间 key 被 invalidate 时不写入
+            valid = self.__fills.get(key) is token
+            if valid:
+                del self.__fills[key]
+        if valid and is_cacheable(body):
+            self.set(key, body)
+        return body
+
+
+class ResponseCache(object):
+    """
+    按接口划分的响应缓存，只对配置了的接口生效
+
+        ty = Tuya(..., cache=ResponseCache())
+        ty = Tuya(..., cache=ResponseCache({'get_device_by_id': (30, 5000)}))
+    """
+
+    DEFAULT_CONFIG = {
+        'get_functions_by_category': (3600, 256),
+        'get_functions_by_id': (3600, 10000),
+        'get_device_by_id': (60, 10000)
+    }
+
+    def __init__(self, config: dict=None):
+        """
+        :param config: {接口名: (ttl, max_size)}，默认为 DEFAULT_CONFIG
+        """
+        config = self.DEFAULT_CONFIG if config is None else config
+        self.caches = {name: TTLCache(ttl, max_size) for name, (ttl, max_size) in config.items()}
+
+    def get(self, name: str):
+        """
+        :param name: 接口名
+        :return: 接口对应的 TTLCache，未配置时为 None
+        """
+        return self.caches.get(name)
+
+    def invalidate(self, name: str, key):
+        cache = self.caches.get(name)
+        if cache is not None:
+            cache.invalidate(key)
+
+    def clear(self):
+        for cache in self.caches.values():
+            cache.clear()
+
+    def stats(self):
+        return {name: cache.stats() for name, cache in self.caches.items()}
@@ -0,0 +1,22 @@
+"""
+JSON 编解码，优先使用 orjson，其次 ujson，都未安装时使用标准库 json
+"""
+try:
+    import orjson
+
+    NAME = 'orjson'
+    loads = orjson.loads
+    dumps = orjson.dumps
+except ImportError:
+    try:
+        import ujson
+
+        NAME = 'ujson'
+        loads = ujson.loads
+        dumps = ujson.dumps
+    except ImportError:
+        import json
+
+        NAME = 'json'
+        loads = json.loads
+        dumps = json.dumps
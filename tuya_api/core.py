@@ -1,17 +1,84 @@
-import hashlib
-import json
 import logging
 import time
 
-from tornado import httpclient
-
-
-def current_milli_time():
-    return int(round(time.time() * 1000))
-
-
-def gen_md5(s):
-    return hashlib.md5(s.encode('utf-8')).hexdigest()
+from tornado import gen, locks
+
+from . import codec
+from .batcher import CommandBatcher, ReadBatchMiddleware
+from .cache import ResponseCache
+from .fanout import CommandFanOut
+from .function_index import FunctionIndex
+from .importer import UserImport, user_key
+from .limiter import RateLimiter
+from .metrics import Metrics, MetricsMiddleware
+from .pagination import UserIterator
+from .pipeline import (CacheMiddleware, CoalesceMiddleware, Endpoint, Pipeline, RateLimitMiddleware, Request,
+                       RetryMiddleware, SignMiddleware)
+from .pool import HTTPPool
+from .records import RECORD_DECODERS
+from .retry import Retrier
+from .router import REGIONS, Router
+from .scheduler import FairScheduler, SchedulerMiddleware
+from .token_manager import TokenManager
+from .utils import chunked, gen_md5
+
+# 接口声明
+ENDPOINTS = {endpoint.name: endpoint for endpoint in [
+    # token 相关
+    Endpoint('get_access_token', 'GET', '/v1.0/token?grant_type={grant_type}&code={code}',
+             kind='token', signed=False),
+    Endpoint('refresh_token', 'GET', '/v1.0/token/{refresh_token}', kind='token', signed=False),
+    # 用户相关接口
+    Endpoint('get_users', 'GET', '/v1.0/apps/{schema}/users?page_no={page_no}&page_size={page_size}'),
+    Endpoint('add_user', 'POST', '/v1.0/apps/{schema}/user', kind='command'),
+    Endpoint('get_user_devices_by_uid', 'GET', '/v1.0/users/{uid}/devices', key='uid'),
+    # 设备相关接口
+    Endpoint('generate_device_token', 'POST', '/v1.0/devices/token', kind='command'),
+    Endpoint('get_devices_by_token', 'GET', '/v1.0/devices/tokens/{token}', key='token'),
+    Endpoint('get_device_by_id', 'GET', '/v1.0/devices/{device_id}', key='device_id'),
+    Endpoint('get_devices_by_ids', 'GET', '/v1.0/devices?device_ids={device_ids}'),
+    Endpoint('get_functions_by_category', 'GET', '/v1.0/functions/{category}', key='category'),
+    Endpoint('get_functions_by_id', 'GET', '/v1.0/devices/{device_id}/functions', key='device_id'),
+    Endpoint('get_device_status_by_id', 'GET', '/v1.0/devices/{device_id}/status', key='device_id'),
+    Endpoint('get_devices_status_by_ids', 'GET', '/v1.0/devices/status?device_ids={device_ids}'),
+    Endpoint('post_commands', 'POST', '/v1.0/devices/{device_id}/commands', kind='command',
+             key='device_id', invalidates=('get_device_by_id', 'get_device_status_by_id')),
+    Endpoint('delete_device_by_id', 'DELETE', '/v1.0/devices/{device_id}', kind='command',
+             key='device_id', invalidates=('get_device_by_id', 'get_device_status_by_id', 'get_functions_by_id')),
+]}
+
+
+def merge_batch(chunks: list, bodies: list):
+    """
+    合并分批请求的响应
+    :param chunks: 每批的设备 id list
+    :param bodies: 每批对应的响应，请求异常时为 None
+    :return: 合并后的响应，失败的批次记录在 failed 中，全部失败时 success 为 False
+    """
+    result = []
+    failed = []
+    t = None
+    for chunk, body in zip(chunks, bodies):
+        if body is not None and body.get('success') is True:
+            result.extend(body.get('result') or [])
+            t = body.get('t', t)
+        else:
+            failed.append({
+                'device_ids': chunk,
+                'code': body.get('code') if body is not None else None,
+                'msg': body.get('msg') if body is not None else 'request error'
+            })
+
+    merged = {
+        'success': len(failed) < len(chunks),
+        'result': result,
+        't': t,
+        'failed': failed
+    }
+    if not merged['success']:
+        merged['code'] = failed[0]['code']
+        merged['msg'] = failed[0]['msg']
+    return merged
 
 
 class Tuya(object):
@@ -20,109 +87,186 @@ class Tuya(object):
                  secret: str,
                  schema: str,
                  threshold: int=300,
-                 region: str='cn'):
+                 region: str='cn',
+                 token_store=None,
+                 batch_size: int=20,
+                 batch_concurrency: int=5,
+                 pool: HTTPPool=None,
+                 cache: ResponseCache=None,
+                 command_linger: float=None,
+                 rate_limiter: RateLimiter=None,
+                 retrier: Retrier=None,
+                 validate_cert: bool=True,
+                 metrics: Metrics=None,
+                 base_url: str=None,
+                 router: Router=None,
+                 scheduler: FairScheduler=None,
+                 tenant: str=None,
+                 function_index: FunctionIndex=None,
+                 records: bool=False,
+                 coalesce=None,
+                 read_linger: float=None):
         """
         :param client_id: 云 API 授权中的 AccessId
         :param secret: 云 API 授权中的 AccessKey
         :param schema: 应用包名
         :param threshold: 刷新 access_token 的临界值，默认提前 300s
         :param region: 根据环境切换接口地址，['cn', 'us', 'eu'] 默认为 cn
+        :param token_store: 多进程/多主机共享 token 的 TokenStore，默认不共享
+        :param batch_size: 批量接口每次请求的最大 id 数量，默认 20
+        :param batch_concurrency: 批量接口分批后的最大并发请求数，默认 5
+        :param pool: HTTP 连接池，默认为 HTTPPool()
+        :param cache: 读接口的响应缓存，默认不缓存
+        :param command_linger: post_commands 合并同一设备指令的窗口(s)，默认不合并
+        :param rate_limiter: 客户端限流，默认不限流
+        :param retrier: 按接口重试网络错误，读接口可以开启对冲请求，默认不重试
+        :param validate_cert: 是否校验服务端证书
+        :param metrics: 按接口统计各阶段耗时、错误数和在途请求数，默认不统计
+        :param base_url: 接口地址，设置后忽略 region，如本地的 mock 服务
+        :param router: 在多个接口地址之间按延迟和错误率选择并自动切换，设置后忽略 region 和 base_url
+        :param scheduler: 多个实例共享连接池时的公平调度器，默认不调度
+        :param tenant: 在 scheduler 中的租户名，默认为 client_id
+        :param function_index: 指令集索引，post_commands 发出前在本地校验指令，默认不校验
+        :param records: 设备、状态、用户接口的 result 流式解析为 Device/Status/User 记录，默认为 dict
+        :param coalesce: 合并并发的相同读请求，True 为全部读接口，或需要合并的接口名 list，默认不合并
+        :param read_linger: get_device_by_id/get_device_status_by_id 合并为批量请求的窗口(s)，默认不合并，
+                            每次批量请求最多 batch_size 个设备
         """
 
-        self.__sign = None
-        self.__access_token = None
-        self.__refresh_token = None
         # 刷新 token 的临界值，默认为提前 300s 刷新token
         self.token_threshold = threshold
-        # 13位标准时间戳
-        self.__expire_time = 0
-        self.__timestamp = 0
 
-        if region not in ['cn', 'us', 'eu']:
+        if region not in REGIONS:
             raise ValueError('region value is no expect')
 
-        self.__url = 'https://openapi.tuya{region}.com'.format(region=region)
+        self.router = router or Router([base_url or REGIONS[region]])
 
         self.client_id = client_id
         self.secret = secret
         self.schema = schema
+        self.batch_size = batch_size
+        self.batch_concurrency = batch_concurrency
+        self.validate_cert = validate_cert
+        self.decoders = RECORD_DECODERS if records else {}
+
+        self.__own_pool = pool is None
+        self.pool = pool or HTTPPool()
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retrier = retrier
+        self.metrics = metrics
+        self.function_index = function_index
+        self.coalescer = None
+        if coalesce:
+            self.coalescer = CoalesceMiddleware(None if coalesce is True else coalesce)
+        if function_index is not None and function_index.tuya is None:
+            function_index.tuya = self
+        self.command_batcher = None
+        if command_linger is not None:
+            self.command_batcher = CommandBatcher(self.__send_commands, command_linger)
+        self.read_batcher = None
+        if read_linger is not None:
+            self.read_batcher = ReadBatchMiddleware(self.__call, read_linger, batch_size)
+        self.token_manager = TokenManager(self.__request_token, self.__request_refresh, threshold,
+                                          store=token_store, key=client_id)
+
+        middlewares = []
+        if metrics is not None:
+            middlewares.append(MetricsMiddleware(metrics))
+        if self.coalescer is not None:
+            middlewares.append(self.coalescer)
+        if cache is not None:
+            middlewares.append(CacheMiddleware(cache))
+        if self.read_batcher is not None:
+            middlewares.append(self.read_batcher)
+        if retrier is not None:
+            middlewares.append(RetryMiddleware(retrier))
+        if rate_limiter is not None:
+            middlewares.append(RateLimitMiddleware(rate_limiter))
+        if scheduler is not None:
+            middlewares.append(SchedulerMiddleware(scheduler, tenant or client_id))
+        middlewares.append(SignMiddleware(client_id, secret, self.token_manager))
+        self.pipeline = Pipeline(self.__send, middlewares)
+
+    def close(self):
+        """
+        停止后台刷新 token，关闭自行创建的连接池
+        """
+        self.token_manager.close()
+        if self.__own_pool:
+            self.pool.close()
+
+    async def aclose(self):
+        """
+        同 close，等待连接池关闭完成，aiohttp/httpx 后端需要使用
+        """
+        self.token_manager.close()
+        if self.__own_pool:
+            await self.pool.aclose()
+
+    # 请求
+    async def __call(self, name: str, data=None, **params):
+        endpoint = ENDPOINTS[name]
+        request = Request(endpoint, endpoint.render(params), data, params.get(endpoint.key),
+                          self.decoders.get(name))
+        try:
+            return await self.pipeline(request)
+        except Exception:
+            logging.exception('%s error', name)
+            return None
 
-        self.__http_client = httpclient.AsyncHTTPClient()
-
-    # 计算签名
-    def __calc_sign(self, has_token: bool=False):
-        # has_token 为 True 时，access_token 必须存在
-        self.__timestamp = current_milli_time()
-
-        if has_token is True:
-            if self.__access_token is None:
-                raise Exception('Tuya.__calc_sign: access token is None!')
-            token = self.__access_token
-        else:
-            token = ''
-
-        s = self.client_id + token + self.secret + str(self.__timestamp)
-        self.__sign = gen_md5(s).upper()
-
-    # 获取请求头
-    async def __get_header(self):
-        if self.__access_token is None or (current_milli_time() > self.__timestamp + self.__expire_time):
-            # token 不存在或已过期，重新获取 token
-            await self.get_access_token()
-        elif current_milli_time() > self.__timestamp + self.__expire_time + (self.token_threshold * 1000):
-            # token 过期时间大于临界值时
-            await self.__refresh_token()
-
-        self.__calc_sign(has_token=True)
-        header = {
-            'client_id': self.client_id,
-            'access_token': self.__access_token,
-            'sign': self.__sign,
-            't': str(self.__timestamp)
-        }
-        return header
+    async def __send(self, request: Request):
+        url = self.router.choose()
+        try:
+            response = await self.pool.fetch(
+                request=url + request.path,
+                method=request.endpoint.method,
+                headers=request.headers,
+                body=codec.dumps(request.data) if request.data is not None else None,
+                validate_cert=self.validate_cert,
+                timings=request.timings
+            )
+        except Exception:
+            self.router.report(url, 0, False)
+            raise
+        decode = request.decode or codec.loads
+        start = time.monotonic()
+        try:
+            body = decode(response.body)
+        except Exception:
+            self.router.report(url, 0, False)
+            raise
+        if request.timings is not None:
+            request.timings['decode'] = request.timings.get('decode', 0) + time.monotonic() - start
+        # request_time 不包含在连接池中排队的时间；签名和 token 错误也计为该地址失败
+        self.router.report(url, response.request_time, not self.router.is_failure(body))
+        return body
+
+    # 批量请求
+    async def __batch(self, name: str, device_ids: list, chunk_size: int=None):
+        # 只有一批时同样合并，响应中总是有 failed
+        chunks = chunked(device_ids, chunk_size or self.batch_size) or [[]]
+        if len(chunks) == 1:
+            return merge_batch(chunks, [await self.__call(name, device_ids=','.join(chunks[0]))])
+
+        semaphore = locks.Semaphore(self.batch_concurrency)
+
+        async def fetch_chunk(chunk):
+            async with semaphore:
+                return await self.__call(name, device_ids=','.join(chunk))
+
+        bodies = await gen.multi([fetch_chunk(chunk) for chunk in chunks])
+        return merge_batch(chunks, bodies)
 
     # token 相关
     async def get_access_token(self, grant_type: int=1, code: str=None):
         """
-        获取 access_token
+        获取 access_token，并发调用时只会发出一次请求
         :param grant_type: 授权模式 1-简易模式 2-授权码模式
         :param code: 授权码
         :return:
         """
-        try:
-            self.__calc_sign()
-            url = '{url}/v1.0/token?grant_type={grant_type}&code={code}' \
-                .format(url=self.__url, grant_type=grant_type, code=code)
-
-            headers = {
-                'client_id': self.client_id,
-                'sign': self.__sign,
-                't': str(self.__timestamp)
-            }
-
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=headers,
-                validate_cert=False
-            )
-            if response.error:
-                logging.exception('get access token error: ', response.error)
-                return None
-            else:
-                body_str = response.body
-                body = json.loads(body_str)
-
-                if body['success'] is True:
-                    self.__access_token = body['result']['access_token']
-                    self.__refresh_token = body['result']['refresh_token']
-                    self.__expire_time = body['result']['expire_time'] * 1000
-                    return body
-                else:
-                    raise Exception(body['msg'])
-        except Exception as e:
-            logging.exception('get access token error: ', e)
-            return None
+        return await self.token_manager.fetch(grant_type=grant_type, code=code)
 
     async def refresh_token(self, grant_type: int=1, code: str=None):
         """
@@ -131,39 +275,21 @@ class Tuya(object):
         :param code: 授权码
         :return:
         """
-        try:
-            if self.__access_token is None or self.__refresh_token is None:
-                return await self.get_access_token(grant_type=grant_type, code=code)
-            self.__calc_sign(False)
-            url = '{url}/v1.0/token/{refresh_token}'.format(url=self.__url, refresh_token=self.__refresh_token)
-            headers = {
-                'client_id': self.client_id,
-                'sign': self.__sign,
-                't': str(self.__timestamp)
-            }
-
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=headers,
-                validate_cert=False
-            )
-            if response.error:
-                logging.exception('refresh token error: ', response.error)
-                return None
-            else:
-                body_str = response.body
-                body = json.loads(body_str)
-
-                if body['success'] is True:
-                    self.__access_token = body['result']['access_token']
-                    self.__refresh_token = body['result']['refresh_token']
-                    self.__expire_time = body['result']['expire_time'] * 1000
-                    return body
-                else:
-                    raise Exception(body['msg'])
-        except Exception as e:
-            logging.exception('refresh token error: ', e)
+        return await self.token_manager.refresh(grant_type=grant_type, code=code)
+
+    async def __request_token(self, grant_type: int=1, code: str=None):
+        body = await self.__call('get_access_token', grant_type=grant_type, code=code)
+        if body is not None and body.get('success') is not True:
+            logging.error('get access token error: %s', body.get('msg'))
             return None
+        return body
+
+    async def __request_refresh(self, refresh_token: str):
+        body = await self.__call('refresh_token', refresh_token=refresh_token)
+        if body is not None and body.get('success') is not True:
+            logging.error('refresh token error: %s', body.get('msg'))
+            return None
+        return body
 
     # 用户相关接口
     async def get_users(self, page_no: int or str='1', page_size: int or str='10'):
@@ -173,24 +299,17 @@ class Tuya(object):
         :param page_size: 页大小
         :return:
         """
-        try:
-            page_no = int(page_no)
-            page_size = int(page_size)
-            headers = await self.__get_header()
-            url = '{url}/v1.0/apps/{schema}/users?page_no={page_no}&page_size={page_size}'\
-                .format(url=self.__url, schema=self.schema, page_no=page_no, page_size=page_size)
-
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=headers,
-                validate_cert=False
-            )
+        return await self.__call('get_users', schema=self.schema,
+                                 page_no=int(page_no), page_size=int(page_size))
 
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get users error: ', e)
-            return None
+    def iter_users(self, page_size: int=100, prefetch: int=2):
+        """
+        遍历全部用户，消费当前页时预取后续页
+        :param page_size: 页大小
+        :param prefetch: 预取的页数
+        :return: UserIterator，可配合 async for 使用
+        """
+        return UserIterator(self, page_size=page_size, prefetch=prefetch)
 
     async def add_user(self, country_code: str, username: str,
                        password: str, nick_name: str, username_type: str='3'):
@@ -203,30 +322,25 @@ class Tuya(object):
         :param username_type: 用户名类型
         :return:
         """
-        try:
-            headers = await self.__get_header()
-            headers['Content-Type'] = 'application/json'
-            url = '{url}/v1.0/apps/{schema}/user'.format(url=self.__url, schema=self.schema)
-
-            data = {
-                'country_code': country_code,
-                'username': username,
-                'password': gen_md5(password),
-                'nick_name': nick_name,
-                'username_type': username_type
-            }
-            body = json.dumps(data)
-            response = await self.__http_client.fetch(
-                request=url,
-                method='POST',
-                headers=headers,
-                body=body
-            )
-            res = json.loads(response.body)
-            return res
+        data = {
+            'country_code': country_code,
+            'username': username,
+            'password': gen_md5(password),
+            'nick_name': nick_name,
+            'username_type': username_type
+        }
+        return await self.__call('add_user', data, schema=self.schema)
 
-        except Exception as e:
-            logging.exception('post user error: ', e)
+    def import_users(self, rows, concurrency: int=10, checkpoint=None, key=user_key):
+        """
+        批量注册用户
+        :param rows: 用户 dict 的可迭代对象，字段同 add_user 的参数，可使用 iter_csv/iter_jsonl 读取文件
+        :param concurrency: 最大并发请求数
+        :param checkpoint: 记录已注册的用户，中断后重新导入时跳过，如 FileCheckpoint
+        :param key: 根据行数据生成 checkpoint key 的函数
+        :return: UserImport，可配合 async for 逐行获取 ImportResult
+        """
+        return UserImport(self, rows, concurrency=concurrency, checkpoint=checkpoint, key=key)
 
     async def get_user_devices_by_uid(self, uid: str):
         """
@@ -234,18 +348,7 @@ class Tuya(object):
         :param uid: 用户 id
         :return:
         """
-        try:
-            url = '{url}/v1.0/users/{uid}/devices'.format(url=self.__url, uid=uid)
-            response =  await self.__http_client.fetch(
-                request=url,
-                headers=await self.__get_header(),
-                validate_cert=False
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get user devices error: ', e)
-            return None
+        return await self.__call('get_user_devices_by_uid', uid=uid)
 
     # 设备相关接口
     async def generate_device_token(self, uid: str, time_zone_id: str,
@@ -259,29 +362,14 @@ class Tuya(object):
         :param lang: 系统语言
         :return:
         """
-        try:
-            url = '{url}/v1.0/devices/token'.format(url=self.__url)
-            headers = await self.__get_header()
-            headers['Content-Type'] = 'application/json'
-            data = {
-                'uid': uid,
-                'timeZoneId': time_zone_id,
-                'lon': lon,
-                'lat': lat,
-                'lang': lang
-            }
-            body = json.dumps(data)
-            response = await self.__http_client.fetch(
-                request=url,
-                method='POST',
-                headers=headers,
-                body=body
-            )
-
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('post devices token error: ', e)
+        data = {
+            'uid': uid,
+            'timeZoneId': time_zone_id,
+            'lon': lon,
+            'lat': lat,
+            'lang': lang
+        }
+        return await self.__call('generate_device_token', data)
 
     async def get_devices_by_token(self, token: str):
         """
@@ -289,17 +377,7 @@ class Tuya(object):
         :param token: 配网 token
         :return:
         """
-        try:
-            url = '{url}/v1.0/devices/tokens/{token}'.format(url=self.__url, token=token)
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=await self.__get_header(),
-                validate_cert=False
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get devices token error: ', e)
+        return await self.__call('get_devices_by_token', token=token)
 
     async def get_device_by_id(self, device_id: str):
         """
@@ -307,35 +385,16 @@ class Tuya(object):
         :param device_id: 设备 id
         :return:
         """
-        try:
-            url = '{url}/v1.0/devices/{device_id}'.format(url=self.__url, device_id=device_id)
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=await self.__get_header(),
-                validate_cert=False
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get device error', e)
+        return await self.__call('get_device_by_id', device_id=device_id)
 
-    async def get_devices_by_ids(self, device_ids: list):
+    async def get_devices_by_ids(self, device_ids: list, chunk_size: int=None):
         """
-        批量获取设备信息
+        批量获取设备信息，device_ids 超过 chunk_size 时自动分批并发请求
         :param device_ids: 设备 id list
-        :return:
+        :param chunk_size: 每批 id 数量，默认为 batch_size
+        :return: 合并后的响应，失败的批次记录在 failed 中，请求异常时 success 为 False
         """
-        try:
-            url = '{url}/v1.0/devices?device_ids={device_ids}'.format(url=self.__url, device_ids=','.join(device_ids))
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=await self.__get_header(),
-                validate_cert=False
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get devices error: ', e)
+        return await self.__batch('get_devices_by_ids', device_ids, chunk_size)
 
     async def get_functions_by_category(self, category: str):
         """
@@ -343,17 +402,7 @@ class Tuya(object):
         :param category: 设备分类
         :return:
         """
-        try:
-            url = '{url}/v1.0/functions/{category}'.format(url=self.__url, category=category)
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=await self.__get_header(),
-                validate_cert=False
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get functions by category error: ', e)
+        return await self.__call('get_functions_by_category', category=category)
 
     async def get_functions_by_id(self, device_id: str):
         """
@@ -361,17 +410,7 @@ class Tuya(object):
         :param device_id: 设备 id
         :return:
         """
-        try:
-            url = '{url}/v1.0/devices/{deviceId}/functions'.format(url=self.__url, deviceId=device_id)
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=await self.__get_header(),
-                validate_cert=False
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get functions by device id error: ', e)
+        return await self.__call('get_functions_by_id', device_id=device_id)
 
     async def get_device_status_by_id(self, device_id: str):
         """
@@ -379,59 +418,49 @@ class Tuya(object):
         :param device_id: 设备 id
         :return:
         """
-        try:
-            url = '{url}/v1.0/devices/{device_id}/status'.format(url=self.__url, device_id=device_id)
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=await self.__get_header(),
-                validate_cert=False
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get device status error: ', e)
+        return await self.__call('get_device_status_by_id', device_id=device_id)
 
-    async def get_devices_status_by_ids(self, device_ids: list):
+    async def get_devices_status_by_ids(self, device_ids: list, chunk_size: int=None):
         """
-        批量获取设备状态
+        批量获取设备状态，device_ids 超过 chunk_size 时自动分批并发请求
         :param device_ids: 设备 id list
-        :return:
+        :param chunk_size: 每批 id 数量，默认为 batch_size
+        :return: 合并后的响应，失败的批次记录在 failed 中，请求异常时 success 为 False
         """
-        try:
-            url = '{url}/v1.0/devices/status?device_ids={device_ids}'\
-                .format(url=self.__url, device_ids=','.join(device_ids))
-            response = await self.__http_client.fetch(
-                request=url,
-                headers=await self.__get_header(),
-                validate_cert=False
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('get devices status error: ', e)
+        return await self.__batch('get_devices_status_by_ids', device_ids, chunk_size)
 
     async def post_commands(self, device_id: str, commands: list):
         """
-        根据设备 id 对设备下发指令
+        根据设备 id 对设备下发指令，配置 command_linger 时合并同一设备的指令，
+        配置 function_index 时先在本地校验，不合法时直接返回失败
         :param device_id: 设备 id
         :param commands: 命令集
         :return:
         """
-        try:
-            url = '{url}/v1.0/devices/{device_id}/commands'.format(url=self.__url, device_id=device_id)
-            headers = await self.__get_header()
-            headers['Content-Type'] = 'application/json'
-            body = json.dumps({'commands': commands})
-            response = await self.__http_client.fetch(
-                request=url,
-                method='POST',
-                headers=headers,
-                body=body
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('post commands error:', e)
+        if self.function_index is not None:
+            rejected = self.function_index.reject(device_id, commands)
+            if rejected is not None:
+                return rejected
+        if self.command_batcher is not None:
+            return await self.command_batcher.post_commands(device_id, commands)
+        return await self.__send_commands(device_id, commands)
+
+    async def __send_commands(self, device_id: str, commands: list):
+        return await self.__call('post_commands', {'commands': commands}, device_id=device_id)
+
+    def broadcast_commands(self, device_ids, commands: list, concurrency: int=50, retries: int=2,
+                           retry_codes: tuple=()):
+        """
+        向一批设备下发同一组指令
+        :param device_ids: 设备 id 的可迭代对象
+        :param commands: 命令集
+        :param concurrency: 最大并发请求数
+        :param retries: 每个设备被限流或 code 在 retry_codes 中时的最大重试次数，网络错误由 retrier 处理
+        :param retry_codes: 需要重试的响应 code
+        :return: CommandFanOut，可配合 async for 逐个获取 FanOutResult
+        """
+        return CommandFanOut(self, device_ids, commands, concurrency=concurrency, retries=retries,
+                             retry_codes=retry_codes)
 
     async def delete_device_by_id(self, device_id: str):
         """
@@ -439,15 +468,7 @@ class Tuya(object):
         :param device_id: 设备 id
         :return:
         """
-        try:
-            url = '{url}/v1.0/devices/{device_id}'.format(url=self.__url, device_id=device_id)
-            response = await self.__http_client.fetch(
-                request=url,
-                method="DELETE",
-                headers= await self.__get_header()
-            )
-            body = json.loads(response.body)
-            return body
-        except Exception as e:
-            logging.exception('delete device error: ', e)
-
+        body = await self.__call('delete_device_by_id', device_id=device_id)
+        if self.function_index is not None and body is not None and body.get('success') is True:
+            self.function_index.remove(device_id)
+        return body
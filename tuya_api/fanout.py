@@ -0,0 +1,170 @@
+import logging
+import random
+import time
+
+from tornado import gen
+
+from .utils import CompletionStream
+
+__all__ = ['FanOutResult', 'CommandFanOut']
+
+
+class FanOutResult(object):
+    """
+    一个设备的下发结果，status 为 succeeded/failed
+    """
+
+    __slots__ = ('device_id', 'status', 'body', 'attempts', 'elapsed')
+
+    def __init__(self, device_id: str, status: str, body: dict=None, attempts: int=1, elapsed: float=0):
+        """
+        :param device_id: 设备 id
+        :param status: succeeded-成功 failed-重试后仍失败
+        :param body: 最后一次 post_commands 的响应，请求异常时为 None
+        :param attempts: 请求次数
+        :param elapsed: 从第一次请求到得到结果的时间(s)，包含重试的退避
+        """
+        self.device_id = device_id
+        self.status = status
+        self.body = body
+        self.attempts = attempts
+        self.elapsed = elapsed
+
+
+class CommandFanOut(object):
+    """
+    向一批设备下发同一组指令
+
+    最多同时进行 concurrency 个 post_commands 请求，请求经过 Tuya 的限流、签名等中间件，
+    与其他调用共享同一个 RateLimiter；响应被限流或 code 在 retry_codes 中时退避后重试该设备，
+    网络错误只由 Tuya 的 Retrier 重试，避免重复下发已送达的指令。
+    哪个设备先完成就先返回哪个设备的 FanOutResult，device_ids 只在有空闲名额时才会继续读取
+
+        job = ty.broadcast_commands(device_ids, [{'code': 'switch_led', 'value': False}], concurrency=100)
+        async for result in job:
+            if result.status == 'failed':
+                logging.error('%s: %s', result.device_id, result.body)
+        job.stats()
+    """
+
+    def __init__(self,
+                 tuya,
+                 device_ids,
+                 commands: list,
+                 concurrency: int=50,
+                 retries: int=2,
+                 backoff: float=0.5,
+                 max_backoff: float=8,
+                 retry_codes: tuple=()):
+        """
+        :param tuya: Tuya 实例
+        :param device_ids: 设备 id 的可迭代对象
+        :param commands: 指令集，每个设备相同
+        :param concurrency: 最大并发请求数
+        :param retries: 每个设备被限流或 code 在 retry_codes 中时的最大重试次数
+        :param backoff: 退避基数(s)，第 n 次重试最多等待 backoff * 2^n
+        :param max_backoff: 最长退避时间(s)
+        :param retry_codes: 需要重试的响应 code，如设备暂时离线
+        """
+        self.tuya = tuya
+        self.commands = commands
+        self.concurrency = max(concurrency, 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_codes = set(retry_codes)
+        try:
+            self.total = len(device_ids)
+        except TypeError:
+            self.total = None
+
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+
+        self.__stream = CompletionStream(device_ids, self.__start, self.concurrency)
+        self.__started = None
+        self.__finished = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.__started is None:
+            self.__started = time.monotonic()
+        try:
+            return await self.__stream.__anext__()
+        except StopAsyncIteration:
+            if self.__finished is None:
+                self.__finished = time.monotonic()
+            raise
+
+    async def wait(self):
+        """
+        下发全部设备，不逐个处理结果时使用
+        :return: 失败的 FanOutResult list
+        """
+        return [result async for result in self if result.status == 'failed']
+
+    @property
+    def done(self):
+        return self.succeeded + self.failed
+
+    def stats(self):
+        """
+        :return: throughput 为每秒完成的设备数，eta 为按当前速度剩余的时间(s)，总数未知时为 None
+        """
+        elapsed = 0
+        if self.__started is not None:
+            elapsed = (self.__finished or time.monotonic()) - self.__started
+        throughput = self.done / elapsed if elapsed > 0 else 0
+        eta = None
+        if self.total is not None and throughput > 0:
+            eta = (self.total - self.done) / throughput
+        return {
+            'total': self.total,
+            'done': self.done,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'retried': self.retried,
+            'running': self.__stream.running,
+            'elapsed': elapsed,
+            'throughput': throughput,
+            'eta': eta
+        }
+
+    def __start(self, index: int, device_id: str):
+        return self.__send(device_id)
+
+    def __should_retry(self, body):
+        # 网络错误时指令可能已经送达，由 Retrier 按 post_commands 的策略决定能否重试
+        if body is None or body.get('success') is True:
+            return False
+        if body.get('code') in self.retry_codes:
+            return True
+        rate_limiter = self.tuya.rate_limiter
+        return rate_limiter is not None and rate_limiter.is_throttled(body)
+
+    async def __send(self, device_id: str):
+        start = time.monotonic()
+        body = None
+        attempt = 0
+        while True:
+            try:
+                body = await self.tuya.post_commands(device_id, self.commands)
+            except Exception:
+                logging.exception('fan out commands to %s error', device_id)
+                body = None
+            if attempt >= self.retries or not self.__should_retry(body):
+                break
+            await gen.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            attempt += 1
+            self.retried += 1
+
+        if body is not None and body.get('success') is True:
+            self.succeeded += 1
+            status = 'succeeded'
+        else:
+            self.failed += 1
+            status = 'failed'
+        return FanOutResult(device_id, status, body, attempt + 1, time.monotonic() - start)
@@ -0,0 +1,397 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+from tornado.ioloop import IOLoop
+
+from .utils import SingleFlight, current_milli_time
+
+__all__ = ['FunctionSpec', 'FunctionIndex']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS specs (hash TEXT PRIMARY KEY, functions TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS categories (category TEXT PRIMARY KEY, hash TEXT NOT NULL, updated INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS devices (device_id TEXT PRIMARY KEY, category TEXT, hash TEXT NOT NULL,
+                                    updated INTEGER NOT NULL);
+"""
+
+
+class FunctionSpec(object):
+    """
+    一个功能点的指令集说明
+    """
+
+    __slots__ = ('code', 'type', 'name', 'values')
+
+    def __init__(self, code: str, type: str, name: str=None, values: dict=None):
+        """
+        :param code: 功能点
+        :param type: Boolean/Integer/Enum/String/Json 等
+        :param name: 名称
+        :param values: 取值范围，如 {"min": 25, "max": 255, "scale": 0, "step": 1}、{"range": [...]}
+        """
+        self.code = code
+        self.type = type
+        self.name = name
+        self.values = values or {}
+
+    @classmethod
+    def parse(cls, function: dict):
+        values = function.get('values') or {}
+        if isinstance(values, str):
+            try:
+                values = json.loads(values)
+            except ValueError:
+                values = {}
+        return cls(function.get('code'), function.get('type'), function.get('name'), values)
+
+    def check(self, value):
+        """
+        :return: 不合法时返回原因，合法时为 None
+        """
+        kind = (self.type or '').lower()
+        values = self.values
+        if kind == 'boolean':
+            if not isinstance(value, bool):
+                return 'expect a boolean'
+        elif kind in ('integer', 'value'):
+            if isinstance(value, bool) or not isinstance(value, int):
+                return 'expect an integer'
+            low, high = values.get('min'), values.get('max')
+            if low is not None and value < low or high is not None and value > high:
+                return 'out of range [{low}, {high}]'.format(low=low, high=high)
+            step = values.get('step')
+            if step and low is not None and (value - low) % step:
+                return 'not a multiple of step {step}'.format(step=step)
+        elif kind == 'enum':
+            if value not in (values.get('range') or []):
+                return 'expect one of {range}'.format(range=values.get('range'))
+        elif kind == 'string':
+            if not isinstance(value, str):
+                return 'expect a string'
+        return None
+
+
+def spec_hash(functions: list):
+    return hashlib.sha1(json.dumps(functions, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class FunctionIndex(object):
+    """
+    持久化的指令集索引，保存在 SQLite 中
+
+    启动时一次性把索引读入内存，之后查询不需要网络请求；未收录的设备和品类在第一次查询时拉取，
+    同一设备的并发拉取只会发出一次请求。相同的指令集只保存一份，数千台同品类设备只占一条记录。
+    start() 后在后台分批刷新超过 ttl 的条目。
+    post_commands 遇到未收录的设备时放入有界队列，由最多 fill_concurrency 个后台任务拉取；
+    拉取失败的设备按 failure_backoff 指数退避，期间不会再次拉取
+
+        index = FunctionIndex('functions.db')
+        ty = Tuya(client_id, secret, schema, function_index=index)
+        index.start()
+
+        await index.get_device(device_id)
+        index.validate(device_id, [{'code': 'bright_value', 'value': 1000}])
+        # [('bright_value', 'out of range [25, 255]')]
+    """
+
+    # 指令不合法时响应的 code
+    INVALID_CODE = 'invalid_command'
+
+    def __init__(self,
+                 path: str=':memory:',
+                 tuya=None,
+                 ttl: float=86400,
+                 refresh_interval: float=60,
+                 refresh_batch: int=50,
+                 fill_concurrency: int=4,
+                 max_queue: int=10000,
+                 failure_backoff: float=60):
+        """
+        :param path: SQLite 文件路径，默认只保存在内存中
+        :param tuya: 用于拉取指令集的 Tuya，传给 Tuya(function_index=) 时自动设置
+        :param ttl: 条目的有效期(s)，过期后在后台刷新，过期期间仍然可以使用
+        :param refresh_interval: 后台刷新的间隔(s)
+        :param refresh_batch: 每次后台刷新的最大条目数
+        :param fill_concurrency: 后台拉取未收录设备的最大并发请求数
+        :param max_queue: 等待后台拉取的最大设备数，队列满时不再加入
+        :param failure_backoff: 设备拉取失败后首次重新拉取前的等待时间(s)，之后每次失败翻倍，最多为 ttl
+        """
+        self.path = path
+        self.tuya = tuya
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.refresh_batch = refresh_batch
+        self.fill_concurrency = max(fill_concurrency, 1)
+        self.max_queue = max_queue
+        self.failure_backoff = failure_backoff
+
+        self.fetches = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.dropped = 0
+
+        self.__db = sqlite3.connect(path)
+        if path != ':memory:':
+            self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.executescript(SCHEMA)
+        self.__specs = {}
+        self.__categories = {}
+        self.__devices = {}
+        self.__flight = SingleFlight()
+        # 等待后台拉取的设备，{device_id: None}
+        self.__queue = OrderedDict()
+        self.__fillers = 0
+        # {device_id: (可以再次拉取的时间, 下次失败的退避时间)}
+        self.__failed = {}
+        self.__timer = None
+        self.__started = False
+        self.__closed = False
+        self.__load()
+
+    def __len__(self):
+        return len(self.__devices)
+
+    def __contains__(self, device_id: str):
+        return device_id in self.__devices
+
+    def functions(self, device_id: str):
+        """
+        本地查询设备的指令集，不发出请求
+        :return: {code: FunctionSpec}，未收录时为 None
+        """
+        entry = self.__devices.get(device_id)
+        return self.__specs.get(entry[1]) if entry is not None else None
+
+    def category_functions(self, category: str):
+        """
+        本地查询品类的指令集，不发出请求
+        :return: {code: FunctionSpec}，未收录时为 None
+        """
+        entry = self.__categories.get(category)
+        return self.__specs.get(entry[0]) if entry is not None else None
+
+    async def get_device(self, device_id: str):
+        """
+        查询设备的指令集，未收录时调用 get_functions_by_id
+        :return: {code: FunctionSpec}，拉取失败时为 None
+        """
+        functions = self.functions(device_id)
+        if functions is not None:
+            return functions
+        await self.__flight.do(('device', device_id), self.__fetch_device, device_id)
+        return self.functions(device_id)
+
+    async def get_category(self, category: str):
+        """
+        查询品类的指令集，未收录时调用 get_functions_by_category
+        :return: {code: FunctionSpec}，拉取失败时为 None
+        """
+        functions = self.category_functions(category)
+        if functions is not None:
+            return functions
+        await self.__flight.do(('category', category), self.__fetch_category, category)
+        return self.category_functions(category)
+
+    def validate(self, device_id: str, commands: list):
+        """
+        本地校验指令
+        :param device_id: 设备 id
+        :param commands: [{'code': ..., 'value': ...}]
+        :return: [(code, 原因)]，全部合法时为空 list；设备未收录时为 None
+        """
+        functions = self.functions(device_id)
+        if functions is None:
+            return None
+        errors = []
+        for command in commands:
+            code = command.get('code')
+            spec = functions.get(code)
+            if spec is None:
+                errors.append((code, 'unsupported code'))
+                continue
+            reason = spec.check(command.get('value'))
+            if reason is not None:
+                errors.append((code, reason))
+        return errors
+
+    def reject(self, device_id: str, commands: list):
+        """
+        Tuya.post_commands 发出前调用，设备未收录时放入后台拉取队列
+        :return: 指令不合法时返回失败的响应，否则为 None
+        """
+        errors = self.validate(device_id, commands)
+        if errors is None:
+            self.__enqueue(device_id)
+            return None
+        if not errors:
+            return None
+        return {
+            'success': False,
+            'code': self.INVALID_CODE,
+            'msg': '; '.join('{code}: {reason}'.format(code=code, reason=reason) for code, reason in errors),
+            't': current_milli_time()
+        }
+
+    def remove(self, device_id: str):
+        """
+        移除设备的条目，设备被删除时调用
+        """
+        self.__queue.pop(device_id, None)
+        self.__failed.pop(device_id, None)
+        if self.__devices.pop(device_id, None) is not None and not self.__closed:
+            with self.__db:
+                self.__db.execute('DELETE FROM devices WHERE device_id = ?', (device_id,))
+
+    def start(self):
+        """
+        开始在后台刷新过期条目
+        """
+        if self.__started:
+            return
+        self.__started = True
+        self.__timer = IOLoop.current().call_later(self.refresh_interval, self.__run)
+
+    def stop(self):
+        self.__started = False
+        if self.__timer is not None:
+            IOLoop.current().remove_timeout(self.__timer)
+            self.__timer = None
+
+    async def refresh(self, limit: int=None):
+        """
+        重新拉取最久未更新且已过期的条目
+        :param limit: 最大条目数，默认为 refresh_batch
+        :return: 刷新的条目数
+        """
+        limit = limit or self.refresh_batch
+        expired = current_milli_time() - self.ttl * 1000
+        entries = sorted([(updated, 'category', category)
+                          for category, (_, updated) in self.__categories.items() if updated < expired] +
+                         [(updated, 'device', device_id)
+                          for device_id, (_, _, updated) in self.__devices.items() if updated < expired])[:limit]
+        for _, kind, key in entries:
+            if self.__closed:
+                break
+            if kind == 'device':
+                await self.__flight.do(('device', key), self.__fetch_device, key)
+            else:
+                await self.__flight.do(('category', key), self.__fetch_category, key)
+        self.refreshes += len(entries)
+        return len(entries)
+
+    def stats(self):
+        return {
+            'devices': len(self.__devices),
+            'categories': len(self.__categories),
+            'specs': len(self.__specs),
+            'fetches': self.fetches,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'queued': len(self.__queue),
+            'dropped': self.dropped
+        }
+
+    def close(self):
+        self.stop()
+        self.__closed = True
+        self.__db.close()
+
+    def __load(self):
+        for digest, functions in self.__db.execute('SELECT hash, functions FROM specs'):
+            self.__specs[digest] = self.__parse(json.loads(functions))
+        for category, digest, updated in self.__db.execute('SELECT category, hash, updated FROM categories'):
+            self.__categories[category] = (digest, updated)
+        for device_id, category, digest, updated in self.__db.execute(
+                'SELECT device_id, category, hash, updated FROM devices'):
+            self.__devices[device_id] = (category, digest, updated)
+
+    def __parse(self, functions: list):
+        specs = {}
+        for function in functions:
+            spec = FunctionSpec.parse(function)
+            specs[spec.code] = spec
+        return specs
+
+    def __store_spec(self, functions: list):
+        digest = spec_hash(functions)
+        if digest not in self.__specs:
+            self.__specs[digest] = self.__parse(functions)
+            self.__db.execute('INSERT OR IGNORE INTO specs (hash, functions) VALUES (?, ?)',
+                              (digest, json.dumps(functions, ensure_ascii=False)))
+        return digest
+
+    def __enqueue(self, device_id: str):
+        if device_id in self.__queue or ('device', device_id) in self.__flight:
+            return
+        failed = self.__failed.get(device_id)
+        if failed is not None and time.monotonic() < failed[0]:
+            return
+        if len(self.__queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.__queue[device_id] = None
+        if self.__fillers < self.fill_concurrency:
+            self.__fillers += 1
+            IOLoop.current().spawn_callback(self.__fill)
+
+    async def __fill(self):
+        try:
+            while self.__queue and not self.__closed:
+                device_id, _ = self.__queue.popitem(last=False)
+                try:
+                    await self.__flight.do(('device', device_id), self.__fetch_device, device_id)
+                except Exception:
+                    logging.exception('fetch functions of %s error', device_id)
+        finally:
+            self.__fillers -= 1
+
+    async def __fetch_device(self, device_id: str):
+        self.fetches += 1
+        body = await self.tuya.get_functions_by_id(device_id)
+        # 请求期间已 close，不再写入
+        if self.__closed:
+            return
+        if body is None or body.get('success') is not True:
+            self.failures += 1
+            backoff = self.__failed.get(device_id, (0, self.failure_backoff))[1]
+            self.__failed[device_id] = (time.monotonic() + backoff, min(backoff * 2, self.ttl))
+            return
+        self.__failed.pop(device_id, None)
+        result = body.get('result') or {}
+        digest = self.__store_spec(result.get('functions') or [])
+        updated = current_milli_time()
+        self.__devices[device_id] = (result.get('category'), digest, updated)
+        with self.__db:
+            self.__db.execute('INSERT OR REPLACE INTO devices (device_id, category, hash, updated) VALUES (?, ?, ?, ?)',
+                              (device_id, result.get('category'), digest, updated))
+
+    async def __fetch_category(self, category: str):
+        self.fetches += 1
+        body = await self.tuya.get_functions_by_category(category)
+        # 请求期间已 close，不再写入
+        if self.__closed or body is None or body.get('success') is not True:
+            return
+        result = body.get('result') or {}
+        digest = self.__store_spec(result.get('functions') or [])
+        updated = current_milli_time()
+        self.__categories[category] = (digest, updated)
+        with self.__db:
+            self.__db.execute('INSERT OR REPLACE INTO categories (category, hash, updated) VALUES (?, ?, ?)',
+                              (category, digest, updated))
+
+    async def __run(self):
+        self.__timer = None
+        start = time.monotonic()
+        try:
+            await self.refresh()
+        except Exception:
+            logging.exception('function index refresh error')
+        if not self.__started or self.__timer is not None:
+            return
+        self.__timer = IOLoop.current().call_later(
+            max(self.refresh_interval - (time.monotonic() - start), 0), self.__run)
+
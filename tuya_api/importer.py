@@ -0,0 +1,157 @@
+import csv
+import json
+import logging
+import os
+
+from .utils import CompletionStream
+
+__all__ = ['ImportResult', 'FileCheckpoint', 'UserImport', 'iter_csv', 'iter_jsonl']
+
+
+def iter_csv(f):
+    """
+    逐行读取 CSV，第一行为表头，列名同 Tuya.add_user 的参数
+    :param f: 文本文件对象
+    """
+    return csv.DictReader(f)
+
+
+def iter_jsonl(f):
+    """
+    逐行读取 JSON Lines，每行一个 dict，字段同 Tuya.add_user 的参数
+    :param f: 文本文件对象
+    """
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def user_key(row: dict):
+    return '{country_code}:{username}'.format(country_code=row.get('country_code'), username=row.get('username'))
+
+
+class FileCheckpoint(object):
+    """
+    记录已导入的用户，每导入一个用户追加一行，中断后重新导入时跳过这些用户
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: 文件路径，不存在时创建
+        """
+        self.path = path
+        self.__done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.__done.update(line.rstrip('\n') for line in f if line.strip())
+        self.__file = open(path, 'a')
+
+    def __contains__(self, key: str):
+        return key in self.__done
+
+    def __len__(self):
+        return len(self.__done)
+
+    def add(self, key: str):
+        if key in self.__done:
+            return
+        self.__done.add(key)
+        self.__file.write(key + '\n')
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+
+class ImportResult(object):
+    """
+    一行的导入结果，status 为 created/skipped/failed
+    """
+
+    __slots__ = ('index', 'row', 'status', 'body')
+
+    def __init__(self, index: int, row: dict, status: str, body: dict=None):
+        """
+        :param index: 行号，从 0 开始
+        :param row: 行数据
+        :param status: created-已创建 skipped-checkpoint 中已存在 failed-失败
+        :param body: add_user 的响应，请求异常时为 None
+        """
+        self.index = index
+        self.row = row
+        self.status = status
+        self.body = body
+
+
+class UserImport(object):
+    """
+    批量导入用户
+
+    按顺序读取 rows，最多同时进行 concurrency 个 add_user 请求，
+    哪一行先完成就先返回哪一行的 ImportResult；rows 只在有空闲名额时才会继续读取，
+    内存中最多保留 concurrency 行，可以直接传入大文件
+
+        with open('users.csv') as f:
+            async for result in ty.import_users(iter_csv(f), checkpoint=FileCheckpoint('users.done')):
+                if result.status == 'failed':
+                    logging.error('row %d: %s', result.index, result.body)
+    """
+
+    def __init__(self, tuya, rows, concurrency: int=10, checkpoint=None, key=user_key):
+        """
+        :param tuya: Tuya 实例
+        :param rows: 用户 dict 的可迭代对象，字段同 Tuya.add_user 的参数
+        :param concurrency: 最大并发请求数
+        :param checkpoint: FileCheckpoint 或支持 in/add(key) 的对象，默认不记录
+        :param key: 根据行数据生成 checkpoint key 的函数，默认为 国家码:用户名
+        """
+        self.tuya = tuya
+        self.concurrency = max(concurrency, 1)
+        self.checkpoint = checkpoint
+        self.key = key
+
+        self.created = 0
+        self.skipped = 0
+        self.failed = 0
+
+        self.__stream = CompletionStream(rows, self.__start, self.concurrency)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self.__stream.__anext__()
+
+    def stats(self):
+        return {
+            'created': self.created,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'running': self.__stream.running
+        }
+
+    def __start(self, index: int, row: dict):
+        if self.checkpoint is not None and self.key(row) in self.checkpoint:
+            self.skipped += 1
+            return ImportResult(index, row, 'skipped')
+        return self.__add(index, row)
+
+    async def __add(self, index: int, row: dict):
+        body = None
+        try:
+            body = await self.tuya.add_user(row['country_code'], row['username'], row['password'],
+                                            row.get('nick_name') or row['username'],
+                                            row.get('username_type') or '3')
+        except Exception:
+            # 缺少字段等无法发出请求的行
+            logging.exception('import user row %d error', index)
+        if body is not None and body.get('success') is True:
+            self.created += 1
+            if self.checkpoint is not None:
+                self.checkpoint.add(self.key(row))
+            result = ImportResult(index, row, 'created', body)
+        else:
+            self.failed += 1
+            result = ImportResult(index, row, 'failed', body)
+        return result
@@ -0,0 +1,127 @@
+import random
+import time
+
+from tornado import gen
+
+__all__ = ['TokenBucket', 'RateLimiter']
+
+
+class TokenBucket(object):
+    """
+    令牌桶，rate 会在被限流时减半，之后随成功请求逐步恢复
+    """
+
+    # 两次减速之间的最短间隔(s)，避免同一批限流响应把速率压到最低
+    DECREASE_INTERVAL = 1.0
+
+    def __init__(self, rate: float, burst: float=None, min_rate: float=None):
+        """
+        :param rate: 每秒请求数
+        :param burst: 桶容量，默认等于 rate
+        :param min_rate: 减速的下限，默认为 rate 的 1/16
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or rate
+        self.min_rate = min_rate or rate / 16
+        self.tokens = self.burst
+        self.throttled = 0
+
+        self.__updated = time.monotonic()
+        self.__decreased = 0.0
+
+    async def acquire(self):
+        """
+        取一个令牌，令牌不足时按预约顺序等待
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await gen.sleep(-self.tokens / self.rate)
+
+    def on_success(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def on_throttle(self):
+        self.throttled += 1
+        now = time.monotonic()
+        if now - self.__decreased >= self.DECREASE_INTERVAL:
+            self.__decreased = now
+            self.rate = max(self.min_rate, self.rate / 2)
+
+
+class RateLimiter(object):
+    """
+    客户端限流，按接口类型 (token, read, command) 分别设置令牌桶
+
+    响应提示被限流时降低该类型的速率，并在随机退避后重试
+    """
+
+    DEFAULT_BUDGETS = {
+        'token': (1, 2),
+        'read': (20, 40),
+        'command': (10, 20)
+    }
+    THROTTLE_MESSAGES = ('frequency', 'too many requests', 'rate limit')
+
+    def __init__(self,
+                 budgets: dict=None,
+                 max_retries: int=3,
+                 backoff: float=0.5,
+                 max_backoff: float=8,
+                 throttle_codes: tuple=()):
+        """
+        :param budgets: {接口类型: (每秒请求数, 桶容量)}，默认为 DEFAULT_BUDGETS
+        :param max_retries: 被限流后的最大重试次数
+        :param backoff: 退避基数(s)，第 n 次重试最多等待 backoff * 2^n
+        :param max_backoff: 最长退避时间(s)
+        :param throttle_codes: 表示限流的响应 code
+        """
+        budgets = dict(self.DEFAULT_BUDGETS, **(budgets or {}))
+        self.buckets = {kind: TokenBucket(rate, burst) for kind, (rate, burst) in budgets.items()}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.throttle_codes = set(throttle_codes)
+
+    def is_throttled(self, body):
+        if not isinstance(body, dict) or body.get('success') is not False:
+            return False
+        if body.get('code') in self.throttle_codes:
+            return True
+        msg = str(body.get('msg', '')).lower()
+        return any(m in msg for m in self.THROTTLE_MESSAGES)
+
+    async def call(self, kind: str, func, *args):
+        """
+        在 kind 的预算内调用 func(*args)，被限流时退避重试
+        :param kind: 接口类型
+        :param func: 协程函数
+        :return: func 的返回值
+        """
+        bucket = self.buckets[kind]
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            body = await func(*args)
+            if not self.is_throttled(body):
+                bucket.on_success()
+                return body
+
+            bucket.on_throttle()
+            if attempt >= self.max_retries:
+                return body
+            await gen.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            attempt += 1
+
+    def stats(self):
+        return {
+            kind: {
+                'rate': bucket.rate,
+                'max_rate': bucket.max_rate,
+                'throttled': bucket.throttled
+            } for kind, bucket in self.buckets.items()
+        }
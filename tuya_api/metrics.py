@@ -0,0 +1,257 @@
+import math
+import socket
+import time
+
+__all__ = ['Histogram', 'Metrics', 'MetricsMiddleware', 'MetricsSink',
+           'PrometheusSink', 'StatsdSink', 'CallbackSink']
+
+# 请求的各个阶段，total 为整个调用的耗时
+PHASES = ('total', 'token', 'sign', 'queue', 'network', 'decode')
+
+
+class Histogram(object):
+    """
+    对数分桶的直方图，相邻桶边界相差 factor 倍，分位数的相对误差不超过 factor - 1
+    """
+
+    def __init__(self, minimum: float=1e-5, maximum: float=120, factor: float=1.1):
+        """
+        :param minimum: 最小值，更小的值计入第一个桶
+        :param maximum: 最大值，更大的值计入最后一个桶
+        :param factor: 相邻桶边界的比例
+        """
+        self.minimum = minimum
+        self.factor = factor
+        self.__log_factor = math.log(factor)
+        self.__counts = [0] * (int(math.ceil(math.log(maximum / minimum) / self.__log_factor)) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        if value <= self.minimum:
+            index = 0
+        else:
+            index = min(int(math.ceil(math.log(value / self.minimum) / self.__log_factor)), len(self.__counts) - 1)
+        self.__counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float):
+        """
+        :param p: 0 ~ 100
+        :return: 分位数所在桶的上边界
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(int(math.ceil(self.count * p / 100.0)), 1)
+        seen = 0
+        for index, n in enumerate(self.__counts):
+            seen += n
+            if seen >= rank:
+                return min(self.minimum * self.factor ** index, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+class MetricsSink(object):
+    """
+    指标输出接口，默认全部为空实现
+    """
+
+    def attach(self, metrics):
+        pass
+
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        pass
+
+    def error(self, endpoint: str, error: str):
+        pass
+
+    def gauge(self, endpoint: str, name: str, value: int):
+        pass
+
+
+class CallbackSink(MetricsSink):
+    """
+    进程内回调，callback(type, endpoint, name, value)，type 为 observe/error/gauge
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        self.callback('observe', endpoint, phase, seconds)
+
+    def error(self, endpoint: str, error: str):
+        self.callback('error', endpoint, error, 1)
+
+    def gauge(self, endpoint: str, name: str, value: int):
+        self.callback('gauge', endpoint, name, value)
+
+
+class StatsdSink(MetricsSink):
+    """
+    通过 UDP 发送 StatsD 指标，耗时单位为 ms
+    """
+
+    def __init__(self, host: str='127.0.0.1', port: int=8125, prefix: str='tuya_api'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.setblocking(False)
+
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        self.__send('{prefix}.{endpoint}.{phase}:{value:.3f}|ms'.format(
+            prefix=self.prefix, endpoint=endpoint, phase=phase, value=seconds * 1000))
+
+    def error(self, endpoint: str, error: str):
+        self.__send('{prefix}.{endpoint}.errors.{error}:1|c'.format(
+            prefix=self.prefix, endpoint=endpoint, error=error))
+
+    def gauge(self, endpoint: str, name: str, value: int):
+        self.__send('{prefix}.{endpoint}.{name}:{value}|g'.format(
+            prefix=self.prefix, endpoint=endpoint, name=name, value=value))
+
+    def close(self):
+        self.__socket.close()
+
+    def __send(self, line: str):
+        try:
+            self.__socket.sendto(line.encode('utf-8'), self.address)
+        except OSError:
+            pass
+
+
+class PrometheusSink(MetricsSink):
+    """
+    以 Prometheus 文本格式输出，由使用者在自己的 handler 中返回 render() 的结果
+    """
+
+    def __init__(self, prefix: str='tuya_api'):
+        self.prefix = prefix
+        self.metrics = None
+
+    def attach(self, metrics):
+        self.metrics = metrics
+
+    def render(self):
+        prefix = self.prefix
+        lines = [
+            '# TYPE {prefix}_request_seconds summary'.format(prefix=prefix)
+        ]
+        for (endpoint, phase), histogram in sorted(self.metrics.histograms.items()):
+            labels = 'endpoint="{endpoint}",phase="{phase}"'.format(endpoint=endpoint, phase=phase)
+            for q in (50, 95, 99):
+                lines.append('{prefix}_request_seconds{{{labels},quantile="{q}"}} {value}'.format(
+                    prefix=prefix, labels=labels, q=q / 100.0, value=histogram.percentile(q)))
+            lines.append('{prefix}_request_seconds_sum{{{labels}}} {value}'.format(
+                prefix=prefix, labels=labels, value=histogram.sum))
+            lines.append('{prefix}_request_seconds_count{{{labels}}} {value}'.format(
+                prefix=prefix, labels=labels, value=histogram.count))
+
+        lines.append('# TYPE {prefix}_errors_total counter'.format(prefix=prefix))
+        for (endpoint, error), n in sorted(self.metrics.errors.items()):
+            lines.append('{prefix}_errors_total{{endpoint="{endpoint}",error="{error}"}} {n}'.format(
+                prefix=prefix, endpoint=endpoint, error=error, n=n))
+
+        lines.append('# TYPE {prefix}_in_flight gauge'.format(prefix=prefix))
+        for endpoint, n in sorted(self.metrics.in_flight.items()):
+            lines.append('{prefix}_in_flight{{endpoint="{endpoint}"}} {n}'.format(
+                prefix=prefix, endpoint=endpoint, n=n))
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics(object):
+    """
+    按接口、阶段统计耗时，并统计错误数和在途请求数
+    """
+
+    def __init__(self, sinks: list=None):
+        """
+        :param sinks: MetricsSink list
+        """
+        self.histograms = {}
+        self.errors = {}
+        self.in_flight = {}
+        self.sinks = []
+        for sink in sinks or []:
+            self.add_sink(sink)
+
+    def add_sink(self, sink: MetricsSink):
+        sink.attach(self)
+        self.sinks.append(sink)
+
+    def observe(self, endpoint: str, phase: str, seconds: float):
+        histogram = self.histograms.get((endpoint, phase))
+        if histogram is None:
+            histogram = self.histograms[(endpoint, phase)] = Histogram()
+        histogram.record(seconds)
+        for sink in self.sinks:
+            sink.observe(endpoint, phase, seconds)
+
+    def error(self, endpoint: str, error: str):
+        key = (endpoint, error)
+        self.errors[key] = self.errors.get(key, 0) + 1
+        for sink in self.sinks:
+            sink.error(endpoint, error)
+
+    def add_in_flight(self, endpoint: str, delta: int):
+        value = self.in_flight[endpoint] = self.in_flight.get(endpoint, 0) + delta
+        for sink in self.sinks:
+            sink.gauge(endpoint, 'in_flight', value)
+
+    def snapshot(self):
+        """
+        :return: {endpoint: {'phases': {phase: 直方图统计}, 'errors': {error: n}, 'in_flight': n}}，时间单位为 s
+        """
+        ret = {}
+        for (endpoint, phase), histogram in self.histograms.items():
+            ret.setdefault(endpoint, {'phases': {}, 'errors': {}, 'in_flight': 0})['phases'][phase] = \
+                histogram.snapshot()
+        for (endpoint, error), n in self.errors.items():
+            ret.setdefault(endpoint, {'phases': {}, 'errors': {}, 'in_flight': 0})['errors'][error] = n
+        for endpoint, n in self.in_flight.items():
+            ret.setdefault(endpoint, {'phases': {}, 'errors': {}, 'in_flight': 0})['in_flight'] = n
+        return ret
+
+
+class MetricsMiddleware(object):
+    """
+    最外层中间件，为 request 打开 timings，结束后记录各阶段耗时、错误和在途请求数
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(self, request, call_next):
+        metrics = self.metrics
+        name = request.endpoint.name
+        request.timings = {}
+        metrics.add_in_flight(name, 1)
+        start = time.monotonic()
+        try:
+            body = await call_next(request)
+        except Exception as e:
+            metrics.error(name, type(e).__name__)
+            raise
+        else:
+            if isinstance(body, dict) and body.get('success') is False:
+                metrics.error(name, str(body.get('code')))
+            return body
+        finally:
+            metrics.add_in_flight(name, -1)
+            metrics.observe(name, 'total', time.monotonic() - start)
+            for phase, seconds in request.timings.items():
+                metrics.observe(name, phase, seconds)
@@ -0,0 +1,224 @@
+import logging
+import time
+
+from tornado.ioloop import IOLoop
+
+__all__ = ['DeviceMirror']
+
+
+class _DeviceState(object):
+    __slots__ = ('status', 'updated', 'interval', 'next_poll')
+
+    def __init__(self, interval: float):
+        self.status = None
+        self.updated = None
+        self.interval = interval
+        self.next_poll = 0.0
+
+
+class DeviceMirror(object):
+    """
+    设备状态镜像
+
+    定期用 get_devices_status_by_ids 分批拉取到期设备的状态，读取直接使用本地数据；
+    只有值发生变化的功能点才会通知订阅者。每个设备的拉取间隔根据变化频率调整，
+    有变化时减半，没有变化时逐渐变长，上游请求量只取决于设备数和变化频率，与读取次数无关
+
+        mirror = DeviceMirror(ty, device_ids, interval=30)
+        mirror.subscribe(lambda device_id, changes: print(device_id, changes))
+        mirror.start()
+
+        mirror.get(device_id)
+        # {'switch_led': True, 'bright_value': 255}
+    """
+
+    def __init__(self,
+                 tuya,
+                 device_ids: list=(),
+                 interval: float=30,
+                 min_interval: float=5,
+                 max_interval: float=300,
+                 backoff: float=1.5,
+                 tick: float=1,
+                 chunk_size: int=None):
+        """
+        :param tuya: Tuya
+        :param device_ids: 设备 id list
+        :param interval: 初始拉取间隔(s)
+        :param min_interval: 最短拉取间隔(s)
+        :param max_interval: 最长拉取间隔(s)
+        :param backoff: 没有变化时拉取间隔乘以该值
+        :param tick: 两轮拉取的最短间隔(s)，相近时间到期的设备合并到同一轮
+        :param chunk_size: 每次请求的最大设备数，默认为 tuya.batch_size
+        """
+        self.tuya = tuya
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.tick = tick
+        self.chunk_size = chunk_size
+
+        self.polls = 0
+        self.requests = 0
+        self.changes = 0
+
+        self.__devices = {}
+        self.__subscribers = []
+        self.__timer = None
+        self.__started = False
+        for device_id in device_ids:
+            self.add(device_id)
+
+    def __len__(self):
+        return len(self.__devices)
+
+    def __contains__(self, device_id: str):
+        return device_id in self.__devices
+
+    def add(self, device_id: str):
+        """
+        添加设备，下一轮拉取其状态
+        """
+        if device_id not in self.__devices:
+            self.__devices[device_id] = _DeviceState(self.interval)
+
+    def remove(self, device_id: str):
+        return self.__devices.pop(device_id, None) is not None
+
+    def get(self, device_id: str):
+        """
+        设备的最新状态
+        :param device_id: 设备 id
+        :return: {code: value}，设备不存在或尚未拉取时为 None
+        """
+        state = self.__devices.get(device_id)
+        return state.status if state is not None else None
+
+    def get_value(self, device_id: str, code: str, default=None):
+        status = self.get(device_id)
+        if status is None:
+            return default
+        return status.get(code, default)
+
+    def updated_at(self, device_id: str):
+        """
+        设备状态的更新时间
+        :return: 时间戳(ms)，尚未拉取时为 None
+        """
+        state = self.__devices.get(device_id)
+        return state.updated if state is not None else None
+
+    def subscribe(self, callback):
+        """
+        订阅状态变化，callback(device_id, changes)，changes 为 {code: (old, new)}，
+        第一次拉取到的状态不会通知
+        :return: callback
+        """
+        self.__subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def start(self):
+        """
+        开始定期拉取
+        """
+        if self.__started:
+            return
+        self.__started = True
+        self.__schedule(0)
+
+    def stop(self):
+        self.__started = False
+        if self.__timer is not None:
+            IOLoop.current().remove_timeout(self.__timer)
+            self.__timer = None
+
+    async def poll(self, device_ids: list=None):
+        """
+        拉取一轮状态
+        :param device_ids: 需要拉取的设备 id list，默认为所有到期的设备
+        :return: 本轮状态有变化的设备数
+        """
+        now = time.monotonic()
+        if device_ids is None:
+            device_ids = [device_id for device_id, state in self.__devices.items() if state.next_poll <= now]
+        else:
+            device_ids = [device_id for device_id in device_ids if device_id in self.__devices]
+        if not device_ids:
+            return 0
+
+        self.polls += 1
+        self.requests += -(-len(device_ids) // (self.chunk_size or self.tuya.batch_size))
+        body = await self.tuya.get_devices_status_by_ids(device_ids, chunk_size=self.chunk_size)
+        result = body.get('result') if body is not None and body.get('success') is True else None
+
+        now = time.monotonic()
+        changed = 0
+        for item in result or []:
+            state = self.__devices.get(item.get('id'))
+            if state is None:
+                continue
+            status = {point['code']: point.get('value') for point in item.get('status') or []}
+            if self.__update(item['id'], state, status, body.get('t')):
+                changed += 1
+
+        # 请求失败或响应中没有的设备保持原间隔，下一次到期时重新拉取
+        for device_id in device_ids:
+            state = self.__devices.get(device_id)
+            if state is not None and state.next_poll <= now:
+                state.next_poll = now + state.interval
+        return changed
+
+    def stats(self):
+        intervals = [state.interval for state in self.__devices.values()]
+        return {
+            'devices': len(intervals),
+            'polls': self.polls,
+            'requests': self.requests,
+            'changes': self.changes,
+            'interval_avg': sum(intervals) / len(intervals) if intervals else 0.0,
+            'interval_min': min(intervals) if intervals else 0.0
+        }
+
+    def __update(self, device_id: str, state: _DeviceState, status: dict, t: int):
+        old = state.status
+        state.status = status
+        state.updated = t
+        if old is None:
+            state.next_poll = time.monotonic() + state.interval
+            return False
+
+        changes = {code: (old.get(code), value) for code, value in status.items() if old.get(code) != value}
+        if changes:
+            state.interval = max(self.min_interval, state.interval / 2)
+        else:
+            state.interval = min(self.max_interval, state.interval * self.backoff)
+        state.next_poll = time.monotonic() + state.interval
+        if not changes:
+            return False
+
+        self.changes += 1
+        for callback in list(self.__subscribers):
+            try:
+                callback(device_id, changes)
+            except Exception:
+                logging.exception('device mirror subscriber error')
+        return True
+
+    def __schedule(self, delay: float):
+        self.__timer = IOLoop.current().call_later(delay, self.__run)
+
+    async def __run(self):
+        self.__timer = None
+        try:
+            await self.poll()
+        except Exception:
+            logging.exception('device mirror poll error')
+        if not self.__started or self.__timer is not None:
+            return
+        now = time.monotonic()
+        next_poll = min((state.next_poll for state in self.__devices.values()), default=now + self.interval)
+        self.__schedule(max(next_poll - now, self.tick))
@@ -0,0 +1,377 @@
+"""
+本地模拟的涂鸦云 OpenAPI，用于离线测试和压测
+
+    python -m tuya_api.mock --port 9000 --latency 0.01 --error-rate 0.01 --throttle-qps 500
+
+    cloud = MockTuyaCloud(devices=1000, latency=0.005)
+    cloud.listen(9000)
+    ty = Tuya('client_id', 'secret', 'schema', base_url=cloud.url)
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from collections import Counter, deque
+
+from tornado import gen, web
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+
+from .utils import gen_md5
+
+__all__ = ['MockTuyaCloud']
+
+# 模拟的限流响应，msg 可被 RateLimiter 识别
+THROTTLE_BODY = {'success': False, 'code': 429, 'msg': 'request frequency is too high'}
+
+CATEGORY_FUNCTIONS = {
+    'dj': [
+        {'code': 'switch_led', 'name': '开关', 'desc': '', 'type': 'Boolean', 'values': '{}'},
+        {'code': 'bright_value', 'name': '亮度', 'desc': '', 'type': 'Integer',
+         'values': '{"min":25,"max":255,"scale":0,"step":1}'},
+        {'code': 'work_mode', 'name': '模式', 'desc': '', 'type': 'Enum',
+         'values': '{"range":["white","colour","scene"]}'}
+    ]
+}
+
+
+def new_device(device_id: str, uid: str):
+    return {
+        'id': device_id,
+        'uid': uid,
+        'name': 'light {id}'.format(id=device_id),
+        'category': 'dj',
+        'product_id': 'mockproduct',
+        'online': True,
+        'active_time': int(time.time()),
+        'status': [
+            {'code': 'switch_led', 'value': False},
+            {'code': 'bright_value', 'value': 25},
+            {'code': 'work_mode', 'value': 'white'}
+        ]
+    }
+
+
+class MockHandler(web.RequestHandler):
+    def initialize(self, cloud):
+        self.cloud = cloud
+
+    def data_received(self, chunk):
+        pass
+
+    async def prepare(self):
+        cloud = self.cloud
+        cloud.requests[self.__class__.__name__] += 1
+        delay = cloud.delay()
+        if delay > 0:
+            await gen.sleep(delay)
+        if cloud.error_rate and random.random() < cloud.error_rate:
+            self.set_status(500)
+            self.finish('mock error')
+        elif cloud.is_throttled():
+            self.reply_body(THROTTLE_BODY)
+        elif cloud.check_sign and not self.check_sign():
+            self.reply_body({'success': False, 'code': 1004, 'msg': 'sign invalid'})
+
+    def check_sign(self):
+        headers = self.request.headers
+        access_token = headers.get('access_token', '')
+        if isinstance(self, TokenHandler):
+            if access_token:
+                return False
+        elif access_token not in self.cloud.tokens:
+            return False
+        s = self.cloud.client_id + access_token + self.cloud.secret + headers.get('t', '')
+        return headers.get('client_id') == self.cloud.client_id and headers.get('sign') == gen_md5(s).upper()
+
+    def json_body(self):
+        return json.loads(self.request.body or b'{}')
+
+    def reply(self, result):
+        self.reply_body({'success': True, 'result': result, 't': int(time.time() * 1000)})
+
+    def reply_body(self, body: dict):
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(body))
+
+    def not_found(self):
+        self.reply_body({'success': False, 'code': 1106, 'msg': 'permission deny'})
+
+
+class TokenHandler(MockHandler):
+    def get(self, refresh_token=None):
+        if refresh_token is not None and refresh_token not in self.cloud.refresh_tokens:
+            return self.reply_body({'success': False, 'code': 1012, 'msg': 'refresh token invalid'})
+        self.reply(self.cloud.issue_token())
+
+
+class UsersHandler(MockHandler):
+    def get(self, schema):
+        page_no = int(self.get_argument('page_no', '1'))
+        page_size = int(self.get_argument('page_size', '10'))
+        users = self.cloud.user_list
+        start = (page_no - 1) * page_size
+        self.reply({
+            'list': users[start:start + page_size],
+            'total': len(users),
+            'has_more': start + page_size < len(users)
+        })
+
+
+class UserHandler(MockHandler):
+    def post(self, schema):
+        data = self.json_body()
+        for user in self.cloud.user_list:
+            if user['username'] == data.get('username'):
+                return self.reply({'uid': user['uid']})
+        uid = self.cloud.add_user(data.get('username'), data.get('nick_name'), data.get('country_code'))
+        self.reply({'uid': uid})
+
+
+class UserDevicesHandler(MockHandler):
+    def get(self, uid):
+        self.reply([device for device in self.cloud.devices.values() if device['uid'] == uid])
+
+
+class DeviceTokenHandler(MockHandler):
+    def post(self):
+        data = self.json_body()
+        token = uuid.uuid4().hex[:8]
+        self.cloud.pairing[token] = {'uid': data.get('uid'), 'polls': 0, 'devices': []}
+        self.reply({'token': token, 'region': 'AY', 'secret': 'mock'})
+
+
+class DevicesByTokenHandler(MockHandler):
+    def get(self, token):
+        pairing = self.cloud.pairing.get(token)
+        if pairing is None:
+            return self.not_found()
+        pairing['polls'] += 1
+        # 每次轮询有一台新设备配网成功，最多 pairing_devices 台
+        if len(pairing['devices']) < self.cloud.pairing_devices:
+            pairing['devices'].append(self.cloud.add_device(pairing['uid'])['id'])
+        self.reply({
+            'success_devices': [{'id': device_id, 'name': self.cloud.devices[device_id]['name'],
+                                 'product_id': 'mockproduct'}
+                                for device_id in pairing['devices'] if device_id in self.cloud.devices],
+            'error_devices': []
+        })
+
+
+class DevicesHandler(MockHandler):
+    def get(self):
+        ids = self.get_argument('device_ids', '').split(',')
+        self.reply([self.cloud.devices[i] for i in ids if i in self.cloud.devices])
+
+
+class DevicesStatusHandler(MockHandler):
+    def get(self):
+        ids = self.get_argument('device_ids', '').split(',')
+        self.reply([{'id': i, 'status': self.cloud.devices[i]['status']} for i in ids if i in self.cloud.devices])
+
+
+class DeviceHandler(MockHandler):
+    def get(self, device_id):
+        device = self.cloud.devices.get(device_id)
+        if device is None:
+            return self.not_found()
+        self.reply(device)
+
+    def delete(self, device_id):
+        if self.cloud.devices.pop(device_id, None) is None:
+            return self.not_found()
+        self.reply(True)
+
+
+class DeviceStatusHandler(MockHandler):
+    def get(self, device_id):
+        device = self.cloud.devices.get(device_id)
+        if device is None:
+            return self.not_found()
+        self.reply(device['status'])
+
+
+class DeviceFunctionsHandler(MockHandler):
+    def get(self, device_id):
+        device = self.cloud.devices.get(device_id)
+        if device is None:
+            return self.not_found()
+        self.reply({'category': device['category'], 'functions': CATEGORY_FUNCTIONS[device['category']]})
+
+
+class CategoryFunctionsHandler(MockHandler):
+    def get(self, category):
+        if category not in CATEGORY_FUNCTIONS:
+            return self.not_found()
+        self.reply({'category': category, 'functions': CATEGORY_FUNCTIONS[category]})
+
+
+class CommandsHandler(MockHandler):
+    def post(self, device_id):
+        device = self.cloud.devices.get(device_id)
+        if device is None:
+            return self.not_found()
+        status = {item['code']: item for item in device['status']}
+        for command in self.json_body().get('commands', []):
+            if command.get('code') in status:
+                status[command['code']]['value'] = command.get('value')
+        self.reply(True)
+
+
+class MockTuyaCloud(object):
+    """
+    模拟的涂鸦云，支持注入延迟、错误和限流
+    """
+
+    def __init__(self,
+                 client_id: str='client_id',
+                 secret: str='secret',
+                 devices: int=100,
+                 users: int=10,
+                 latency: float or tuple=0,
+                 error_rate: float=0,
+                 throttle_qps: int=None,
+                 expire_time: int=7200,
+                 pairing_devices: int=3,
+                 check_sign: bool=True):
+        """
+        :param client_id: 接受的 client_id
+        :param secret: 接受的 secret
+        :param devices: 初始设备数，平均分配给各用户
+        :param users: 初始用户数
+        :param latency: 每个请求的延迟(s)，或 (最小, 最大) 之间随机
+        :param error_rate: 返回 HTTP 500 的比例
+        :param throttle_qps: 每秒请求数超过该值时返回限流响应，默认不限流
+        :param expire_time: token 有效期(s)
+        :param pairing_devices: 每个配网 token 最终配网成功的设备数
+        :param check_sign: 是否校验签名和 access_token
+        """
+        self.client_id = client_id
+        self.secret = secret
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_qps = throttle_qps
+        self.expire_time = expire_time
+        self.pairing_devices = pairing_devices
+        self.check_sign = check_sign
+
+        self.tokens = set()
+        self.refresh_tokens = set()
+        self.devices = {}
+        self.user_list = []
+        self.pairing = {}
+        self.requests = Counter()
+        self.port = None
+        self.__server = None
+        self.__recent = deque()
+
+        for i in range(users):
+            self.add_user('user{i}'.format(i=i), 'user{i}'.format(i=i), '86')
+        for i in range(devices):
+            self.add_device(self.user_list[i % users]['uid'] if users else None)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{port}'.format(port=self.port)
+
+    def add_user(self, username: str, nick_name: str, country_code: str):
+        uid = 'mu{n}'.format(n=len(self.user_list))
+        self.user_list.append({'uid': uid, 'username': username, 'nick_name': nick_name,
+                               'country_code': country_code, 'create_time': int(time.time())})
+        return uid
+
+    def add_device(self, uid: str):
+        device = new_device('md{n:06d}'.format(n=len(self.devices)), uid)
+        self.devices[device['id']] = device
+        return device
+
+    def issue_token(self):
+        access_token = uuid.uuid4().hex
+        refresh_token = uuid.uuid4().hex
+        self.tokens.add(access_token)
+        self.refresh_tokens.add(refresh_token)
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'expire_time': self.expire_time,
+            'uid': 'mock'
+        }
+
+    def delay(self):
+        if isinstance(self.latency, (tuple, list)):
+            return random.uniform(*self.latency)
+        return self.latency
+
+    def is_throttled(self):
+        if not self.throttle_qps:
+            return False
+        now = time.monotonic()
+        recent = self.__recent
+        while recent and now - recent[0] > 1:
+            recent.popleft()
+        if len(recent) >= self.throttle_qps:
+            return True
+        recent.append(now)
+        return False
+
+    def make_app(self):
+        args = {'cloud': self}
+        return web.Application([
+            (r'/v1.0/token', TokenHandler, args),
+            (r'/v1.0/token/([^/]+)', TokenHandler, args),
+            (r'/v1.0/apps/([^/]+)/users', UsersHandler, args),
+            (r'/v1.0/apps/([^/]+)/user', UserHandler, args),
+            (r'/v1.0/users/([^/]+)/devices', UserDevicesHandler, args),
+            (r'/v1.0/devices/token', DeviceTokenHandler, args),
+            (r'/v1.0/devices/tokens/([^/]+)', DevicesByTokenHandler, args),
+            (r'/v1.0/devices/status', DevicesStatusHandler, args),
+            (r'/v1.0/devices', DevicesHandler, args),
+            (r'/v1.0/devices/([^/]+)/status', DeviceStatusHandler, args),
+            (r'/v1.0/devices/([^/]+)/functions', DeviceFunctionsHandler, args),
+            (r'/v1.0/devices/([^/]+)/commands', CommandsHandler, args),
+            (r'/v1.0/devices/([^/]+)', DeviceHandler, args),
+            (r'/v1.0/functions/([^/]+)', CategoryFunctionsHandler, args),
+        ])
+
+    def listen(self, port: int=0, address: str='127.0.0.1'):
+        """
+        在当前 IOLoop 上监听
+        :param port: 端口，0 为随机端口
+        :param address: 地址
+        :return: 实际监听的端口
+        """
+        sockets = bind_sockets(port, address)
+        self.__server = HTTPServer(self.make_app())
+        self.__server.add_sockets(sockets)
+        self.port = sockets[0].getsockname()[1]
+        return self.port
+
+    def stop(self):
+        if self.__server is not None:
+            self.__server.stop()
+            self.__server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='mock tuya cloud')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--client-id', default='client_id')
+    parser.add_argument('--secret', default='secret')
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle-qps', type=int, default=None)
+    args = parser.parse_args()
+
+    cloud = MockTuyaCloud(client_id=args.client_id, secret=args.secret, devices=args.devices, users=args.users,
+                          latency=args.latency, error_rate=args.error_rate, throttle_qps=args.throttle_qps)
+    port = cloud.listen(args.port)
+    print('* Mock tuya cloud: http://127.0.0.1:{port}'.format(port=port), flush=True)
+    IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    main()
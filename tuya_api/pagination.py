@@ -0,0 +1,123 @@
+from collections import deque
+
+from tornado import gen
+
+__all__ = ['UserIterator', 'UserDevicesIterator']
+
+
+def parse_users_page(body):
+    """
+    解析 get_users 的响应
+    :param body: get_users 响应
+    :return: (用户 list, 是否还有下一页, 用户总数)
+    """
+    if body is None or body.get('success') is not True:
+        return None, False, None
+    result = body.get('result') or []
+    if isinstance(result, list):
+        return result, None, None
+    return result.get('list') or [], result.get('has_more'), result.get('total')
+
+
+class UserIterator(object):
+    """
+    遍历应用下的全部用户
+
+    消费当前页时预取后续 prefetch 页，内存中最多保留 prefetch + 1 页
+
+        async for user in ty.iter_users(page_size=100, prefetch=2):
+            ...
+    """
+
+    def __init__(self, tuya, page_size: int=100, prefetch: int=2):
+        """
+        :param tuya: Tuya 实例
+        :param page_size: 页大小
+        :param prefetch: 预取的页数
+        """
+        self.tuya = tuya
+        self.page_size = page_size
+        self.prefetch = max(prefetch, 1)
+
+        self.__next_page = 1
+        self.__last_page = None
+        self.__pages = deque()
+        self.__users = deque()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.__users:
+            self.__fill()
+            if not self.__pages:
+                raise StopAsyncIteration
+            page_no, future = self.__pages.popleft()
+            body = await future
+            users, has_more, total = parse_users_page(body)
+            if users is None:
+                raise Exception('UserIterator: get users page {page_no} error: {msg}'
+                                .format(page_no=page_no, msg=body.get('msg') if body else None))
+            if has_more is False or len(users) < self.page_size:
+                self.__last_page = page_no
+            elif total is not None:
+                self.__last_page = max((int(total) + self.page_size - 1) // self.page_size, page_no)
+            self.__users.extend(users)
+        return self.__users.popleft()
+
+    def devices(self, concurrency: int=5):
+        """
+        对每个用户调用 get_user_devices_by_uid
+        :param concurrency: 最大并发请求数
+        :return: UserDevicesIterator，产出 (user, get_user_devices_by_uid 响应)
+        """
+        return UserDevicesIterator(self, concurrency)
+
+    def __fill(self):
+        # 最后一页已知后丢弃其后的预取结果
+        while self.__pages and self.__last_page is not None and self.__pages[0][0] > self.__last_page:
+            self.__pages.popleft()
+        while len(self.__pages) < self.prefetch:
+            if self.__last_page is not None and self.__next_page > self.__last_page:
+                break
+            future = gen.convert_yielded(self.tuya.get_users(page_no=self.__next_page, page_size=self.page_size))
+            self.__pages.append((self.__next_page, future))
+            self.__next_page += 1
+
+
+class UserDevicesIterator(object):
+    """
+    按用户顺序产出 (user, get_user_devices_by_uid 响应)，最多 concurrency 个请求同时进行
+
+        async for user, body in ty.iter_users().devices(concurrency=5):
+            ...
+    """
+
+    def __init__(self, users: UserIterator, concurrency: int=5):
+        """
+        :param users: UserIterator
+        :param concurrency: 最大并发请求数
+        """
+        self.users = users
+        self.concurrency = max(concurrency, 1)
+
+        self.__exhausted = False
+        self.__pending = deque()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.__exhausted and len(self.__pending) < self.concurrency:
+            try:
+                user = await self.users.__anext__()
+            except StopAsyncIteration:
+                self.__exhausted = True
+                break
+            future = gen.convert_yielded(self.users.tuya.get_user_devices_by_uid(user['uid']))
+            self.__pending.append((user, future))
+
+        if not self.__pending:
+            raise StopAsyncIteration
+        user, future = self.__pending.popleft()
+        return user, await future
@@ -0,0 +1,249 @@
+import functools
+import time
+from string import Formatter
+
+from .signer import Signer
+from .utils import SingleFlight
+
+__all__ = ['Endpoint', 'Request', 'Pipeline', 'CoalesceMiddleware', 'CacheMiddleware', 'RetryMiddleware',
+           'RateLimitMiddleware', 'SignMiddleware']
+
+
+class Endpoint(object):
+    """
+    接口声明，path 模板在声明时预先解析
+    """
+
+    __slots__ = ('name', 'method', 'path', 'kind', 'signed', 'key', 'invalidates', '__parts')
+
+    def __init__(self, name: str, method: str, path: str, kind: str='read',
+                 signed: bool=True, key: str=None, invalidates: tuple=()):
+        """
+        :param name: 接口名，与 Tuya 的方法名一致
+        :param method: HTTP 方法
+        :param path: path 模板，如 /v1.0/devices/{device_id}
+        :param kind: 接口类型 token/read/command，用于限流
+        :param signed: 是否使用 access_token 签名
+        :param key: 作为缓存 key 的参数名
+        :param invalidates: 调用后需要失效的缓存接口名
+        """
+        self.name = name
+        self.method = method
+        self.path = path
+        self.kind = kind
+        self.signed = signed
+        self.key = key
+        self.invalidates = invalidates
+        self.__parts = [(literal, field) for literal, field, _, _ in Formatter().parse(path)]
+
+    def render(self, params: dict):
+        return ''.join(literal if field is None else literal + str(params[field])
+                       for literal, field in self.__parts)
+
+
+class Request(object):
+    """
+    一次接口调用，在中间件之间传递
+    """
+
+    __slots__ = ('endpoint', 'path', 'data', 'key', 'decode', 'headers', 'timings')
+
+    def __init__(self, endpoint: Endpoint, path: str, data=None, key=None, decode=None):
+        """
+        :param endpoint: 接口声明
+        :param path: 已渲染的 path
+        :param data: 请求体，POST 时序列化为 JSON
+        :param key: 缓存 key
+        :param decode: 解析响应体的函数，默认为 codec.loads
+        """
+        self.endpoint = endpoint
+        self.path = path
+        self.data = data
+        self.key = key
+        self.decode = decode
+        self.headers = None
+        # 开启指标统计时为 {阶段: 耗时(s)}
+        self.timings = None
+
+
+class Pipeline(object):
+    """
+    请求管道，中间件签名为 middleware(request, call_next)，按添加顺序由外到内执行，
+    最内层为发送请求并解析响应的 handler
+
+        async def log_middleware(request, call_next):
+            body = await call_next(request)
+            logging.info('%s %s', request.endpoint.name, body.get('success'))
+            return body
+
+        ty.pipeline.add(log_middleware)
+    """
+
+    def __init__(self, handler, middlewares: list=None):
+        """
+        :param handler: 最内层协程函数 handler(request)
+        :param middlewares: 中间件 list
+        """
+        self.handler = handler
+        self.middlewares = list(middlewares or [])
+        self.__chain = self.__compose()
+
+    def __call__(self, request: Request):
+        return self.__chain(request)
+
+    def add(self, middleware, index: int=None):
+        """
+        添加中间件
+        :param middleware: 中间件
+        :param index: 插入位置，默认添加到最内层
+        """
+        if index is None:
+            self.middlewares.append(middleware)
+        else:
+            self.middlewares.insert(index, middleware)
+        self.__chain = self.__compose()
+
+    def remove(self, middleware):
+        self.middlewares.remove(middleware)
+        self.__chain = self.__compose()
+
+    def __compose(self):
+        chain = self.handler
+        for middleware in reversed(self.middlewares):
+            chain = functools.partial(middleware, call_next=chain)
+        return chain
+
+
+class CoalesceMiddleware(object):
+    """
+    合并并发的相同读请求，同一接口、同一参数同一时间只有一个在途请求，其余调用者共享其响应；
+    只合并在途的请求，不缓存结果。写接口开始和结束时，其 invalidates 中的接口不再共享之前的在途请求
+    """
+
+    def __init__(self, names: set=None):
+        """
+        :param names: 需要合并的接口名，默认为全部读接口
+        """
+        self.names = set(names) if names is not None else None
+        self.calls = 0
+        self.requests = 0
+        self.__flight = SingleFlight()
+
+    async def __call__(self, request: Request, call_next):
+        endpoint = request.endpoint
+        if endpoint.invalidates:
+            self.__forget(request)
+            try:
+                return await call_next(request)
+            finally:
+                self.__forget(request)
+
+        if endpoint.kind != 'read' or (self.names is not None and endpoint.name not in self.names):
+            return await call_next(request)
+        self.calls += 1
+        # 有 key 的接口的 path 只由 key 决定
+        key = (endpoint.name, request.key if request.key is not None else request.path)
+        if key not in self.__flight:
+            self.requests += 1
+        return await self.__flight.do(key, call_next, request)
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'requests': self.requests,
+            'coalesced': self.calls - self.requests,
+            'in_flight': len(self.__flight)
+        }
+
+    def __forget(self, request: Request):
+        for name in request.endpoint.invalidates:
+            self.__flight.forget((name, request.key))
+
+
+class CacheMiddleware(object):
+    """
+    读接口命中 ResponseCache 时直接返回，写接口调用后失效相关缓存
+    """
+
+    def __init__(self, cache):
+        """
+        :param cache: ResponseCache
+        """
+        self.cache = cache
+
+    async def __call__(self, request: Request, call_next):
+        endpoint = request.endpoint
+        if endpoint.invalidates:
+            try:
+                return await call_next(request)
+            finally:
+                for name in endpoint.invalidates:
+                    self.cache.invalidate(name, request.key)
+
+        cache = self.cache.get(endpoint.name)
+        if cache is None or request.key is None:
+            return await call_next(request)
+        return await cache.get_or_fetch(request.key, call_next, request)
+
+
+class RetryMiddleware(object):
+    """
+    按接口的重试策略重试网络错误，每次重试都会重新经过限流和签名
+    """
+
+    def __init__(self, retrier):
+        """
+        :param retrier: Retrier
+        """
+        self.retrier = retrier
+
+    async def __call__(self, request: Request, call_next):
+        return await self.retrier.call(request, call_next)
+
+
+class RateLimitMiddleware(object):
+    """
+    按接口类型限流，被限流时退避重试
+    """
+
+    def __init__(self, rate_limiter):
+        """
+        :param rate_limiter: RateLimiter
+        """
+        self.rate_limiter = rate_limiter
+
+    async def __call__(self, request: Request, call_next):
+        return await self.rate_limiter.call(request.endpoint.kind, call_next, request)
+
+
+class SignMiddleware(object):
+    """
+    计算签名并生成请求头，每次调用(包括重试)都会重新签名
+    """
+
+    def __init__(self, client_id: str, secret: str, token_manager):
+        """
+        :param client_id: 云 API 授权中的 AccessId
+        :param secret: 云 API 授权中的 AccessKey
+        :param token_manager: TokenManager
+        """
+        self.token_manager = token_manager
+        self.signer = Signer(client_id, secret)
+
+    async def __call__(self, request: Request, call_next):
+        timings = request.timings
+        if timings is not None:
+            start = time.monotonic()
+        if request.endpoint.signed:
+            # token 不存在或已过期时才会等待获取，临近过期由 token_manager 在后台刷新
+            access_token = await self.token_manager.get_token()
+        else:
+            access_token = ''
+        if timings is not None:
+            token_done = time.monotonic()
+            timings['token'] = timings.get('token', 0) + token_done - start
+
+        request.headers = self.signer.headers(access_token, request.data is not None)
+        if timings is not None:
+            timings['sign'] = timings.get('sign', 0) + time.monotonic() - token_done
+        return await call_next(request)
@@ -0,0 +1,146 @@
+import time
+from urllib.parse import urlsplit
+
+from tornado import locks
+
+from .transport import Transport, create_transport
+
+__all__ = ['HTTPPool']
+
+
+class HTTPPool(object):
+    """
+    HTTP 连接池
+
+    请求先在池内排队，拿到名额后才交给 transport 发送，
+    因此排队时间和占用情况可以统计出来，用于确定 max_clients 的大小；
+    各个 backend 使用同样的排队和连接数限制，但 simple 不支持复用连接，与其他 backend 对比时需要关闭 keep_alive
+    """
+
+    def __init__(self,
+                 max_clients: int=10,
+                 max_per_host: int=None,
+                 backend: str or Transport='simple',
+                 connect_timeout: float=20,
+                 request_timeout: float=20,
+                 keep_alive: bool=None):
+        """
+        :param max_clients: 最大并发连接数
+        :param max_per_host: 每个 host 的最大并发连接数，默认等于 max_clients
+        :param backend: 'simple'、'curl'、'aiohttp'、'httpx' 或 Transport 实例，
+                        curl 需要安装 pycurl，aiohttp/httpx 需要安装对应的库
+        :param connect_timeout: 连接超时(s)
+        :param request_timeout: 请求超时(s)
+        :param keep_alive: 是否复用连接，默认 simple 不复用，其他 backend 复用；
+                           simple 不支持复用，每次请求都会关闭连接，传入 True 时发出警告
+        """
+        self.max_clients = max_clients
+        self.max_per_host = max_per_host or max_clients
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+
+        if isinstance(backend, Transport):
+            self.transport = backend
+            self.backend = type(backend).__name__
+        else:
+            self.transport = create_transport(backend, max_clients, self.max_per_host, keep_alive)
+            self.backend = backend
+        # 实际是否复用连接
+        self.keep_alive = self.transport.keep_alive
+
+        self.__semaphore = locks.Semaphore(max_clients)
+        self.__host_semaphores = {}
+
+        # 统计
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stats(self):
+        """
+        连接池统计
+        :return: dict，时间单位为 ms
+        """
+        return {
+            'max_clients': self.max_clients,
+            'keep_alive': self.keep_alive,
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'occupancy': self.in_flight / self.max_clients,
+            'queued': self.queued,
+            'max_queued': self.max_queued,
+            'waited': self.waited,
+            'wait_avg_ms': self.wait_total * 1000 / self.requests if self.requests else 0.0,
+            'wait_max_ms': self.wait_max * 1000
+        }
+
+    def reset_stats(self):
+        self.requests = 0
+        self.max_in_flight = self.in_flight
+        self.max_queued = self.queued
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def fetch(self, request: str, timings: dict=None, **kwargs):
+        """
+        发送请求，参数同 Transport.fetch
+        :param request: url
+        :param timings: 传入时累加 queue、network 两个阶段的耗时(s)
+        :return: HTTPResponse 或 Response
+        """
+        kwargs.setdefault('connect_timeout', self.connect_timeout)
+        kwargs.setdefault('request_timeout', self.request_timeout)
+
+        host_semaphore = self.__host_semaphore(urlsplit(request).netloc)
+        start = time.monotonic()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await host_semaphore.acquire()
+            try:
+                await self.__semaphore.acquire()
+            except BaseException:
+                host_semaphore.release()
+                raise
+        finally:
+            self.queued -= 1
+
+        acquired = time.monotonic()
+        self.__on_acquired(acquired - start)
+        try:
+            return await self.transport.fetch(request, **kwargs)
+        finally:
+            if timings is not None:
+                timings['queue'] = timings.get('queue', 0) + acquired - start
+                timings['network'] = timings.get('network', 0) + time.monotonic() - acquired
+            self.in_flight -= 1
+            self.__semaphore.release()
+            host_semaphore.release()
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    def __host_semaphore(self, host: str):
+        semaphore = self.__host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self.__host_semaphores[host] = locks.Semaphore(self.max_per_host)
+        return semaphore
+
+    def __on_acquired(self, wait: float):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        if wait > 0.001:
+            self.waited += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
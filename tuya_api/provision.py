@@ -0,0 +1,265 @@
+import logging
+import time
+from collections import OrderedDict
+
+from tornado import locks
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+
+from .utils import SingleFlight, maybe_await
+
+__all__ = ['ProvisionSession', 'Provisioner']
+
+
+class ProvisionSession(object):
+    """
+    一个配网 token 的配网过程
+    """
+
+    def __init__(self, token: str, uid: str=None, expected: int=None, deadline: float=None, interval: float=2):
+        """
+        :param token: 配网 token
+        :param uid: 用户 id
+        :param expected: 期望配网的设备数，全部出现后提前结束
+        :param deadline: 结束时间(time.monotonic())
+        :param interval: 当前轮询间隔(s)
+        """
+        self.token = token
+        self.uid = uid
+        self.expected = expected
+        self.deadline = deadline
+        self.interval = interval
+        # {device_id: 设备信息}，按出现顺序
+        self.devices = OrderedDict()
+        # {device_id: 配网失败的设备信息}
+        self.errors = {}
+        self.polls = 0
+        self.pending = 0
+        self.finished = False
+        self.timer = None
+        self.future = Future()
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    def wait(self):
+        """
+        等待配网结束
+        :return: Future，结果为配网成功的设备 list
+        """
+        return self.future
+
+
+class Provisioner(object):
+    """
+    批量配网
+
+    同时轮询多个配网 token，没有新设备时轮询间隔逐渐变长，发现新设备后恢复；
+    同一 token 的并发轮询只会发出一次请求。新设备先攒够 enrich_linger 时间，
+    再用 get_devices_by_ids 批量补全设备信息，然后逐个回调 on_device
+
+        async def on_device(session, device):
+            await save(session.uid, device)
+
+        provisioner = Provisioner(ty, on_device)
+        session = await provisioner.start(uid, 'Asia/Shanghai', expected=3)
+        devices = await session.wait()
+    """
+
+    def __init__(self,
+                 tuya,
+                 on_device=None,
+                 poll_interval: float=2,
+                 max_poll_interval: float=30,
+                 backoff: float=1.5,
+                 timeout: float=300,
+                 poll_concurrency: int=10,
+                 enrich: bool=True,
+                 enrich_linger: float=0.5):
+        """
+        :param tuya: Tuya
+        :param on_device: 发现新设备时的回调 on_device(session, device)，可以是协程函数
+        :param poll_interval: 最短轮询间隔(s)
+        :param max_poll_interval: 最长轮询间隔(s)
+        :param backoff: 没有新设备时轮询间隔乘以该值
+        :param timeout: 每个配网 token 的最长轮询时间(s)
+        :param poll_concurrency: 同时进行的轮询请求数
+        :param enrich: 是否用 get_devices_by_ids 补全设备信息
+        :param enrich_linger: 补全前等待更多新设备的时间(s)
+        """
+        self.tuya = tuya
+        self.on_device = on_device
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.enrich = enrich
+        self.enrich_linger = enrich_linger
+
+        self.polls = 0
+        self.devices = 0
+        self.enrich_requests = 0
+
+        self.__sessions = {}
+        self.__semaphore = locks.Semaphore(poll_concurrency)
+        self.__flight = SingleFlight()
+        self.__pending = []
+        self.__enrich_timer = None
+
+    def __len__(self):
+        return len(self.__sessions)
+
+    def get(self, token: str):
+        return self.__sessions.get(token)
+
+    async def start(self, uid: str, time_zone_id: str, lon: str=None, lat: str=None, lang: str='zh',
+                    expected: int=None, timeout: float=None):
+        """
+        生成配网 token 并开始轮询，参数同 Tuya.generate_device_token
+        :param expected: 期望配网的设备数，全部出现后提前结束
+        :param timeout: 最长轮询时间(s)，默认为 self.timeout
+        :return: ProvisionSession，配网 token 为 session.token
+        """
+        body = await self.tuya.generate_device_token(uid, time_zone_id, lon, lat, lang)
+        if body is None or body.get('success') is not True:
+            raise Exception('generate device token error: {msg}'.format(
+                msg=body.get('msg') if body is not None else 'request error'))
+        return self.watch(body['result']['token'], uid, expected, timeout)
+
+    def watch(self, token: str, uid: str=None, expected: int=None, timeout: float=None):
+        """
+        轮询已有的配网 token，重复调用返回同一个 session
+        :return: ProvisionSession
+        """
+        session = self.__sessions.get(token)
+        if session is not None:
+            return session
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        session = self.__sessions[token] = ProvisionSession(token, uid, expected, deadline, self.poll_interval)
+        self.__schedule(session, 0)
+        return session
+
+    async def poll(self, token: str):
+        """
+        立即轮询一次，与正在进行的轮询合并
+        :return: 新发现的设备数
+        """
+        session = self.__sessions.get(token)
+        if session is None or session.finished:
+            return 0
+        return await self.__flight.do(token, self.__poll_once, session)
+
+    def stop(self, token: str):
+        """
+        停止轮询，session.wait() 返回已发现的设备
+        """
+        session = self.__sessions.get(token)
+        if session is not None:
+            self.__finish(session)
+
+    def close(self):
+        for session in list(self.__sessions.values()):
+            self.__finish(session)
+
+    def stats(self):
+        return {
+            'sessions': len(self.__sessions),
+            'polls': self.polls,
+            'devices': self.devices,
+            'enrich_requests': self.enrich_requests
+        }
+
+    def __schedule(self, session: ProvisionSession, delay: float):
+        session.timer = IOLoop.current().call_later(delay, self.__run, session)
+
+    async def __run(self, session: ProvisionSession):
+        session.timer = None
+        try:
+            found = await self.__flight.do(session.token, self.__poll_once, session)
+        except Exception:
+            logging.exception('poll devices by token error')
+            found = 0
+        if session.finished:
+            return
+
+        now = time.monotonic()
+        if (session.expected is not None and len(session.devices) >= session.expected) or now >= session.deadline:
+            self.__finish(session)
+            return
+        if found:
+            session.interval = self.poll_interval
+        else:
+            session.interval = min(self.max_poll_interval, session.interval * self.backoff)
+        self.__schedule(session, min(session.interval, session.deadline - now))
+
+    async def __poll_once(self, session: ProvisionSession):
+        async with self.__semaphore:
+            body = await self.tuya.get_devices_by_token(session.token)
+        session.polls += 1
+        self.polls += 1
+        if body is None or body.get('success') is not True:
+            return 0
+
+        result = body.get('result') or {}
+        for device in result.get('error_devices') or []:
+            session.errors[device.get('id')] = device
+        found = [device for device in result.get('success_devices') or []
+                 if device.get('id') not in session.devices]
+        for device in found:
+            session.devices[device['id']] = device
+            session.errors.pop(device['id'], None)
+        self.devices += len(found)
+
+        if not found:
+            return 0
+        if self.enrich:
+            session.pending += len(found)
+            self.__pending.extend((session, device) for device in found)
+            if self.__enrich_timer is None:
+                self.__enrich_timer = IOLoop.current().call_later(self.enrich_linger, self.__enrich)
+        else:
+            for device in found:
+                await self.__emit(session, device)
+        return len(found)
+
+    async def __enrich(self):
+        self.__enrich_timer = None
+        pending, self.__pending = self.__pending, []
+        device_ids = list(OrderedDict.fromkeys(device['id'] for _, device in pending))
+        self.enrich_requests += -(-len(device_ids) // self.tuya.batch_size)
+        body = await self.tuya.get_devices_by_ids(device_ids)
+        details = {}
+        if body is not None:
+            details = {detail.get('id'): detail for detail in body.get('result') or []}
+
+        for session, device in pending:
+            # 补全失败时使用配网接口返回的信息
+            device.update(details.get(device['id'], {}))
+            await self.__emit(session, device)
+            session.pending -= 1
+            if session.finished and session.pending == 0:
+                self.__resolve(session)
+
+    async def __emit(self, session: ProvisionSession, device: dict):
+        if self.on_device is None:
+            return
+        try:
+            await maybe_await(self.on_device(session, device))
+        except Exception:
+            logging.exception('provision on_device error')
+
+    def __finish(self, session: ProvisionSession):
+        if session.finished:
+            return
+        session.finished = True
+        if session.timer is not None:
+            IOLoop.current().remove_timeout(session.timer)
+            session.timer = None
+        if session.pending == 0:
+            self.__resolve(session)
+
+    def __resolve(self, session: ProvisionSession):
+        self.__sessions.pop(session.token, None)
+        if not session.future.done():
+            session.future.set_result(list(session.devices.values()))
@@ -0,0 +1,287 @@
+"""
+紧凑的响应记录和流式解析
+
+Device/Status/User 使用 __slots__，没有每个对象的 __dict__，重复出现的品类、产品 id、功能点等字符串只保留一份；
+iter_result 逐个解析 result 数组中的元素，不会同时持有整个响应的 dict 树
+
+    ty = Tuya(client_id, secret, schema, records=True)
+    body = await ty.get_devices_by_ids(device_ids)
+    for device in body['result']:
+        print(device.id, device.category, device.status[0].code)
+
+    for device in iter_result(raw, Device.from_dict):
+        ...
+"""
+import json
+import re
+from sys import intern
+
+__all__ = ['Record', 'Status', 'Device', 'User', 'iter_result', 'record_decoder', 'RECORD_DECODERS']
+
+_WS = re.compile(r'[ \t\n\r]*')
+_decode = json.JSONDecoder().raw_decode
+# 短于该长度的 Status 值字符串会被驻留，如枚举值
+INTERN_VALUE_LENGTH = 32
+
+
+class Record(object):
+    """
+    记录基类，未声明的字段保存在 extra 中；支持 get/[]/keys，可以替代原来的 dict 使用
+
+    子类在 __init__ 中用关键字参数接收字段，from_dict 直接展开 dict，参数绑定在 C 层完成
+    """
+
+    __slots__ = ('extra',)
+
+    FIELDS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data)
+
+    def get(self, key: str, default=None):
+        if key in self._field_set:
+            value = getattr(self, key)
+            return default if value is None else value
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        keys = [name for name in self.FIELDS if getattr(self, name) is not None]
+        if self.extra is not None:
+            keys.extend(self.extra)
+        return keys
+
+    def to_dict(self):
+        """
+        转换为普通 dict，嵌套的记录同样转换
+        """
+        data = {}
+        for key in self.keys():
+            value = self[key]
+            if isinstance(value, tuple):
+                value = [item.to_dict() if isinstance(item, Record) else item for item in value]
+            data[key] = value
+        return data
+
+    def __repr__(self):
+        return '{name}({fields})'.format(name=type(self).__name__, fields=', '.join(
+            '{key}={value!r}'.format(key=key, value=self[key]) for key in self.keys()))
+
+
+_MISSING = object()
+
+
+def _intern(value):
+    return intern(value) if type(value) is str else value
+
+
+class Status(Record):
+    """
+    设备的一个功能点状态，code 和较短的字符串值会被驻留
+    """
+
+    __slots__ = ('code', 'value')
+
+    FIELDS = __slots__
+
+    def __init__(self, code: str=None, value=None, **extra):
+        self.code = _intern(code)
+        if type(value) is str and len(value) <= INTERN_VALUE_LENGTH:
+            value = intern(value)
+        self.value = value
+        self.extra = extra or None
+
+
+class Device(Record):
+    """
+    设备信息，status 为 Status 的 tuple；品类、产品等重复出现的字符串会被驻留
+    """
+
+    __slots__ = ('id', 'uid', 'name', 'category', 'product_id', 'product_name', 'online', 'ip', 'time_zone',
+                 'local_key', 'sub', 'uuid', 'owner_id', 'icon', 'lat', 'lon', 'active_time', 'create_time',
+                 'update_time', 'status')
+
+    FIELDS = __slots__
+
+    def __init__(self, id: str=None, uid: str=None, name: str=None, category: str=None, product_id: str=None,
+                 product_name: str=None, online: bool=None, ip: str=None, time_zone: str=None,
+                 local_key: str=None, sub: bool=None, uuid: str=None, owner_id: str=None, icon: str=None,
+                 lat: str=None, lon: str=None, active_time: int=None, create_time: int=None,
+                 update_time: int=None, status: list=None, **extra):
+        self.id = id
+        self.uid = uid
+        self.name = name
+        self.category = _intern(category)
+        self.product_id = _intern(product_id)
+        self.product_name = _intern(product_name)
+        self.online = online
+        self.ip = ip
+        self.time_zone = _intern(time_zone)
+        self.local_key = local_key
+        self.sub = sub
+        self.uuid = uuid
+        self.owner_id = _intern(owner_id)
+        self.icon = _intern(icon)
+        self.lat = lat
+        self.lon = lon
+        self.active_time = active_time
+        self.create_time = create_time
+        self.update_time = update_time
+        if type(status) is list:
+            status = tuple([Status(**point) for point in status])
+        self.status = status
+        self.extra = extra or None
+
+    def status_dict(self):
+        """
+        :return: {code: value}
+        """
+        return {point.code: point.value for point in self.status or ()}
+
+
+class User(Record):
+    """
+    用户信息
+    """
+
+    __slots__ = ('uid', 'username', 'nick_name', 'country_code', 'email', 'mobile', 'avatar', 'create_time',
+                 'update_time')
+
+    FIELDS = __slots__
+
+    def __init__(self, uid: str=None, username: str=None, nick_name: str=None, country_code: str=None,
+                 email: str=None, mobile: str=None, avatar: str=None, create_time: int=None,
+                 update_time: int=None, **extra):
+        self.uid = uid
+        self.username = username
+        self.nick_name = nick_name
+        self.country_code = _intern(country_code)
+        self.email = email
+        self.mobile = mobile
+        self.avatar = avatar
+        self.create_time = create_time
+        self.update_time = update_time
+        self.extra = extra or None
+
+
+def _skip(s: str, i: int):
+    return _WS.match(s, i).end()
+
+
+def _expect(s: str, i: int, chars: str):
+    if i >= len(s) or s[i] not in chars:
+        raise json.JSONDecodeError('Expecting one of {chars!r}'.format(chars=chars), s, i)
+    return s[i]
+
+
+# 标记流式解析的字段，解析完成后替换为记录
+_STREAM = object()
+_SINGLE = object()
+
+
+def _iter_array(s: str, i: int, factory):
+    i = _skip(s, i + 1)
+    if _expect(s, i, ']"{[-0123456789tfn') == ']':
+        return i + 1
+    while True:
+        value, i = _decode(s, i)
+        yield factory(value) if factory is not None else value
+        i = _skip(s, i)
+        if _expect(s, i, ',]') == ']':
+            return i + 1
+        i = _skip(s, i + 1)
+
+
+def _iter_object(s: str, i: int, path: tuple, factory, meta: dict):
+    _expect(s, i, '{')
+    i = _skip(s, i + 1)
+    if _expect(s, i, '}"') == '}':
+        return i + 1
+    while True:
+        key, i = _decode(s, i)
+        i = _skip(s, i)
+        _expect(s, i, ':')
+        i = _skip(s, i + 1)
+        c = s[i] if i < len(s) else ''
+        if key == path[0] and c == '[':
+            meta[key] = _STREAM
+            i = yield from _iter_array(s, i, factory)
+        elif key == path[0] and c == '{' and len(path) > 1:
+            meta[key] = {}
+            i = yield from _iter_object(s, i, path[1:], factory, meta[key])
+        elif key == path[0] and c == '{':
+            meta[key] = _SINGLE
+            value, i = _decode(s, i)
+            yield factory(value) if factory is not None else value
+        else:
+            meta[key], i = _decode(s, i)
+        i = _skip(s, i)
+        if _expect(s, i, ',}') == '}':
+            return i + 1
+        i = _skip(s, i + 1)
+
+
+def iter_result(raw, factory=None, path: tuple=('result',), meta: dict=None):
+    """
+    逐个解析响应中 path 指向的数组元素，path 指向单个对象时只产出该对象
+    :param raw: 响应体 bytes 或 str
+    :param factory: 元素的转换函数，如 Device.from_dict，默认返回 dict
+    :param path: 数组所在的字段路径，如 get_users 的 ('result', 'list')
+    :param meta: 传入 dict 时收集其他字段，如 success/t/code/msg
+    """
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        raw = bytes(raw).decode('utf-8')
+    return _iter_object(raw, _skip(raw, 0), tuple(path), factory, {} if meta is None else meta)
+
+
+def record_decoder(factory, path: tuple=('result',)):
+    """
+    生成把响应体解析为记录的函数，结构与原响应相同，path 指向的数组中的元素替换为记录
+    :param factory: 元素的转换函数
+    :param path: 数组所在的字段路径
+    :return: decode(raw)
+    """
+    def decode(raw):
+        body = {}
+        records = list(iter_result(raw, factory, path, body))
+        node = body
+        for key in path:
+            value = node.get(key)
+            if value is _STREAM:
+                node[key] = records
+                break
+            if value is _SINGLE:
+                node[key] = records[0]
+                break
+            if not isinstance(value, dict):
+                break
+            node = value
+        return body
+
+    return decode
+
+
+# {接口名: decode}，Tuya(records=True) 时使用
+RECORD_DECODERS = {
+    'get_users': record_decoder(User.from_dict, ('result', 'list')),
+    'get_user_devices_by_uid': record_decoder(Device.from_dict),
+    'get_device_by_id': record_decoder(Device.from_dict),
+    'get_devices_by_ids': record_decoder(Device.from_dict),
+    'get_device_status_by_id': record_decoder(Status.from_dict),
+    'get_devices_status_by_ids': record_decoder(Device.from_dict),
+}
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+
+from .core import Tuya
+from .limiter import RateLimiter
+from .pool import HTTPPool
+from .scheduler import FairScheduler
+from .token_store import MemoryTokenStore
+
+__all__ = ['TuyaRegistry']
+
+
+class TuyaRegistry(object):
+    """
+    多租户注册表，所有租户共享一个连接池和公平调度器，凭证、token 和限流预算按租户隔离
+
+    注册时只保存凭证，第一次 get 时才创建 Tuya 实例；设置 max_active 后最久未使用的实例会被关闭，
+    token 保存在共享的 token_store 中，实例重新创建时直接复用
+
+        registry = TuyaRegistry(pool=HTTPPool(max_clients=50), max_active=100)
+        registry.register('app_a', client_id_a, secret_a, schema_a)
+        registry.register('app_b', client_id_b, secret_b, schema_b, rate_budgets={'read': (5, 10)})
+
+        body = await registry.get('app_a').get_device_by_id(device_id)
+    """
+
+    def __init__(self,
+                 pool: HTTPPool=None,
+                 max_concurrency: int=None,
+                 max_active: int=None,
+                 token_store=None,
+                 rate_budgets: dict=None,
+                 **options):
+        """
+        :param pool: 共享的 HTTP 连接池，默认为 HTTPPool()
+        :param max_concurrency: 所有租户的最大并发请求数，默认等于 pool.max_clients
+        :param max_active: 同时保留的 Tuya 实例数，默认不限制
+        :param token_store: 共享的 TokenStore，默认为 MemoryTokenStore()
+        :param rate_budgets: 每个租户的限流预算，格式同 RateLimiter 的 budgets，默认不限流
+        :param options: 所有租户共用的 Tuya 参数，如 region、threshold、batch_size，
+                        注意传入的 cache、metrics 等对象会被所有租户共享
+        """
+        self.__own_pool = pool is None
+        self.pool = pool or HTTPPool()
+        self.scheduler = FairScheduler(max_concurrency or self.pool.max_clients)
+        self.max_active = max_active
+        self.token_store = token_store or MemoryTokenStore()
+        self.rate_budgets = rate_budgets
+        self.options = options
+
+        self.__tenants = {}
+        self.__clients = OrderedDict()
+
+    def __len__(self):
+        return len(self.__tenants)
+
+    def __contains__(self, tenant: str):
+        return tenant in self.__tenants
+
+    def __getitem__(self, tenant: str):
+        return self.get(tenant)
+
+    def register(self, tenant: str, client_id: str, secret: str, schema: str,
+                 rate_budgets: dict=None, **options):
+        """
+        注册租户，已存在时替换并关闭原有实例
+        :param tenant: 租户名
+        :param client_id: 云 API 授权中的 AccessId
+        :param secret: 云 API 授权中的 AccessKey
+        :param schema: 应用包名
+        :param rate_budgets: 该租户的限流预算，默认使用注册表的 rate_budgets
+        :param options: 该租户的 Tuya 参数，覆盖注册表的 options
+        """
+        self.unregister(tenant)
+        self.__tenants[tenant] = (client_id, secret, schema, rate_budgets, options)
+
+    def unregister(self, tenant: str):
+        """
+        移除租户并关闭其实例
+        :param tenant: 租户名
+        :return: 租户是否存在
+        """
+        client = self.__clients.pop(tenant, None)
+        if client is not None:
+            client.close()
+        return self.__tenants.pop(tenant, None) is not None
+
+    def get(self, tenant: str):
+        """
+        获取租户的 Tuya 实例，不存在时创建
+        :param tenant: 租户名
+        :return: Tuya
+        """
+        client = self.__clients.get(tenant)
+        if client is not None:
+            self.__clients.move_to_end(tenant)
+            return client
+
+        if tenant not in self.__tenants:
+            raise KeyError(tenant)
+        client = self.__clients[tenant] = self.__create(tenant)
+        if self.max_active is not None:
+            while len(self.__clients) > self.max_active:
+                _, idle = self.__clients.popitem(last=False)
+                idle.close()
+        return client
+
+    def stats(self):
+        return {
+            'tenants': len(self.__tenants),
+            'active': len(self.__clients),
+            'scheduler': self.scheduler.stats(),
+            'pool': self.pool.stats()
+        }
+
+    def close(self):
+        """
+        关闭所有实例，以及自行创建的连接池
+        """
+        while self.__clients:
+            _, client = self.__clients.popitem()
+            client.close()
+        if self.__own_pool:
+            self.pool.close()
+
+    def __create(self, tenant: str):
+        client_id, secret, schema, rate_budgets, options = self.__tenants[tenant]
+        options = dict(self.options, **options)
+        options.setdefault('token_store', self.token_store)
+        rate_budgets = rate_budgets if rate_budgets is not None else self.rate_budgets
+        if rate_budgets is not None and 'rate_limiter' not in options:
+            options['rate_limiter'] = RateLimiter(rate_budgets)
+        return Tuya(client_id, secret, schema, pool=self.pool, scheduler=self.scheduler,
+                    tenant=tenant, **options)
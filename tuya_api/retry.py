@@ -0,0 +1,220 @@
+import random
+import socket
+import time
+from datetime import timedelta
+
+from tornado import gen
+from tornado.httpclient import HTTPClientError
+from tornado.iostream import StreamClosedError
+
+from .metrics import Histogram
+from .pipeline import Request
+from .transport import ConnectError
+
+__all__ = ['RetryPolicy', 'Retrier', 'is_transient', 'is_unsent']
+
+
+def is_unsent(error: Exception):
+    """
+    请求一定没有发出的错误：连接被拒绝、域名解析失败、连接超时
+    """
+    if isinstance(error, (ConnectError, ConnectionRefusedError, socket.gaierror)):
+        return True
+    return isinstance(error, HTTPClientError) and error.code == 599 and 'while connecting' in str(error)
+
+
+def is_transient(error: Exception):
+    """
+    可以重试的临时错误：网络错误、超时、5xx
+    """
+    if isinstance(error, HTTPClientError):
+        return error.code == 599 or error.code >= 500
+    return isinstance(error, (StreamClosedError, OSError, gen.TimeoutError))
+
+
+class RetryPolicy(object):
+    """
+    一类接口的重试策略
+    """
+
+    __slots__ = ('max_attempts', 'guarded', 'backoff', 'max_backoff', 'hedge', 'hedge_delay', 'hedge_percentile')
+
+    def __init__(self,
+                 max_attempts: int=3,
+                 guarded: bool=False,
+                 backoff: float=0.1,
+                 max_backoff: float=2,
+                 hedge: bool=False,
+                 hedge_delay: float=None,
+                 hedge_percentile: float=95):
+        """
+        :param max_attempts: 最多尝试次数，1 为不重试
+        :param guarded: 只在请求一定没有发出时重试，用于非幂等的写接口
+        :param backoff: 退避基数(s)，第 n 次重试最多等待 backoff * 2^n
+        :param max_backoff: 最长退避时间(s)
+        :param hedge: 超过 hedge_delay 仍未返回时再发一次请求，使用先返回的结果
+        :param hedge_delay: 对冲请求的延迟(s)，默认为该接口最近耗时的 hedge_percentile 分位数
+        :param hedge_percentile: 0 ~ 100
+        """
+        self.max_attempts = max_attempts
+        self.guarded = guarded
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+
+
+class _Latency(object):
+    """
+    两个窗口交替的耗时直方图，分位数只反映最近的请求
+    """
+
+    __slots__ = ('current', 'previous', 'window')
+
+    def __init__(self, window: int):
+        self.current = Histogram()
+        self.previous = None
+        self.window = window
+
+    def record(self, seconds: float):
+        if self.current.count >= self.window:
+            self.previous, self.current = self.current, Histogram()
+        self.current.record(seconds)
+
+    def percentile(self, p: float, min_samples: int):
+        if self.current.count >= min_samples:
+            return self.current.percentile(p)
+        if self.previous is not None:
+            return self.previous.percentile(p)
+        return None
+
+
+class Retrier(object):
+    """
+    按接口重试网络错误，读接口可以开启对冲请求
+
+    策略按接口名或接口类型 (token, read, command) 查找，接口名优先；
+    读接口和 token 接口是幂等的，网络错误、超时和 5xx 都会重试；
+    写接口只在请求一定没有发出时重试，避免指令被执行两次
+
+        retrier = Retrier({'get_device_by_id': RetryPolicy(hedge=True)})
+        ty = Tuya(client_id, secret, schema, retrier=retrier)
+    """
+
+    DEFAULT_POLICIES = {
+        'token': RetryPolicy(3),
+        'read': RetryPolicy(3),
+        'command': RetryPolicy(3, guarded=True)
+    }
+
+    def __init__(self,
+                 policies: dict=None,
+                 max_hedge_ratio: float=0.1,
+                 min_samples: int=20,
+                 window: int=1000):
+        """
+        :param policies: {接口名或接口类型: RetryPolicy}，与 DEFAULT_POLICIES 合并
+        :param max_hedge_ratio: 对冲请求数占请求数的最大比例
+        :param min_samples: 按分位数计算对冲延迟前至少需要的样本数
+        :param window: 耗时统计的窗口大小
+        """
+        self.policies = dict(self.DEFAULT_POLICIES, **(policies or {}))
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.window = window
+
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.__latency = {}
+
+    def policy(self, endpoint):
+        policy = self.policies.get(endpoint.name)
+        if policy is None:
+            policy = self.policies.get(endpoint.kind)
+        return policy
+
+    def should_retry(self, policy: RetryPolicy, error: Exception):
+        if policy.guarded:
+            return is_unsent(error)
+        return is_transient(error)
+
+    async def call(self, request, func):
+        """
+        按策略调用 func(request)
+        :param request: Request
+        :param func: 协程函数
+        :return: func 的返回值
+        """
+        self.requests += 1
+        policy = self.policy(request.endpoint)
+        if policy is None:
+            return await func(request)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if policy.hedge:
+                    return await self.__hedged(policy, request, func)
+                return await func(request)
+            except Exception as e:
+                if attempt >= policy.max_attempts or not self.should_retry(policy, e):
+                    raise
+            self.retries += 1
+            await gen.sleep(random.uniform(0, min(policy.max_backoff, policy.backoff * 2 ** attempt)))
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins
+        }
+
+    async def __hedged(self, policy: RetryPolicy, request, func):
+        name = request.endpoint.name
+        latency = self.__latency.get(name)
+        if latency is None:
+            latency = self.__latency[name] = _Latency(self.window)
+
+        delay = policy.hedge_delay
+        if delay is None:
+            delay = latency.percentile(policy.hedge_percentile, self.min_samples)
+        start = time.monotonic()
+        first = gen.convert_yielded(func(request))
+        if delay is not None:
+            try:
+                body = await gen.with_timeout(timedelta(seconds=delay), first, quiet_exceptions=(Exception,))
+                latency.record(time.monotonic() - start)
+                return body
+            except gen.TimeoutError:
+                pass
+
+        # 在超时后才检查并占用额度，同时超时的并发请求不会都发出对冲请求
+        if delay is None or self.hedges >= self.requests * self.max_hedge_ratio:
+            body = await first
+            latency.record(time.monotonic() - start)
+            return body
+        self.hedges += 1
+        hedge = Request(request.endpoint, request.path, request.data, request.key, request.decode)
+        hedge.timings = request.timings
+        second = gen.convert_yielded(func(hedge))
+        error = None
+        waiter = gen.WaitIterator(first, second)
+        while not waiter.done():
+            try:
+                body = await waiter.next()
+            except Exception as e:
+                error = e
+                continue
+            if waiter.current_future is second:
+                self.hedge_wins += 1
+            latency.record(time.monotonic() - start)
+            # 另一个请求的结果不再需要，取出异常避免被记录为未处理
+            for future in (first, second):
+                future.add_done_callback(lambda f: f.exception())
+            return body
+        raise error
@@ -0,0 +1,152 @@
+import random
+import time
+
+__all__ = ['REGIONS', 'Router']
+
+# 各区域的接口地址
+REGIONS = {
+    'cn': 'https://openapi.tuyacn.com',
+    'us': 'https://openapi.tuyaus.com',
+    'eu': 'https://openapi.tuyaeu.com'
+}
+
+
+class _Endpoint(object):
+    __slots__ = ('url', 'latency', 'error_rate', 'samples', 'failures', 'down_until', 'requests', 'errors')
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.samples = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def score(self):
+        # 成功一次的期望耗时，没有成功过的地址排在最后
+        if not self.samples:
+            return float('inf')
+        return self.latency / max(1 - self.error_rate, 0.05)
+
+
+class Router(object):
+    """
+    在多个接口地址之间选择最健康的一个
+
+    按滑动平均的延迟和错误率为每个地址打分，连续失败或错误率过高的地址在 cooldown 内不再使用，
+    冷却结束后重新参与选择，再次失败会立即被摘除；以 explore 的概率随机选择其他可用地址，使延迟统计保持更新
+
+        router = Router([REGIONS['cn'], 'https://openapi-backup.example.com'])
+        ty = Tuya(client_id, secret, schema, router=router)
+    """
+
+    # 签名和 token 错误，切换到不共享 token 的地址时会出现，业务错误不计入
+    FAILURE_CODES = (1004, 1010, 1011, 1012)
+
+    def __init__(self,
+                 urls: list,
+                 alpha: float=0.2,
+                 max_error_rate: float=0.5,
+                 max_failures: int=3,
+                 min_samples: int=5,
+                 cooldown: float=30,
+                 explore: float=0.05,
+                 failure_codes: tuple=None):
+        """
+        :param urls: 接口地址 list
+        :param alpha: 滑动平均的权重，越大越看重最近的请求
+        :param max_error_rate: 错误率超过该值时摘除
+        :param max_failures: 连续失败次数达到该值时摘除
+        :param min_samples: 按错误率摘除前至少需要的请求数
+        :param cooldown: 摘除时长(s)
+        :param explore: 随机选择其他可用地址的概率
+        :param failure_codes: 视为该地址失败的响应 code，默认为 FAILURE_CODES
+        """
+        if not urls:
+            raise ValueError('urls is empty')
+
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.max_failures = max_failures
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.explore = explore
+        self.failure_codes = set(self.FAILURE_CODES if failure_codes is None else failure_codes)
+        self.__endpoints = {url.rstrip('/'): _Endpoint(url.rstrip('/')) for url in urls}
+
+    @property
+    def urls(self):
+        return list(self.__endpoints)
+
+    def choose(self):
+        """
+        选择接口地址
+        :return: url
+        """
+        endpoints = self.__endpoints.values()
+        if len(endpoints) == 1:
+            return next(iter(endpoints)).url
+
+        now = time.monotonic()
+        up = [endpoint for endpoint in endpoints if endpoint.down_until <= now]
+        if not up:
+            # 全部被摘除时使用最早恢复的地址
+            return min(endpoints, key=lambda endpoint: endpoint.down_until).url
+        for endpoint in up:
+            if endpoint.requests == 0:
+                return endpoint.url
+        if random.random() < self.explore:
+            return random.choice(up).url
+        return min(up, key=_Endpoint.score).url
+
+    def is_failure(self, body):
+        """
+        :param body: 已解析的响应
+        :return: success 为 False 且 code 在 failure_codes 中
+        """
+        return isinstance(body, dict) and body.get('success') is False and body.get('code') in self.failure_codes
+
+    def report(self, url: str, latency: float, ok: bool):
+        """
+        记录一次请求的结果
+        :param url: choose 返回的地址
+        :param latency: 耗时(s)，失败时忽略
+        :param ok: 是否成功，连接失败、超时、5xx 和 is_failure 的响应视为失败
+        """
+        endpoint = self.__endpoints.get(url)
+        if endpoint is None:
+            return
+        alpha = self.alpha
+        endpoint.requests += 1
+        if ok:
+            endpoint.latency = latency if endpoint.samples == 0 else \
+                endpoint.latency + alpha * (latency - endpoint.latency)
+            endpoint.samples += 1
+            endpoint.error_rate -= alpha * endpoint.error_rate
+            endpoint.failures = 0
+            return
+
+        endpoint.errors += 1
+        endpoint.error_rate += alpha * (1 - endpoint.error_rate)
+        endpoint.failures += 1
+        if endpoint.failures >= self.max_failures or \
+                (endpoint.requests >= self.min_samples and endpoint.error_rate > self.max_error_rate):
+            endpoint.down_until = time.monotonic() + self.cooldown
+            # 冷却结束后的第一次请求失败就再次摘除
+            endpoint.failures = self.max_failures - 1
+
+    def stats(self):
+        """
+        各地址的统计
+        :return: {url: dict}，时间单位为 ms
+        """
+        now = time.monotonic()
+        return {endpoint.url: {
+            'latency_ms': endpoint.latency * 1000,
+            'error_rate': endpoint.error_rate,
+            'requests': endpoint.requests,
+            'errors': endpoint.errors,
+            'down': endpoint.down_until > now
+        } for endpoint in self.__endpoints.values()}
@@ -0,0 +1,91 @@
+from collections import OrderedDict, deque
+
+from tornado.concurrent import Future
+
+__all__ = ['FairScheduler', 'SchedulerMiddleware']
+
+
+class FairScheduler(object):
+    """
+    在多个租户之间公平分配并发名额
+
+    名额不足时按租户排队，释放名额时在有等待请求的租户之间轮转，
+    一个租户积压再多请求也只能轮到属于它的那一份；只为有等待请求的租户保留队列
+    """
+
+    def __init__(self, max_concurrency: int):
+        """
+        :param max_concurrency: 最大并发数，一般等于连接池的 max_clients
+        """
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.__queues = OrderedDict()
+
+    @property
+    def waiting(self):
+        return sum(len(queue) for queue in self.__queues.values())
+
+    async def acquire(self, tenant: str):
+        """
+        获取一个名额
+        :param tenant: 租户
+        """
+        if self.active < self.max_concurrency and not self.__queues:
+            self.active += 1
+            return
+        future = Future()
+        queue = self.__queues.get(tenant)
+        if queue is None:
+            queue = self.__queues[tenant] = deque()
+        queue.append(future)
+        try:
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # 已分配名额后被取消，交还名额
+                self.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        while self.__queues and self.active < self.max_concurrency:
+            tenant, queue = self.__queues.popitem(last=False)
+            future = queue.popleft()
+            if queue:
+                # 还有等待请求的租户排到队尾
+                self.__queues[tenant] = queue
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+    def stats(self):
+        return {
+            'max_concurrency': self.max_concurrency,
+            'active': self.active,
+            'waiting': self.waiting,
+            'tenants_waiting': len(self.__queues)
+        }
+
+
+class SchedulerMiddleware(object):
+    """
+    发送请求前从 FairScheduler 获取名额，位于 SignMiddleware 之前，排队结束后才签名，时间戳不会在排队中过期；
+    token 接口不经过调度，持有名额等待 token 的请求不会与 token 请求互相等待
+    """
+
+    def __init__(self, scheduler: FairScheduler, tenant: str):
+        """
+        :param scheduler: FairScheduler
+        :param tenant: 租户
+        """
+        self.scheduler = scheduler
+        self.tenant = tenant
+
+    async def __call__(self, request, call_next):
+        if request.endpoint.kind == 'token':
+            return await call_next(request)
+        await self.scheduler.acquire(self.tenant)
+        try:
+            return await call_next(request)
+        finally:
+            self.scheduler.release()
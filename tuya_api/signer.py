@@ -0,0 +1,74 @@
+import hashlib
+from collections import OrderedDict
+
+from .utils import current_milli_time
+
+__all__ = ['Signer']
+
+
+class _Prefix(object):
+    __slots__ = ('state', 'base', 't', 'headers')
+
+    def __init__(self, state, base: dict):
+        self.state = state
+        # 不随时间变化的请求头
+        self.base = base
+        self.t = None
+        self.headers = None
+
+
+class Signer(object):
+    """
+    签名为 MD5(client_id + access_token + secret + t).upper()
+
+    每个 access_token 预先计算一次前缀的 MD5 状态，签名时复制状态后只需再计算 t；
+    同一毫秒内同一 token 的请求直接复用上一次的签名
+    """
+
+    # 同时保留前缀的 token 数，刷新 token 时新旧 token 会短暂并存
+    MAX_PREFIXES = 4
+
+    def __init__(self, client_id: str, secret: str):
+        """
+        :param client_id: 云 API 授权中的 AccessId
+        :param secret: 云 API 授权中的 AccessKey
+        """
+        self.client_id = client_id
+        self.secret = secret
+        self.__prefixes = OrderedDict()
+
+    def headers(self, access_token: str='', content_type: bool=False):
+        """
+        签名并生成请求头，每次返回新的 dict，HTTP 客户端可以修改
+        :param access_token: 不需要 token 的接口为空字符串
+        :param content_type: 是否添加 Content-Type: application/json
+        """
+        prefix = self.__prefixes.get(access_token) or self.__prefix(access_token)
+        t = current_milli_time()
+        if t != prefix.t:
+            self.__update(prefix, t)
+        headers = prefix.headers.copy()
+        if content_type:
+            headers['Content-Type'] = 'application/json'
+        return headers
+
+    def __update(self, prefix: _Prefix, t: int):
+        state = prefix.state.copy()
+        t_str = str(t)
+        state.update(t_str.encode())
+        headers = prefix.base.copy()
+        headers['sign'] = state.hexdigest().upper()
+        headers['t'] = t_str
+        # 先生成再替换，不会被读到一半的状态
+        prefix.headers = headers
+        prefix.t = t
+
+    def __prefix(self, access_token: str):
+        while len(self.__prefixes) >= self.MAX_PREFIXES:
+            self.__prefixes.popitem(last=False)
+        base = {'client_id': self.client_id}
+        if access_token:
+            base['access_token'] = access_token
+        prefix = self.__prefixes[access_token] = _Prefix(
+            hashlib.md5((self.client_id + access_token + self.secret).encode('utf-8')), base)
+        return prefix
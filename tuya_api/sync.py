@@ -0,0 +1,167 @@
+import inspect
+import threading
+from concurrent import futures
+
+from tornado import gen
+from tornado.concurrent import chain_future
+from tornado.ioloop import IOLoop
+
+from .core import Tuya
+
+__all__ = ['LoopExecutor', 'SyncTuya']
+
+
+class LoopExecutor(futures.Executor):
+    """
+    在后台线程的事件循环中执行协程函数，接口同 concurrent.futures.Executor
+
+        executor = LoopExecutor()
+        future = executor.submit(ty.get_device_by_id, device_id)
+        body = future.result()
+    """
+
+    def __init__(self, name: str='tuya_api-loop'):
+        """
+        :param name: 线程名
+        """
+        self.io_loop = None
+        self.__shutdown = False
+        self.__lock = threading.Lock()
+        started = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, args=(started,), name=name, daemon=True)
+        self.__thread.start()
+        started.wait()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        在事件循环中调用 fn(*args, **kwargs)，fn 可以是协程函数或普通函数
+        :return: concurrent.futures.Future
+        """
+        future = futures.Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = fn(*args, **kwargs)
+                if inspect.isawaitable(result):
+                    chain_future(gen.convert_yielded(result), future)
+                else:
+                    future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+
+        with self.__lock:
+            if self.__shutdown:
+                raise RuntimeError('cannot schedule new calls after shutdown')
+            self.io_loop.add_callback(run)
+        return future
+
+    def call(self, fn, *args, timeout: float=None, **kwargs):
+        """
+        同步调用，等待 fn 的结果
+        """
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    def shutdown(self, wait: bool=True, **kwargs):
+        """
+        停止事件循环，已提交的调用在停止前执行完毕
+        """
+        with self.__lock:
+            if self.__shutdown:
+                return
+            self.__shutdown = True
+            self.io_loop.add_callback(self.io_loop.stop)
+        if wait and threading.current_thread() is not self.__thread:
+            self.__thread.join()
+
+    def __run(self, started: threading.Event):
+        self.io_loop = IOLoop()
+        self.io_loop.add_callback(started.set)
+        try:
+            self.io_loop.start()
+        finally:
+            self.io_loop.close(all_fds=True)
+
+
+class SyncTuya(object):
+    """
+    同步版 Tuya，方法与 Tuya 相同，直接返回结果
+
+    所有调用在同一个后台事件循环中执行，共享 token 和连接池，多个线程可以同时调用；
+    submit/map 返回 concurrent.futures.Future，用于并发发出大量请求
+
+        ty = SyncTuya(client_id, secret, schema)
+        body = ty.get_device_by_id(device_id)
+
+        fs = [ty.submit('get_device_by_id', device_id) for device_id in device_ids]
+        bodies = [f.result() for f in fs]
+        ty.close()
+    """
+
+    def __init__(self, *args, executor: LoopExecutor=None, timeout: float=None, **kwargs):
+        """
+        :param args: 同 Tuya
+        :param executor: 共享的 LoopExecutor，默认自行创建
+        :param timeout: 同步调用的超时时间(s)，默认不超时
+        :param kwargs: 同 Tuya
+        """
+        self.__own_executor = executor is None
+        self.executor = executor or LoopExecutor()
+        self.timeout = timeout
+        # 连接池需要在事件循环所在线程中创建
+        self.tuya = self.executor.call(Tuya, *args, **kwargs)
+
+    def __getattr__(self, name: str):
+        if name == 'tuya':
+            raise AttributeError(name)
+        method = getattr(self.tuya, name)
+        if not inspect.iscoroutinefunction(method):
+            return method
+
+        def call(*args, **kwargs):
+            return self.executor.call(method, *args, timeout=self.timeout, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, name: str, *args, **kwargs):
+        """
+        提交一次调用
+        :param name: Tuya 的方法名
+        :return: concurrent.futures.Future
+        """
+        return self.executor.submit(getattr(self.tuya, name), *args, **kwargs)
+
+    def map(self, name: str, *iterables, timeout: float=None):
+        """
+        并发调用，按参数顺序返回结果，同 Executor.map
+        :param name: Tuya 的方法名
+        """
+        return self.executor.map(getattr(self.tuya, name), *iterables, timeout=timeout)
+
+    def iter_users(self, page_size: int=100, prefetch: int=2):
+        """
+        同 Tuya.iter_users，返回同步迭代器
+        """
+        iterator = self.executor.call(self.tuya.iter_users, page_size, prefetch)
+        while True:
+            try:
+                yield self.executor.call(iterator.__anext__, timeout=self.timeout)
+            except StopAsyncIteration:
+                return
+
+    def close(self):
+        """
+        关闭 Tuya，以及自行创建的 LoopExecutor
+        """
+        self.executor.call(self.tuya.aclose)
+        if self.__own_executor:
+            self.executor.shutdown()
@@ -0,0 +1,239 @@
+import logging
+from datetime import timedelta
+
+from tornado import gen, locks
+from tornado.ioloop import IOLoop
+
+from .utils import current_milli_time
+
+__all__ = ['TokenManager']
+
+# 后台刷新失败后的重试间隔(s)
+REFRESH_RETRY_DELAY = 5
+# 共享 store 中刷新锁的过期时间(s)，持有者在请求期间每 1/3 过期时间续期一次，进程退出后最多这么久被其他刷新者接管
+STORE_LOCK_TTL = 10
+# 等待其他刷新者写入 store 的轮询间隔(s)
+STORE_POLL_INTERVAL = 0.1
+
+
+class TokenManager(object):
+    """
+    access_token 管理器
+
+    - 单独记录 token 的签发时间，不与签名时间戳混用
+    - 并发的获取/刷新请求合并为同一个在途请求
+    - 在 threshold 窗口之前于后台刷新 token，接口调用不需要等待 token 请求
+    - 配置 store 后，多个进程/主机共享同一份 token，同一时间只有一个刷新者；
+      刷新锁在请求期间持续续期，请求再慢也不会被其他刷新者抢到，其他刷新者一直等到 token 写入或锁被释放
+    """
+
+    def __init__(self, fetcher, refresher, threshold: int=300, store=None, key: str=None,
+                 lock_ttl: float=STORE_LOCK_TTL):
+        """
+        :param fetcher: 获取 token 的协程函数 fetcher(grant_type, code)，成功时返回接口响应，失败返回 None
+        :param refresher: 刷新 token 的协程函数 refresher(refresh_token)，成功时返回接口响应，失败返回 None
+        :param threshold: 提前刷新 token 的秒数
+        :param store: 共享 token 的 TokenStore，默认不共享
+        :param key: token 在 store 中的 key，一般为 client_id
+        :param lock_ttl: store 中刷新锁的过期时间(s)
+        """
+        self.__fetcher = fetcher
+        self.__refresher = refresher
+        self.threshold = threshold
+        self.store = store
+        self.key = key
+        self.lock_ttl = lock_ttl
+
+        self.access_token = None
+        self.refresh_token = None
+        # token 有效期(ms)
+        self.expire_time = 0
+        # token 签发时间，13位标准时间戳
+        self.issue_time = 0
+
+        self.__grant = (1, None)
+        self.__pending = None
+        self.__timer = None
+
+    @property
+    def expire_at(self):
+        return self.issue_time + self.expire_time
+
+    @property
+    def refresh_at(self):
+        # threshold 超过有效期一半时按一半计算，避免刷新后立即再次刷新
+        return self.expire_at - min(self.threshold * 1000, self.expire_time // 2)
+
+    def is_valid(self):
+        return self.access_token is not None and current_milli_time() < self.expire_at
+
+    async def get_token(self):
+        """
+        获取可用的 access_token，token 有效时不产生任何等待
+        :return: access_token
+        """
+        if not self.is_valid():
+            # store 中已有可用 token 时直接使用，不发出请求
+            await self.__single_flight(self.__do_fetch, reuse_valid=True)
+            if not self.is_valid():
+                raise Exception('TokenManager.get_token: access token is None!')
+        return self.access_token
+
+    def fetch(self, grant_type: int=1, code: str=None):
+        """
+        获取 token，并发调用共享同一个请求
+        :param grant_type: 授权模式 1-简易模式 2-授权码模式
+        :param code: 授权码
+        :return: Future，结果为接口响应或 None
+        """
+        self.__grant = (grant_type, code)
+        return self.__single_flight(self.__do_fetch)
+
+    def refresh(self, grant_type: int=1, code: str=None):
+        """
+        刷新 token，token 不存在时等同于 fetch，并发调用共享同一个请求
+        :param grant_type: 授权模式 1-简易模式 2-授权码模式
+        :param code: 授权码
+        :return: Future，结果为接口响应或 None
+        """
+        self.__grant = (grant_type, code)
+        if self.access_token is None or self.refresh_token is None:
+            return self.__single_flight(self.__do_fetch)
+        return self.__single_flight(self.__do_refresh)
+
+    def update(self, result: dict):
+        """
+        更新 token 并安排下一次后台刷新
+        :param result: token 接口响应中的 result 或 store 中的记录
+        """
+        self.access_token = result['access_token']
+        self.refresh_token = result['refresh_token']
+        self.expire_time = result['expire_time'] * 1000
+        self.issue_time = result.get('issue_time') or current_milli_time()
+        self.__schedule_refresh()
+
+    def close(self):
+        if self.__timer is not None:
+            IOLoop.current().remove_timeout(self.__timer)
+            self.__timer = None
+
+    def __single_flight(self, func, reuse_valid: bool=False):
+        if self.__pending is None:
+            self.__pending = gen.convert_yielded(self.__run(func, reuse_valid))
+        return self.__pending
+
+    async def __run(self, func, reuse_valid: bool):
+        try:
+            if self.store is None:
+                body = await func()
+                record = body['result'] if body is not None else None
+            else:
+                body, record = await self.__run_shared(func, reuse_valid)
+            if record is not None:
+                self.update(record)
+            return body
+        finally:
+            self.__pending = None
+
+    def __is_usable(self, record, reuse_valid: bool):
+        if record is None:
+            return False
+        now = current_milli_time()
+        expire_time = record['expire_time'] * 1000
+        expire_at = record['issue_time'] + expire_time
+        if reuse_valid:
+            return now < expire_at
+        # 刷新时只接受其他刷新者新签发、且尚未进入刷新窗口的 token
+        refresh_at = expire_at - min(self.threshold * 1000, expire_time // 2)
+        return record['issue_time'] > self.issue_time and now < refresh_at
+
+    async def __run_shared(self, func, reuse_valid: bool):
+        record = await self.store.load(self.key)
+        if self.__is_usable(record, reuse_valid):
+            return self.__as_body(record), record
+
+        # 其他刷新者持有锁时等待其写入 store；锁被释放（刷新失败）或过期（持有者退出）后由自己请求
+        while not await self.store.acquire(self.key, self.lock_ttl):
+            await gen.sleep(STORE_POLL_INTERVAL)
+            record = await self.store.load(self.key)
+            if self.__is_usable(record, reuse_valid):
+                return self.__as_body(record), record
+
+        done = locks.Event()
+        IOLoop.current().spawn_callback(self.__keep_lock, done)
+        try:
+            # 获取锁期间可能已有其他刷新者完成刷新
+            record = await self.store.load(self.key)
+            if self.__is_usable(record, reuse_valid):
+                return self.__as_body(record), record
+
+            body = await func()
+            if body is None:
+                return None, None
+            result = body['result']
+            record = {
+                'access_token': result['access_token'],
+                'refresh_token': result['refresh_token'],
+                'expire_time': result['expire_time'],
+                'issue_time': current_milli_time()
+            }
+            await self.store.save(self.key, record)
+            return body, record
+        finally:
+            done.set()
+            await self.store.release(self.key)
+
+    async def __keep_lock(self, done: locks.Event):
+        while True:
+            try:
+                await done.wait(timeout=timedelta(seconds=self.lock_ttl / 3))
+                return
+            except gen.TimeoutError:
+                pass
+            try:
+                if not await self.store.renew(self.key, self.lock_ttl):
+                    logging.warning('token lock %s lost while refreshing', self.key)
+                    return
+            except Exception:
+                logging.exception('renew token lock %s error', self.key)
+
+    @staticmethod
+    def __as_body(record: dict):
+        return {
+            'success': True,
+            'result': record,
+            't': record['issue_time']
+        }
+
+    async def __do_fetch(self):
+        return await self.__fetcher(*self.__grant)
+
+    async def __do_refresh(self):
+        body = await self.__refresher(self.refresh_token)
+        if body is None:
+            # refresh_token 失效时重新获取
+            body = await self.__fetcher(*self.__grant)
+        return body
+
+    def __schedule_refresh(self, delay: float=None):
+        io_loop = IOLoop.current()
+        if self.__timer is not None:
+            io_loop.remove_timeout(self.__timer)
+        if delay is None:
+            delay = max(self.refresh_at - current_milli_time(), 0) / 1000
+        self.__timer = io_loop.call_later(delay, self.__on_timer)
+
+    def __on_timer(self):
+        self.__timer = None
+        IOLoop.current().spawn_callback(self.__background_refresh)
+
+    async def __background_refresh(self):
+        try:
+            body = await self.refresh(*self.__grant)
+        except Exception:
+            logging.exception('background refresh token error')
+            body = None
+        if body is None and self.is_valid():
+            # 刷新失败但 token 仍然有效，稍后重试
+            remaining = (self.expire_at - current_milli_time()) / 1000
+            self.__schedule_refresh(min(REFRESH_RETRY_DELAY, remaining))
@@ -0,0 +1,195 @@
+import json
+import os
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .utils import maybe_await
+
+__all__ = ['TokenStore', 'MemoryTokenStore', 'FileTokenStore', 'RedisTokenStore']
+
+
+class TokenStore(object):
+    """
+    token 存储接口，多个进程/主机共享同一个 store 时只需一个刷新者
+
+    记录格式: {'access_token', 'refresh_token', 'expire_time'(s), 'issue_time'(13位时间戳)}
+    """
+
+    async def load(self, key: str):
+        """
+        读取 token 记录
+        :param key: 记录 key，一般为 client_id
+        :return: dict 或 None
+        """
+        raise NotImplementedError
+
+    async def save(self, key: str, record: dict):
+        """
+        保存 token 记录
+        :param key: 记录 key
+        :param record: token 记录
+        """
+        raise NotImplementedError
+
+    async def acquire(self, key: str, ttl: float):
+        """
+        获取刷新锁，同一时间只有一个持有者去请求 token 接口
+        :param key: 记录 key
+        :param ttl: 锁的最长持有时间(s)
+        :return: 是否获取成功
+        """
+        raise NotImplementedError
+
+    async def renew(self, key: str, ttl: float):
+        """
+        续期自己持有的刷新锁，锁没有过期时间的 store 不需要实现
+        :param key: 记录 key
+        :param ttl: 从现在起的最长持有时间(s)
+        :return: 是否仍然持有锁
+        """
+        return True
+
+    async def release(self, key: str):
+        """
+        释放自己持有的刷新锁，锁已过期并被其他持有者获取时不做任何事
+        :param key: 记录 key
+        """
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    进程内 store，同一进程内的多个 Tuya 实例共享 token
+    """
+
+    def __init__(self):
+        self.__records = {}
+        self.__locks = set()
+
+    async def load(self, key: str):
+        record = self.__records.get(key)
+        return dict(record) if record is not None else None
+
+    async def save(self, key: str, record: dict):
+        self.__records[key] = dict(record)
+
+    async def acquire(self, key: str, ttl: float):
+        if key in self.__locks:
+            return False
+        self.__locks.add(key)
+        return True
+
+    async def release(self, key: str):
+        self.__locks.discard(key)
+
+
+class FileTokenStore(TokenStore):
+    """
+    基于文件的 store，同一主机上的多个进程共享 token
+
+    记录通过临时文件 + rename 原子写入，刷新锁使用 flock，进程退出时由系统自动释放
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: 存放 token 文件的目录
+        """
+        if fcntl is None:
+            raise RuntimeError('FileTokenStore requires fcntl')
+        self.path = path
+        self.__lock_files = {}
+        os.makedirs(path, exist_ok=True)
+
+    def __file(self, key: str, suffix: str):
+        return os.path.join(self.path, '{key}.{suffix}'.format(key=key, suffix=suffix))
+
+    async def load(self, key: str):
+        try:
+            with open(self.__file(key, 'json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def save(self, key: str, record: dict):
+        filename = self.__file(key, 'json')
+        tmp = '{filename}.{pid}'.format(filename=filename, pid=os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp, filename)
+
+    async def acquire(self, key: str, ttl: float):
+        if key in self.__lock_files:
+            return False
+        f = open(self.__file(key, 'lock'), 'a')
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self.__lock_files[key] = f
+        return True
+
+    async def release(self, key: str):
+        f = self.__lock_files.pop(key, None)
+        if f is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            f.close()
+
+
+class RedisTokenStore(TokenStore):
+    """
+    基于 Redis 的 store，多台主机共享 token
+
+    client 只需实现 redis-py 风格的 get/set(nx, px)/eval，同步或协程均可，
+    测试时可以替换为本地实现；每次获取锁使用新的 owner，续期和释放在 Lua 脚本中先比较 owner，
+    不会操作已经过期并被其他持有者获取的锁
+    """
+
+    RENEW_SCRIPT = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+                    "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end")
+    RELEASE_SCRIPT = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+                      "return redis.call('del', KEYS[1]) else return 0 end")
+
+    def __init__(self, client, prefix: str='tuya_api:token:'):
+        """
+        :param client: redis 客户端
+        :param prefix: key 前缀
+        """
+        self.client = client
+        self.prefix = prefix
+        self.__owners = {}
+
+    async def load(self, key: str):
+        value = await maybe_await(self.client.get(self.prefix + key))
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return json.loads(value)
+
+    async def save(self, key: str, record: dict):
+        await maybe_await(self.client.set(self.prefix + key, json.dumps(record)))
+
+    async def acquire(self, key: str, ttl: float):
+        owner = uuid.uuid4().hex
+        ret = await maybe_await(self.client.set(self.prefix + key + ':lock', owner, nx=True, px=int(ttl * 1000)))
+        if ret:
+            self.__owners[key] = owner
+        return bool(ret)
+
+    async def renew(self, key: str, ttl: float):
+        owner = self.__owners.get(key)
+        if owner is None:
+            return False
+        ret = await maybe_await(self.client.eval(self.RENEW_SCRIPT, 1, self.prefix + key + ':lock',
+                                                 owner, int(ttl * 1000)))
+        return bool(ret)
+
+    async def release(self, key: str):
+        owner = self.__owners.pop(key, None)
+        if owner is not None:
+            await maybe_await(self.client.eval(self.RELEASE_SCRIPT, 1, self.prefix + key + ':lock', owner))
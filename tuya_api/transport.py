@@ -0,0 +1,216 @@
+import asyncio
+import time
+import warnings
+
+from tornado import httpclient
+from tornado.ioloop import IOLoop
+
+__all__ = ['ConnectError', 'Response', 'Transport', 'TornadoTransport', 'AiohttpTransport', 'HttpxTransport',
+           'TRANSPORTS', 'create_transport']
+
+
+class ConnectError(httpclient.HTTPClientError):
+    """
+    连接没有建立，请求一定没有发出
+    """
+
+    def __init__(self, message: str=None):
+        super().__init__(599, message)
+
+
+class Response(object):
+    """
+    asyncio 后端的响应，与 tornado 的 HTTPResponse 字段一致
+    """
+
+    __slots__ = ('code', 'headers', 'body', 'request_time')
+
+    def __init__(self, code: int, headers, body: bytes, request_time: float):
+        self.code = code
+        self.headers = headers
+        self.body = body
+        self.request_time = request_time
+
+
+class Transport(object):
+    """
+    发送 HTTP 请求的后端
+
+    所有后端行为一致：非 2xx 响应抛出 HTTPClientError(code)，
+    连接失败和超时在 asyncio 后端中抛出 HTTPClientError(599)，其中没能建立连接的为 ConnectError
+    """
+
+    def __init__(self, max_clients: int=10, max_per_host: int=None, keep_alive: bool=None):
+        """
+        :param max_clients: 最大连接数
+        :param max_per_host: 每个 host 的最大连接数
+        :param keep_alive: 是否复用连接，默认复用
+        """
+        self.max_clients = max_clients
+        self.max_per_host = max_per_host or max_clients
+        self.keep_alive = True if keep_alive is None else keep_alive
+
+    async def fetch(self, url: str, method: str='GET', headers: dict=None, body=None,
+                    connect_timeout: float=20, request_timeout: float=20, validate_cert: bool=True):
+        """
+        :return: 有 code、headers、body、request_time 字段的响应
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        关闭连接，asyncio 后端会在事件循环中异步关闭
+        """
+
+    async def aclose(self):
+        """
+        关闭连接并等待关闭完成
+        """
+        self.close()
+
+
+class TornadoTransport(Transport):
+    """
+    tornado 的 AsyncHTTPClient，backend 为 'simple' 或 'curl'，curl 需要安装 pycurl；
+    simple 不支持复用连接，每次请求都会关闭连接，keep_alive 总是为 False，显式传入 True 时发出警告
+    """
+
+    def __init__(self, max_clients: int=10, max_per_host: int=None, keep_alive: bool=None,
+                 backend: str='simple'):
+        super().__init__(max_clients, max_per_host, keep_alive)
+        if backend != 'curl':
+            if keep_alive:
+                warnings.warn('the simple backend closes the connection after every request, '
+                              'use backend curl, aiohttp or httpx for keep_alive', RuntimeWarning, stacklevel=4)
+            self.keep_alive = False
+        if backend == 'curl':
+            from tornado.curl_httpclient import CurlAsyncHTTPClient
+            self.client = CurlAsyncHTTPClient(force_instance=True, max_clients=max_clients)
+        else:
+            self.client = httpclient.AsyncHTTPClient(force_instance=True, max_clients=max_clients)
+        self.backend = backend
+
+    async def fetch(self, url: str, **kwargs):
+        if self.backend == 'curl':
+            kwargs.setdefault('prepare_curl_callback', self.__prepare_curl)
+        return await self.client.fetch(url, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+    def __prepare_curl(self, curl):
+        import pycurl
+        curl.setopt(pycurl.FORBID_REUSE, 0 if self.keep_alive else 1)
+        curl.setopt(pycurl.TCP_KEEPALIVE, 1 if self.keep_alive else 0)
+
+
+class AiohttpTransport(Transport):
+    """
+    aiohttp 的 ClientSession，需要安装 aiohttp，session 在第一次请求时创建
+    """
+
+    def __init__(self, max_clients: int=10, max_per_host: int=None, keep_alive: bool=None):
+        super().__init__(max_clients, max_per_host, keep_alive)
+        import aiohttp
+        self.__aiohttp = aiohttp
+        self.__session = None
+
+    async def fetch(self, url: str, method: str='GET', headers: dict=None, body=None,
+                    connect_timeout: float=20, request_timeout: float=20, validate_cert: bool=True):
+        aiohttp = self.__aiohttp
+        if self.__session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_clients, limit_per_host=self.max_per_host,
+                                             force_close=not self.keep_alive)
+            self.__session = aiohttp.ClientSession(connector=connector)
+
+        start = time.monotonic()
+        try:
+            async with self.__session.request(
+                    method, url, headers=headers, data=body, ssl=validate_cert,
+                    timeout=aiohttp.ClientTimeout(total=request_timeout, sock_connect=connect_timeout)) as r:
+                response = Response(r.status, r.headers, await r.read(), time.monotonic() - start)
+        except asyncio.TimeoutError:
+            raise httpclient.HTTPClientError(599, 'Timeout')
+        except aiohttp.ClientConnectorError as e:
+            raise ConnectError(str(e))
+        except aiohttp.ClientError as e:
+            raise httpclient.HTTPClientError(599, str(e))
+        return check_response(response)
+
+    def close(self):
+        if self.__session is not None:
+            session, self.__session = self.__session, None
+            IOLoop.current().add_callback(session.close)
+
+    async def aclose(self):
+        if self.__session is not None:
+            session, self.__session = self.__session, None
+            await session.close()
+
+
+class HttpxTransport(Transport):
+    """
+    httpx 的 AsyncClient，需要安装 httpx，校验证书与否分别使用一个 client
+    """
+
+    def __init__(self, max_clients: int=10, max_per_host: int=None, keep_alive: bool=None):
+        super().__init__(max_clients, max_per_host, keep_alive)
+        import httpx
+        self.__httpx = httpx
+        self.__clients = {}
+
+    async def fetch(self, url: str, method: str='GET', headers: dict=None, body=None,
+                    connect_timeout: float=20, request_timeout: float=20, validate_cert: bool=True):
+        httpx = self.__httpx
+        client = self.__clients.get(validate_cert)
+        if client is None:
+            limits = httpx.Limits(max_connections=self.max_clients,
+                                  max_keepalive_connections=self.max_clients if self.keep_alive else 0)
+            client = self.__clients[validate_cert] = httpx.AsyncClient(limits=limits, verify=validate_cert)
+
+        start = time.monotonic()
+        try:
+            r = await client.request(method, url, headers=headers, content=body,
+                                     timeout=httpx.Timeout(request_timeout, connect=connect_timeout))
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            raise ConnectError(str(e))
+        except httpx.TimeoutException:
+            raise httpclient.HTTPClientError(599, 'Timeout')
+        except httpx.TransportError as e:
+            raise httpclient.HTTPClientError(599, str(e))
+        return check_response(Response(r.status_code, r.headers, r.content, time.monotonic() - start))
+
+    def close(self):
+        clients, self.__clients = self.__clients, {}
+        for client in clients.values():
+            IOLoop.current().add_callback(client.aclose)
+
+    async def aclose(self):
+        clients, self.__clients = self.__clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+def check_response(response: Response):
+    if not 200 <= response.code < 300:
+        raise httpclient.HTTPClientError(response.code, response=response)
+    return response
+
+
+TRANSPORTS = {
+    'simple': TornadoTransport,
+    'curl': TornadoTransport,
+    'aiohttp': AiohttpTransport,
+    'httpx': HttpxTransport
+}
+
+
+def create_transport(backend: str, max_clients: int=10, max_per_host: int=None, keep_alive: bool=None):
+    """
+    :param backend: 'simple'、'curl'、'aiohttp' 或 'httpx'
+    """
+    if backend not in TRANSPORTS:
+        raise ValueError('backend value is no expect')
+    if TRANSPORTS[backend] is TornadoTransport:
+        return TornadoTransport(max_clients, max_per_host, keep_alive, backend=backend)
+    return TRANSPORTS[backend](max_clients, max_per_host, keep_alive)
@@ -0,0 +1,137 @@
+import hashlib
+import inspect
+import time
+from collections import deque
+
+from tornado import gen, locks
+
+_END = object()
+
+
+def current_milli_time():
+    return int(round(time.time() * 1000))
+
+
+def gen_md5(s):
+    return hashlib.md5(s.encode('utf-8')).hexdigest()
+
+
+def chunked(items: list, size: int):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+class SingleFlight(object):
+    """
+    按 key 合并并发调用，同一 key 同一时间只有一个在途调用，其余调用者共享其结果
+    """
+
+    def __init__(self):
+        self.__calls = {}
+
+    def __len__(self):
+        return len(self.__calls)
+
+    def __contains__(self, key):
+        return key in self.__calls
+
+    def do(self, key, func, *args):
+        """
+        :param key: 合并的 key
+        :param func: 协程函数
+        :return: Future
+        """
+        future = self.__calls.get(key)
+        if future is None:
+            future = gen.convert_yielded(func(*args))
+            self.__calls[key] = future
+            future.add_done_callback(lambda f: self.__done(key, f))
+        return future
+
+    def forget(self, key):
+        """
+        之后的调用不再共享当前在途的调用
+        :return: 是否存在在途调用
+        """
+        return self.__calls.pop(key, None) is not None
+
+    def __done(self, key, future):
+        if self.__calls.get(key) is future:
+            del self.__calls[key]
+
+
+class CompletionStream(object):
+    """
+    按顺序读取 items，最多同时进行 concurrency 个 func(index, item)，哪个先完成就先产出哪个的结果
+
+    items 只在有空闲名额时才会继续读取，进行中和未取走的结果合计最多 concurrency 个，可以直接传入大文件；
+    func 返回的不是 awaitable 时直接作为结果，同样在取走前占用名额
+
+        async for result in CompletionStream(rows, add_row, concurrency=10):
+            ...
+    """
+
+    def __init__(self, items, func, concurrency: int=10):
+        """
+        :param items: 可迭代对象
+        :param func: func(index, item)，index 从 0 开始，返回结果或 awaitable
+        :param concurrency: 最大并发数
+        """
+        self.func = func
+        self.concurrency = max(concurrency, 1)
+
+        self.__items = iter(items)
+        self.__index = 0
+        self.__running = 0
+        self.__ready = deque()
+        self.__condition = locks.Condition()
+
+    @property
+    def running(self):
+        return self.__running
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self.__fill()
+        while not self.__ready:
+            if not self.__running:
+                raise StopAsyncIteration
+            await self.__condition.wait()
+        result, error = self.__ready.popleft()
+        self.__fill()
+        if error is not None:
+            raise error
+        return result
+
+    def __fill(self):
+        # 进行中和未取走的结果合计不超过 concurrency 个
+        while self.__running + len(self.__ready) < self.concurrency:
+            item = next(self.__items, _END)
+            if item is _END:
+                return
+            index = self.__index
+            self.__index += 1
+            result = self.func(index, item)
+            if not inspect.isawaitable(result):
+                self.__ready.append((result, None))
+                continue
+            self.__running += 1
+            gen.convert_yielded(self.__wait(result))
+
+    async def __wait(self, awaitable):
+        result = error = None
+        try:
+            result = await awaitable
+        except Exception as e:
+            error = e
+        self.__running -= 1
+        self.__ready.append((result, error))
+        self.__condition.notify_all()